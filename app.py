@@ -1,18 +1,114 @@
+import time
+
+# Ishga tushish vaqtini o'lchash uchun (importlar ham hisobga kiradi)
+STARTED = time.perf_counter()
+
+import asyncio
+import logging
+import signal
+
 from aiogram import executor
 
-from loader import dp
+from data import config
+from loader import (dp, storage, managers, media_index, session_sweeper, sheets_outbox, sheets_writer, submissions,
+                    upload_sessions)
 import middlewares, filters, handlers
+from handlers.users.start import flush_albums, resume_uploads
+from utils.google_api import warm_up
+from utils.media_policy import media_policy
 from utils.notify_admins import on_startup_notify
 from utils.set_bot_commands import set_default_commands
+from utils.misc.metrics import registry, start_metrics_server
+from utils.misc.shutdown import begin_shutdown, shutdown_remaining
+from utils.sharding import start_sharded, start_worker
+from utils.upload_queue import upload_queue
+from utils.webhook import start_webhook
 
 
 async def on_startup(dispatcher):
-    # Birlamchi komandalar (/star va /help)
-    await set_default_commands(dispatcher)
+    # Avvalgi (to'satdan to'xtatilgan) jarayondan qolgan vaqtinchalik fayllar
+    media_policy.remove_stale_files()
+
+    # Mahalliy jadvallarni yaratish
+    storage.create_table()
+    sheets_outbox.create_table()
+    upload_sessions.create_table()
+    media_index.create_table()
+    submissions.create_table()
+    managers.load()
+    shards = config.SHARDS if config.BOT_MODE == 'worker' else 1
+    registry.gauge('bot_sheets_outbox_rows', 'Rows waiting for Google Sheets', callback=sheets_outbox.count)
+    registry.gauge('bot_sheets_dead_rows', 'Rows Google Sheets kept rejecting', callback=sheets_outbox.dead_count)
+    registry.gauge('bot_update_lanes', 'Users with updates in progress', callback=lambda: len(dispatcher.lanes))
+    # Sharded rejimda har bir shard faqat o'z foydalanuvchilarini sanaydi (umumiy baza ikki marta sanalmaydi)
+    registry.gauge('bot_fsm_sessions', 'Stored form sessions',
+                   callback=lambda: storage.count(shards, config.SHARD_INDEX % shards))
+    registry.gauge('bot_fsm_cached_sessions', 'Form sessions cached in memory', callback=lambda: storage.cached)
+
+    # Tashlab ketilgan sessiyalarni tozalash (har bir shard o'z foydalanuvchilarini)
+    session_sweeper.start()
+
+    # Oldingi ishga tushishda uzilib qolgan Drive yuklamalari (har bir shard o'z foydalanuvchilarini)
+    await resume_uploads(shards, config.SHARD_INDEX % shards)
+
+    # Prometheus metrikalari (har bir shard o'z portida)
+    if config.METRICS_PORT:
+        await start_metrics_server(config.METRICS_HOST, config.METRICS_PORT + config.SHARD_INDEX)
+
+    # Qolgan ishlar sharded rejimda faqat birinchi shardda bajariladi
+    if config.SHARD_INDEX == 0:
+        # Google Sheets ga yozuvchi fon vazifasi (outboxda qolganlarni ham yuboradi)
+        sheets_writer.start()
+
+        # So'rovlar indeksini jadvaldagi qo'lda tahrirlar bilan moslashtirish (fonda)
+        asyncio.create_task(sheets_writer.sync_submissions(submissions))
+
+        # Birlamchi komandalar (/star va /help)
+        await set_default_commands(dispatcher)
+
+        # Bot ishga tushgani haqida adminga xabar berish
+        await on_startup_notify(dispatcher)
+
+    logging.info("Bot %.2f s da ishga tushdi", time.perf_counter() - STARTED)
+
+    # Google kutubxonalari birinchi yuklashni kutmasdan fonda import qilinadi
+    asyncio.get_running_loop().run_in_executor(None, warm_up)
+
+
+async def on_shutdown(dispatcher):
+    # Muddat signal kelganda boshlangan (webhook/worker); polling rejimida shu yerda boshlanadi
+    begin_shutdown()
+
+    # Yangi updatelarni qabul qilmaslik, boshlangan handlerlarni tugatish
+    dispatcher.stop_polling()
+    await dispatcher.wait_lanes(shutdown_remaining(reserve=config.SHUTDOWN_TIMEOUT / 2))
+
+    # Yig'ilayotgan albomlar va Drive yuklamalari (tugamaganlari keyingi ishga tushishda davom ettiriladi)
+    await flush_albums()
+    await upload_queue.shutdown(shutdown_remaining(reserve=5))
+    session_sweeper.stop()
+
+    # Google Sheets ga yozilmagan qatorlar (qolganlari outboxda saqlanadi)
+    left = await sheets_writer.drain(shutdown_remaining())
+    if left:
+        logging.warning("%s ta qator Google Sheets ga yozilmadi, keyingi ishga tushishda yuboriladi", left)
 
-    # Bot ishga tushgani haqida adminga xabar berish
-    await on_startup_notify(dispatcher)
+    # Kechiktirilgan yozuvlarni saqlash
+    managers.flush()
+    storage.flush()
+    media_policy.shutdown()
+    logging.info("Bot to'xtatildi (%.1f s)", config.SHUTDOWN_TIMEOUT - shutdown_remaining())
 
 
 if __name__ == '__main__':
-    executor.start_polling(dp, on_startup=on_startup)
+    if config.BOT_MODE == 'webhook':
+        start_webhook(dp, on_startup=on_startup, on_shutdown=on_shutdown)
+    elif config.BOT_MODE == 'sharded':
+        start_sharded()
+    elif config.BOT_MODE == 'worker':
+        start_worker(dp, on_startup=on_startup, on_shutdown=on_shutdown)
+    else:
+        # docker stop (SIGTERM) ham Ctrl+C kabi on_shutdown orqali to'xtatadi
+        loop = asyncio.get_event_loop()
+        loop.add_signal_handler(signal.SIGTERM, loop.stop)
+        executor.start_polling(dp, on_startup=on_startup, on_shutdown=on_shutdown)
@@ -0,0 +1,390 @@
+"""
+Offline load test for the RequestForm flow.
+
+Runs N synthetic users through /start -> finish_upload (including a photo and a
+video) with dp.process_update against a local stub of the Bot API and Drive, and an
+in-memory Sheets fake. Latency of every external service is configurable.
+
+    python benchmark.py --users 50 --drive-latency 0.3 --global-rate 1000
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20, help='concurrent users')
+    parser.add_argument('--rounds', type=int, default=1, help='submissions per user')
+    parser.add_argument('--think', type=float, default=0.2, help='pause between steps of one user, s')
+    parser.add_argument('--telegram-latency', type=float, default=0.02, help='Bot API latency, s')
+    parser.add_argument('--drive-latency', type=float, default=0.1, help='Drive latency per request, s')
+    parser.add_argument('--sheets-latency', type=float, default=0.3, help='append_rows latency, s')
+    parser.add_argument('--drive-fail-rate', type=float, default=0, help='share of Drive chunk PUTs answered with 503')
+    parser.add_argument('--photo-size', type=int, default=300 * 1024, help='bytes')
+    parser.add_argument('--video-size', type=int, default=5 * 1024 * 1024, help='bytes')
+    parser.add_argument('--global-rate', type=float, default=30, help='OUTBOUND_GLOBAL_RATE')
+    parser.add_argument('--chat-rate', type=float, default=1, help='OUTBOUND_CHAT_RATE')
+    parser.add_argument('--repeat-media', action='store_true', help='send the same photo and video in every round')
+    parser.add_argument('--workers', type=int, default=4, help='UPLOAD_WORKERS')
+    parser.add_argument('--timeout', type=float, default=120, help='wait for uploads per user, s')
+    return parser.parse_args()
+
+
+def configure_env(args, workdir):
+    # Konfiguratsiya loader import qilinishidan oldin o'rnatiladi
+    os.environ.update({
+        'BOT_TOKEN': '123456:BENCHMARK',
+        'ADMINS': '1',
+        'IP': '127.0.0.1',
+        'DB_PATH': os.path.join(workdir, 'bench.db'),
+        'METRICS_PORT': '0',
+        'SHEETS_FLUSH_INTERVAL': '0.2',
+        'SHEETS_MIN_INTERVAL': '0',
+        'OUTBOUND_GLOBAL_RATE': str(args.global_rate),
+        'OUTBOUND_CHAT_RATE': str(args.chat_rate),
+        'UPLOAD_WORKERS': str(args.workers),
+    })
+
+
+def percentiles(values):
+    if not values:
+        return '-'
+    values = sorted(values)
+
+    def pick(q):
+        return values[min(len(values) - 1, int(q * len(values)))] * 1000
+
+    return f"p50 {pick(0.5):8.1f}  p95 {pick(0.95):8.1f}  p99 {pick(0.99):8.1f}  max {values[-1] * 1000:8.1f} ms"
+
+
+class StubServer:
+    """
+    Bot API + Drive stand-in. Records what every chat received.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.files = {}
+        self.events = defaultdict(list)
+        self.uploads = {}
+        self.message_ids = itertools.count(1000)
+        self.file_ids = itertools.count(1)
+        self.uploaded_bytes = 0
+        self.failed_chunks = 0
+        self.shortcuts = 0
+
+    def make_app(self):
+        from aiohttp import web
+
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post('/bot{token}/{method}', self.bot_method)
+        app.router.add_get('/file/bot{token}/{path:.+}', self.download)
+        app.router.add_post('/upload/drive/v3/files', self.start_upload)
+        app.router.add_put('/upload/session/{sid}', self.put_chunk)
+        app.router.add_post('/drive/v3/files/{file_id}/permissions', self.permission)
+        app.router.add_post('/drive/v3/files', self.create_file)
+        return app
+
+    async def bot_method(self, request):
+        from aiohttp import web
+
+        await asyncio.sleep(self.args.telegram_latency)
+        method = request.match_info['method']
+        data = dict(await request.post())
+        chat_id = data.get('chat_id')
+        if chat_id:
+            self.events[int(chat_id)].append((method, data.get('text', '')))
+        if method == 'getFile':
+            path, size = self.files[data['file_id']]
+            result = {'file_id': data['file_id'], 'file_unique_id': data['file_id'],
+                      'file_size': size, 'file_path': path}
+        elif method in ('sendMessage', 'editMessageText'):
+            result = {'message_id': int(data.get('message_id') or next(self.message_ids)), 'date': int(time.time()),
+                      'chat': {'id': int(chat_id), 'type': 'private'}, 'text': data.get('text', '')}
+        elif method == 'getMe':
+            result = {'id': 123456, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def download(self, request):
+        from aiohttp import web
+
+        await asyncio.sleep(self.args.telegram_latency)
+        size = next(size for path, size in self.files.values() if path == request.match_info['path'])
+        response = web.StreamResponse()
+        response.content_length = size
+        await response.prepare(request)
+        block = b'\0' * 65536
+        for offset in range(0, size, len(block)):
+            await response.write(block[:size - offset])
+        return response
+
+    async def start_upload(self, request):
+        from aiohttp import web
+
+        await asyncio.sleep(self.args.drive_latency)
+        sid = str(next(self.file_ids))
+        self.uploads[sid] = 0
+        host = request.headers['Host']
+        return web.Response(headers={'Location': f"http://{host}/upload/session/{sid}"})
+
+    async def put_chunk(self, request):
+        from aiohttp import web
+
+        await asyncio.sleep(self.args.drive_latency)
+        body = await request.read()
+        sid = request.match_info['sid']
+        if random.random() < self.args.drive_fail_rate:
+            self.failed_chunks += 1
+            return web.Response(status=503)
+        content_range = request.headers['Content-Range'][len('bytes '):]
+        span, total = content_range.split('/')
+        if span != '*':
+            start = int(span.split('-')[0])
+            if start == self.uploads[sid]:
+                self.uploads[sid] += len(body)
+                self.uploaded_bytes += len(body)
+        if total != '*' and self.uploads[sid] >= int(total):
+            return web.json_response({'id': f"drive_{sid}"})
+        headers = {'Range': f"bytes=0-{self.uploads[sid] - 1}"} if self.uploads[sid] else {}
+        return web.Response(status=308, headers=headers)
+
+    async def create_file(self, request):
+        from aiohttp import web
+
+        await asyncio.sleep(self.args.drive_latency)
+        self.shortcuts += 1
+        return web.json_response({'id': f"shortcut_{next(self.file_ids)}"})
+
+    async def permission(self, request):
+        from aiohttp import web
+
+        await asyncio.sleep(self.args.drive_latency)
+        return web.json_response({'id': 'anyone'})
+
+
+class LoopLagMonitor:
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(time.perf_counter() - start - self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        self._task.cancel()
+
+
+class SyntheticUser:
+    def __init__(self, index, stub, dp, args, step_latency):
+        self.user_id = 10_000 + index
+        self.stub = stub
+        self.dp = dp
+        self.args = args
+        self.step_latency = step_latency
+        self.ids = itertools.count(1)
+        self.media = None
+        self.last_finish = 0
+
+    def _message(self, **content):
+        return {
+            'message_id': next(self.ids),
+            'date': int(time.time()),
+            'chat': {'id': self.user_id, 'type': 'private'},
+            'from': {'id': self.user_id, 'is_bot': False, 'first_name': f'User{self.user_id}'},
+            **content,
+        }
+
+    def _callback(self, data):
+        return {
+            'id': f"{self.user_id}_{next(self.ids)}",
+            'from': {'id': self.user_id, 'is_bot': False, 'first_name': f'User{self.user_id}'},
+            'chat_instance': str(self.user_id),
+            'data': data,
+            'message': self._message(text='button'),
+        }
+
+    def _media_file(self, kind, size):
+        file_id = f"{kind}_{self.user_id}_{next(self.ids)}"
+        self.stub.files[file_id] = (f"{kind}s/{file_id}", size)
+        return file_id
+
+    async def step(self, name, **update):
+        from aiogram import types
+
+        update['update_id'] = next(self.ids)
+        start = time.perf_counter()
+        # Polling kabi har bir update alohida vazifada (aiogram holatni kontekstda keshlaydi)
+        await asyncio.create_task(self.dp.process_update(types.Update(**update)))
+        self.step_latency[name].append(time.perf_counter() - start)
+        await asyncio.sleep(self.args.think)
+
+    def _count_events(self, text):
+        return sum(1 for _, sent in self.stub.events[self.user_id] if text in sent)
+
+    async def wait_uploads(self, count):
+        deadline = time.monotonic() + self.args.timeout
+        while time.monotonic() < deadline:
+            done = sum(1 for method, text in self.stub.events[self.user_id]
+                       if method == 'editMessageText' and ('успешно' in text or 'Ошибка' in text))
+            if done >= count:
+                return
+            await asyncio.sleep(0.05)
+        raise TimeoutError(f"user {self.user_id}: uploads did not finish")
+
+    async def submit(self, uploads_before):
+        from keyboards.inline.callback_datas import cadastr_cb, finish_upload_cb, station_cb, transformer_cb
+
+        if not self.args.repeat_media or not self.media:
+            self.media = (self._media_file('photo', self.args.photo_size), self._media_file('video', self.args.video_size))
+        photo, video = self.media
+        await self.step('start', message=self._message(text='/start', entities=[
+            {'type': 'bot_command', 'offset': 0, 'length': 6}]))
+        if uploads_before == 0:
+            await self.step('manager_name', message=self._message(text='Bench Manager'))
+        await self.step('contact_name', message=self._message(text='Ivan'))
+        await self.step('phone', message=self._message(text='901234567'))
+        await self.step('address', message=self._message(text='Samarkand'))
+        await self.step('cadastr', callback_query=self._callback(cadastr_cb.new(value='yes')))
+        await self.step('transformer', callback_query=self._callback(transformer_cb.new(value='yes')))
+        await self.step('transformer_power', message=self._message(text='400'))
+        await self.step('free_power', message=self._message(text='120'))
+        await self.step('station', callback_query=self._callback(station_cb.new(power='60kwt')))
+        await self.step('location', message=self._message(location={'latitude': 39.65, 'longitude': 66.96}))
+        await self.step('location_info', message=self._message(text='near the bazaar'))
+        await self.step('photo', message=self._message(photo=[
+            {'file_id': photo, 'file_unique_id': photo, 'width': 1280, 'height': 960,
+             'file_size': self.args.photo_size}]))
+        await self.step('video', message=self._message(video={
+            'file_id': video, 'file_unique_id': video, 'width': 1280, 'height': 720, 'duration': 10,
+            'file_size': self.args.video_size}))
+        upload_start = time.perf_counter()
+        await self.wait_uploads(uploads_before + 2)
+        self.step_latency['uploads_done'].append(time.perf_counter() - upload_start)
+        # finish_upload rate_limit bilan cheklangan, keyingi raundlar shuni kutadi
+        from handlers.users.start import process_finish_upload
+        wait = self.last_finish + process_finish_upload.throttling_rate_limit - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        saved_before = self._count_events('Данные успешно сохранены')
+        await self.step('finish_upload', callback_query=self._callback(finish_upload_cb.new()))
+        # Limit hisobi handler ichida boshlanadi, shuning uchun vaqt qadamdan keyin olinadi
+        self.last_finish = time.monotonic()
+        if self._count_events('Данные успешно сохранены') == saved_before:
+            raise RuntimeError(f"user {self.user_id}: finish_upload was not accepted (rate limit?)")
+
+    async def run(self, submissions):
+        for round_no in range(self.args.rounds):
+            start = time.perf_counter()
+            await self.submit(uploads_before=round_no * 2)
+            self.step_latency['submission'].append(time.perf_counter() - start)
+            submissions.append(time.perf_counter())
+
+
+async def main(args):
+    from aiohttp import web
+
+    stub = StubServer(args)
+    runner = web.AppRunner(stub.make_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    base = f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+    sys.path.insert(0, ROOT)
+    from aiogram import Bot, Dispatcher
+    from aiogram.bot.api import TelegramAPIServer
+
+    import app
+    from loader import bot, dp, sheets_outbox, sheets_writer
+    from utils.google_api import drive, resumable
+
+    # Tashqi xizmatlar soxta server va xotiradagi fakelarga yo'naltiriladi
+    bot.server = TelegramAPIServer.from_base(base)
+    resumable.DRIVE_UPLOAD_URL = f"{base}/upload/drive/v3/files?uploadType=resumable&fields=id"
+    resumable.DRIVE_API_URL = f"{base}/drive/v3"
+
+    async def fake_token():
+        return 'benchmark'
+
+    resumable.get_access_token = fake_token
+    folder_ids = itertools.count(1)
+
+    def fake_create_folder(folder_name):
+        time.sleep(args.drive_latency * 2)
+        folder_id = f"folder_{next(folder_ids)}"
+        return folder_id, f"https://drive.google.com/drive/folders/{folder_id}"
+
+    drive._create_request_folder = fake_create_folder
+    sheet_rows = []
+
+    def fake_append(rows):
+        time.sleep(args.sheets_latency)
+        sheet_rows.extend(rows)
+
+    sheets_writer._append = fake_append
+    sheets_writer._read_all = lambda: list(sheet_rows)
+
+    Bot.set_current(bot)
+    Dispatcher.set_current(dp)
+    await app.on_startup(dp)
+
+    step_latency = defaultdict(list)
+    submissions = []
+    users = [SyntheticUser(i, stub, dp, args, step_latency) for i in range(args.users)]
+    lag = LoopLagMonitor()
+    lag.start()
+    start = time.perf_counter()
+    results = await asyncio.gather(*(user.run(submissions) for user in users), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    lag.stop()
+
+    # Outboxdagi qatorlar Sheets fakega yozilishini kutish
+    deadline = time.monotonic() + 30
+    while sheets_outbox.count() and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+
+    await app.on_shutdown(dp)
+    await dp.storage.close()
+    await (await bot.get_session()).close()
+    await runner.cleanup()
+
+    errors = [result for result in results if isinstance(result, Exception)]
+    print(f"\nusers {args.users}, rounds {args.rounds}, workers {args.workers}, "
+          f"telegram {args.telegram_latency * 1000:.0f} ms, drive {args.drive_latency * 1000:.0f} ms, "
+          f"sheets {args.sheets_latency * 1000:.0f} ms")
+    print(f"submissions: {len(submissions)} in {elapsed:.2f} s = {len(submissions) / elapsed:.2f}/s, "
+          f"errors: {len(errors)}")
+    print(f"sheet rows written: {len(sheet_rows)}, uploaded: {stub.uploaded_bytes / 1024 / 1024:.1f} MiB, "
+          f"failed Drive chunks: {stub.failed_chunks}, shortcuts: {stub.shortcuts}\n")
+    print("step latency (handler time):")
+    for name, values in step_latency.items():
+        print(f"  {name:18} {percentiles(values)}")
+    print(f"\nevent loop lag      {percentiles(lag.samples)}")
+    for error in errors[:5]:
+        print(f"error: {error!r}")
+
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    workdir = tempfile.mkdtemp(prefix='tokbot_bench_')
+    configure_env(arguments, workdir)
+    os.chdir(workdir)
+    asyncio.run(main(arguments))
@@ -11,4 +11,82 @@ IP = env.str("IP")
 GOOGLE_CREDENTIALS_FILE = 'tokbot-457507-6dd979a6599a.json'
 SPREADSHEET_ID = '1Uh5Xcgq_FdWofXWqwXRJTgXcp9i66SLFmIenfWYHRh4'
 SHEET_NAME = 'telegram_bot'
-DRIVE_FOLDER_ID = '1Pbv-4U-8ROfUWjNtZ_wSmXf8PBp4LC1M'
\ No newline at end of file
+DRIVE_FOLDER_ID = '1Pbv-4U-8ROfUWjNtZ_wSmXf8PBp4LC1M'
+
+# Drive yuklamalari navbati
+UPLOAD_WORKERS = env.int("UPLOAD_WORKERS", 4)
+UPLOAD_QUEUE_SIZE = env.int("UPLOAD_QUEUE_SIZE", 100)
+
+# Mahalliy ma'lumotlar bazasi (./data papkasi docker volume sifatida ulangan)
+DB_PATH = env.str("DB_PATH", "data/tokbot.db")
+
+# Google Sheets ga paketlab yozish
+SHEETS_BATCH_SIZE = env.int("SHEETS_BATCH_SIZE", 50)
+SHEETS_FLUSH_INTERVAL = env.float("SHEETS_FLUSH_INTERVAL", 2.0)
+SHEETS_MIN_INTERVAL = env.float("SHEETS_MIN_INTERVAL", 1.0)
+# Google Sheets rad etgan (4xx) qator shuncha urinishdan keyin chetga olinadi (dead letter)
+SHEETS_MAX_ATTEMPTS = env.int("SHEETS_MAX_ATTEMPTS", 5)
+
+# Ishga tushirish rejimi: polling (ishlab chiqish uchun), webhook yoki sharded (ko'p jarayonli)
+BOT_MODE = env.str("BOT_MODE", "polling")
+WEBHOOK_HOST = env.str("WEBHOOK_HOST", "")
+WEBHOOK_PATH = env.str("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = env.str("WEBHOOK_SECRET", "")
+WEBAPP_PORT = env.int("WEBAPP_PORT", 3001)
+WEBHOOK_MAX_CONCURRENCY = env.int("WEBHOOK_MAX_CONCURRENCY", 100)
+
+# Telegram ga chiquvchi xabarlar cheklovlari (sekundiga)
+OUTBOUND_GLOBAL_RATE = env.float("OUTBOUND_GLOBAL_RATE", 30)
+OUTBOUND_CHAT_RATE = env.float("OUTBOUND_CHAT_RATE", 1)
+OUTBOUND_CHAT_BURST = env.int("OUTBOUND_CHAT_BURST", 3)
+OUTBOUND_GROUP_RATE = env.float("OUTBOUND_GROUP_RATE", 20 / 60)
+
+# Prometheus metrikalari (/metrics); 0 - o'chirilgan
+METRICS_HOST = env.str("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = env.int("METRICS_PORT", 9091)
+
+# Loglar: json yoki text; takrorlanuvchi xatolar oynada (sekund) shuncha martadan ko'p yozilmaydi
+LOG_LEVEL = env.str("LOG_LEVEL", "INFO")
+LOG_FORMAT = env.str("LOG_FORMAT", "json")
+LOG_ERROR_BURST = env.int("LOG_ERROR_BURST", 5)
+LOG_ERROR_WINDOW = env.float("LOG_ERROR_WINDOW", 60)
+
+# Uzilgan Drive yuklamasini davom ettirish urinishlari
+UPLOAD_RETRIES = env.int("UPLOAD_RETRIES", 6)
+
+# Qayta yuborilgan media (file_unique_id bo'yicha) Drive da yorliq bilan bog'lanadi
+MEDIA_INDEX_SIZE = env.int("MEDIA_INDEX_SIZE", 50000)
+MEDIA_INDEX_TTL_DAYS = env.int("MEDIA_INDEX_TTL_DAYS", 90)
+
+# Media siyosati: rasm uchun eng katta tomon (0 - eng katta variant), ixtiyoriy siqish (Pillow / ffmpeg)
+MAX_PHOTO_SIDE = env.int("MAX_PHOTO_SIDE", 1280)
+PHOTO_RECOMPRESS = env.bool("PHOTO_RECOMPRESS", False)
+PHOTO_QUALITY = env.int("PHOTO_QUALITY", 82)
+VIDEO_TRANSCODE = env.bool("VIDEO_TRANSCODE", False)
+VIDEO_MAX_HEIGHT = env.int("VIDEO_MAX_HEIGHT", 720)
+VIDEO_MAX_BITRATE = env.int("VIDEO_MAX_BITRATE", 1500)
+MEDIA_WORKERS = env.int("MEDIA_WORKERS", 2)
+MEDIA_TMP_DIR = env.str("MEDIA_TMP_DIR", "")
+
+# Bot API manzili (bo'sh - api.telegram.org; lokal telegram-bot-api server uchun)
+BOT_API_SERVER = env.str("BOT_API_SERVER", "")
+
+# Har bir foydalanuvchi updatelari navbat bilan bajariladi: navbat hajmi va bo'sh navbat yashash vaqti (sekund)
+LANE_QUEUE_SIZE = env.int("LANE_QUEUE_SIZE", 100)
+LANE_IDLE_TIMEOUT = env.float("LANE_IDLE_TIMEOUT", 60.0)
+
+# Tashlab ketilgan forma sessiyalari: yashash vaqti (soat), umumiy chegara, xotiradagi kesh, tozalash oralig'i (sekund)
+FSM_SESSION_TTL_HOURS = env.float("FSM_SESSION_TTL_HOURS", 48)
+FSM_MAX_SESSIONS = env.int("FSM_MAX_SESSIONS", 100000)
+FSM_CACHE_SIZE = env.int("FSM_CACHE_SIZE", 10000)
+FSM_SWEEP_INTERVAL = env.int("FSM_SWEEP_INTERVAL", 600)
+# Muddati o'tgan sessiyaning bo'sh Drive papkasini o'chirish
+DELETE_EMPTY_FOLDERS = env.bool("DELETE_EMPTY_FOLDERS", False)
+
+# To'xtatishda (SIGTERM) yuklamalar va yozuvlarni yakunlash uchun vaqt (sekund); docker stop_grace_period dan kichik
+SHUTDOWN_TIMEOUT = env.float("SHUTDOWN_TIMEOUT", 25)
+
+# BOT_MODE=sharded: ingress jarayoni updatelarni foydalanuvchi ID bo'yicha SHARDS ta ishchiga taqsimlaydi
+SHARDS = env.int("SHARDS", 2)
+SHARD_INDEX = env.int("SHARD_INDEX", 0)
+SHARD_SOCKET_DIR = env.str("SHARD_SOCKET_DIR", "/tmp/tokbot")
@@ -0,0 +1,24 @@
+from aiogram import types
+from aiogram.dispatcher.filters import BoundFilter
+
+from data import config
+
+
+def admin_ids() -> set:
+    """
+    .env dagi ADMINS va start.py dagi ADMINS ro'yxatlari birlashmasi.
+    """
+    # start.py handlerlar bilan birga yuklanadi, shuning uchun import shu yerda
+    from handlers.users.start import ADMINS
+    return {int(admin) for admin in config.ADMINS} | set(ADMINS)
+
+
+class AdminFilter(BoundFilter):
+    key = 'is_admin'
+
+    def __init__(self, is_admin: bool):
+        self.is_admin = is_admin
+
+    async def check(self, obj: types.Message) -> bool:
+        user = types.User.get_current()
+        return (user is not None and user.id in admin_ids()) == self.is_admin
@@ -6,6 +6,7 @@ from aiogram.utils.exceptions import (Unauthorized, InvalidQueryID, TelegramAPIE
 
 
 from loader import dp
+from middlewares.metrics import observe_handler_error
 
 
 @dp.errors_handler()
@@ -17,42 +18,36 @@ async def errors_handler(update, exception):
     :param exception:
     :return: stdout logging
     """
+    observe_handler_error(exception)
 
-    if isinstance(exception, CantDemoteChatCreator):
-        logging.exception("Can't demote chat creator")
-        return True
-
-    if isinstance(exception, MessageNotModified):
-        logging.exception('Message is not modified')
-        return True
-    if isinstance(exception, MessageCantBeDeleted):
-        logging.exception('Message cant be deleted')
+    # Zararsiz xatolar: traceback kerak emas
+    if isinstance(exception, (MessageNotModified, MessageToDeleteNotFound, MessageCantBeDeleted, InvalidQueryID)):
+        logging.debug("%s: %s", type(exception).__name__, exception)
         return True
 
-    if isinstance(exception, MessageToDeleteNotFound):
-        logging.exception('Message to delete not found')
+    if isinstance(exception, CantDemoteChatCreator):
+        logging.warning("Can't demote chat creator")
         return True
 
     if isinstance(exception, MessageTextIsEmpty):
-        logging.exception('MessageTextIsEmpty')
+        logging.warning('MessageTextIsEmpty')
         return True
 
     if isinstance(exception, Unauthorized):
-        logging.exception(f'Unauthorized: {exception}')
-        return True
-
-    if isinstance(exception, InvalidQueryID):
-        logging.exception(f'InvalidQueryID: {exception} \nUpdate: {update}')
+        logging.warning('Unauthorized: %s', exception)
         return True
 
-    if isinstance(exception, TelegramAPIError):
-        logging.exception(f'TelegramAPIError: {exception} \nUpdate: {update}')
-        return True
     if isinstance(exception, RetryAfter):
-        logging.exception(f'RetryAfter: {exception} \nUpdate: {update}')
+        logging.warning('RetryAfter: %s', exception)
         return True
+
     if isinstance(exception, CantParseEntities):
-        logging.exception(f'CantParseEntities: {exception} \nUpdate: {update}')
+        logging.error('CantParseEntities: %s', exception, exc_info=exception)
         return True
-    
-    logging.exception(f'Update: {update} \n{exception}')
+
+    if isinstance(exception, TelegramAPIError):
+        logging.error('TelegramAPIError: %s', exception)
+        return True
+
+    # Update to'liq yozilmaydi: update_id va user_id log kontekstida bor
+    logging.error('Update %s: %s', getattr(update, 'update_id', None), exception, exc_info=exception)
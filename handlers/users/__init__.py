@@ -1,3 +1,9 @@
 from . import help
+from . import admin
 from . import start
-from . import echo
\ No newline at end of file
+from . import echo
+
+from loader import dp, router
+
+# Forma qadamlari routeri barcha komandalardan keyin ulanadi
+router.setup(dp)
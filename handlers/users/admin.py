@@ -0,0 +1,75 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+import pytz
+from aiogram import types
+from aiogram.dispatcher.filters.builtin import Command
+
+from loader import dp, submissions
+from utils.media_policy import media_policy
+from utils.reports import export_submissions, xlsx_available
+
+tz = pytz.timezone('Asia/Tashkent')
+
+# /stats sukut bo'yicha oxirgi necha kunni ko'rsatadi
+STATS_DAYS = 7
+# Xabar 4096 belgidan oshmasligi uchun
+STATS_TOP = 20
+
+
+def parse_period(args, default_days):
+    """
+    "/cmd [YYYY-MM-DD] [YYYY-MM-DD]" argumentlari; berilmasa oxirgi `default_days` kun.
+    """
+    today = datetime.now(tz).date()
+    dates = [datetime.strptime(arg, "%Y-%m-%d").date() for arg in args]
+    date_from = dates[0] if dates else today - timedelta(days=default_days - 1)
+    date_to = dates[1] if len(dates) > 1 else (dates[0] if dates else today)
+    return str(date_from), str(date_to)
+
+
+@dp.message_handler(Command('stats'), is_admin=True, state='*')
+async def admin_stats(message: types.Message):
+    try:
+        date_from, date_to = parse_period(message.get_args().split(), STATS_DAYS)
+    except ValueError:
+        await message.reply("<b>Формат:</b> /stats [ГГГГ-ММ-ДД] [ГГГГ-ММ-ДД]")
+        return
+    stats = submissions.stats(date_from, date_to)
+    total = sum(count for _, count in stats['days'])
+    lines = [f"📊 <b>Заявки {date_from} — {date_to}:</b> {total}", "", "<b>По менеджерам:</b>"]
+    lines += [f"{manager}: {count}" for manager, count in stats['managers'][:STATS_TOP]]
+    lines += ["", "<b>По станциям:</b>"]
+    lines += [f"{station}: {count}" for station, count in stats['stations']]
+    lines += ["", "<b>По дням:</b>"]
+    lines += [f"{day}: {count}" for day, count in stats['days'][:STATS_TOP]]
+    await message.answer("\n".join(lines))
+    logging.info("Admin %s statistikani oldi: %s - %s", message.from_user.id, date_from, date_to)
+
+
+@dp.message_handler(Command('export'), is_admin=True, state='*')
+async def admin_export(message: types.Message):
+    args = message.get_args().split()
+    fmt = 'csv'
+    if args and args[0].lower() in ('csv', 'xlsx'):
+        fmt = args.pop(0).lower()
+    if fmt == 'xlsx' and not xlsx_available():
+        await message.reply("XLSX недоступен (не установлен openpyxl), отправляю CSV.")
+        fmt = 'csv'
+    try:
+        date_from, date_to = parse_period(args, 1)
+    except ValueError:
+        await message.reply("<b>Формат:</b> /export [csv|xlsx] [ГГГГ-ММ-ДД] [ГГГГ-ММ-ДД]")
+        return
+    loop = asyncio.get_running_loop()
+    with media_policy.workdir() as directory:
+        # Fayl potokda sahifalab yoziladi, event loop bloklanmaydi
+        path, count = await loop.run_in_executor(
+            None, export_submissions, submissions, date_from, date_to, directory, fmt
+        )
+        await message.answer_document(
+            types.InputFile(path),
+            caption=f"📄 Заявки {date_from} — {date_to}: {count}"
+        )
+    logging.info("Admin %s eksport qildi: %s - %s, %s ta qator", message.from_user.id, date_from, date_to, count)
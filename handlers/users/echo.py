@@ -1,9 +1,9 @@
 from aiogram import types
 
-from loader import dp
+from loader import router
 
 
 # Echo bot
-@dp.message_handler(state=None)
+@router.message(state=None)
 async def bot_echo(message: types.Message):
     await message.answer(message.text)
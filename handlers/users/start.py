@@ -1,9 +1,10 @@
 
+import asyncio
 import os
 import time
 import logging
 import re
-import json
+from contextlib import asynccontextmanager
 from datetime import datetime
 
 import pytz
@@ -12,121 +13,27 @@ from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
 from aiogram.dispatcher.filters.builtin import CommandStart, Command
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from googleapiclient.errors import HttpError
-from data.config import GOOGLE_CREDENTIALS_FILE, SPREADSHEET_ID, SHEET_NAME, DRIVE_FOLDER_ID
-from loader import dp, bot
+from keyboards.inline.callback_datas import (cadastr_cb, finish_upload_cb, restart_request_cb, start_request_cb,
+                                             station_cb, transformer_cb)
+from loader import (dp, bot, db, router, managers, media_index, sheets_outbox, sheets_writer, submissions,
+                    upload_sessions)
 from states.Tok_Uchun import RequestForm
+from utils.google_api import (create_shortcut, request_folder, resumable_upload, skip_bytes, wait_request_folder,
+                              DriveUploadError)
+from utils.media_policy import file_source, media_policy, save_stream
+from utils.misc import MediaGroupCollector, rate_limit, upload_backpressure
+from utils.misc.metrics import track
+from utils.outbound import low_priority
+from utils.upload_queue import upload_queue, UploadQueueFull
 
 tz = pytz.timezone('Asia/Tashkent')
 
+# Albom (media group) xabarlarini yig‘uvchi
+album_collector = MediaGroupCollector()
+
 # Adminlar ro‘yxati
 ADMINS = [973358587]
 
-# Log sozlamalari
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-# JSON faylini o‘qish
-def load_users():
-    try:
-        if os.path.exists('users.json'):
-            with open('users.json', 'r') as f:
-                return json.load(f)
-        return {}
-    except Exception as e:
-        logging.error(f"users.json o‘qishda xato: {str(e)}")
-        return {}
-
-# JSON fayliga yozish
-def save_users(users):
-    try:
-        with open('users.json', 'w') as f:
-            json.dump(users, f, indent=4)
-        logging.info("users.json muvaffaqiyatli yangilandi")
-    except Exception as e:
-        logging.error(f"users.json yozishda xato: {str(e)}")
-
-# Google Sheets ga ulanish
-def connect_to_google_sheets():
-    try:
-        scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-        creds = ServiceAccountCredentials.from_json_keyfile_name(GOOGLE_CREDENTIALS_FILE, scope)
-        client = gspread.authorize(creds)
-        sheet = client.open_by_key(SPREADSHEET_ID).worksheet(SHEET_NAME)
-        return sheet
-    except Exception as e:
-        logging.error(f"Google Sheets ulanishda xato: {str(e)}")
-        raise
-
-# Google Drive ga ulanish
-def connect_to_google_drive():
-    try:
-        scope = ['https://www.googleapis.com/auth/drive']
-        creds = ServiceAccountCredentials.from_json_keyfile_name(GOOGLE_CREDENTIALS_FILE, scope)
-        drive_service = build('drive', 'v3', credentials=creds)
-        return drive_service
-    except Exception as e:
-        logging.error(f"Google Drive ulanishda xato: {str(e)}")
-        raise
-
-# Papka mavjudligini tekshirish
-def check_folder_exists(drive_service, folder_id):
-    try:
-        folder = drive_service.files().get(fileId=folder_id).execute()
-        logging.info(f"Papka mavjud: {folder['name']} (ID: {folder_id})")
-        return True
-    except HttpError as e:
-        logging.error(f"Papka ID {folder_id} topilmadi: {str(e)}")
-        return False
-
-# Yangi papka yaratish
-def create_drive_folder(drive_service, folder_name, parent_folder_id=None):
-    try:
-        file_metadata = {
-            'name': folder_name,
-            'mimeType': 'application/vnd.google-apps.folder'
-        }
-        if parent_folder_id:
-            file_metadata['parents'] = [parent_folder_id]
-        folder = drive_service.files().create(body=file_metadata, fields='id, webViewLink').execute()
-        folder_id = folder.get('id')
-        drive_service.permissions().create(
-            fileId=folder_id,
-            body={'type': 'anyone', 'role': 'reader'}
-        ).execute()
-        logging.info(f"Yangi papka yaratildi: {folder_name} (ID: {folder_id})")
-        return folder_id, folder.get('webViewLink')
-    except HttpError as e:
-        logging.error(f"Papka yaratishda xato: {str(e)}")
-        return None, None
-
-# Google Drive ga fayl yuklash
-def upload_to_drive(file_path, mime_type, folder_id):
-    try:
-        drive_service = connect_to_google_drive()
-        file_metadata = {
-            'name': os.path.basename(file_path),
-            'parents': [folder_id]
-        }
-        media = MediaFileUpload(file_path, mimetype=mime_type, resumable=True, chunksize=1024*1024)
-        file = drive_service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-        file_id = file.get('id')
-        drive_service.permissions().create(
-            fileId=file_id,
-            body={'type': 'anyone', 'role': 'reader'}
-        ).execute()
-        logging.info(f"Fayl muvaffaqiyatli yuklandi, ID: {file_id}")
-        return file_id
-    except HttpError as e:
-        logging.error(f"Google Drive ga yuklashda xato: {str(e)}")
-        return None
-    except Exception as e:
-        logging.error(f"Umumiy xato: {str(e)}")
-        return None
-
 # Manzil uchun klaviatura
 def get_location_keyboard():
     keyboard = ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
@@ -136,43 +43,43 @@ def get_location_keyboard():
 # Kadastr uchun inline tugmalar
 def get_cadastr_keyboard():
     keyboard = InlineKeyboardMarkup()
-    keyboard.add(InlineKeyboardButton("✅ Кадастр есть", callback_data="cadastr_yes"))
-    keyboard.add(InlineKeyboardButton("❌ Кадастр нет", callback_data="cadastr_no"))
+    keyboard.add(InlineKeyboardButton("✅ Кадастр есть", callback_data=cadastr_cb.new(value="yes")))
+    keyboard.add(InlineKeyboardButton("❌ Кадастр нет", callback_data=cadastr_cb.new(value="no")))
     return keyboard
 
 # Transformator uchun inline tugmalar
 def get_transformer_keyboard():
     keyboard = InlineKeyboardMarkup()
-    keyboard.add(InlineKeyboardButton("✅ Трансформатор есть", callback_data="transformer_yes"))
-    keyboard.add(InlineKeyboardButton("❌ Трансформатор нет", callback_data="transformer_no"))
+    keyboard.add(InlineKeyboardButton("✅ Трансформатор есть", callback_data=transformer_cb.new(value="yes")))
+    keyboard.add(InlineKeyboardButton("❌ Трансформатор нет", callback_data=transformer_cb.new(value="no")))
     return keyboard
 
 # So‘rov boshlash tugmasi
 def get_request_button():
     keyboard = InlineKeyboardMarkup()
-    keyboard.add(InlineKeyboardButton("📝 Начать запрос", callback_data="start_request"))
+    keyboard.add(InlineKeyboardButton("📝 Начать запрос", callback_data=start_request_cb.new()))
     return keyboard
 
 # Qayta boshlash tugmasi
 def get_restart_button():
     keyboard = InlineKeyboardMarkup()
-    keyboard.add(InlineKeyboardButton("🔄 Начать заново", callback_data="restart_request"))
+    keyboard.add(InlineKeyboardButton("🔄 Начать заново", callback_data=restart_request_cb.new()))
     return keyboard
 
 # Stansiya tanlash uchun inline tugmalar
 def get_station_keyboard():
     keyboard = InlineKeyboardMarkup()
-    keyboard.add(InlineKeyboardButton("20кВт", callback_data="station_20kwt"))
-    keyboard.add(InlineKeyboardButton("60кВт", callback_data="station_60kwt"))
-    keyboard.add(InlineKeyboardButton("80кВт", callback_data="station_80kwt"))
-    keyboard.add(InlineKeyboardButton("120кВт", callback_data="station_120kwt"))
-    keyboard.add(InlineKeyboardButton("160кВт", callback_data="station_160kwt"))
+    keyboard.add(InlineKeyboardButton("20кВт", callback_data=station_cb.new(power="20kwt")))
+    keyboard.add(InlineKeyboardButton("60кВт", callback_data=station_cb.new(power="60kwt")))
+    keyboard.add(InlineKeyboardButton("80кВт", callback_data=station_cb.new(power="80kwt")))
+    keyboard.add(InlineKeyboardButton("120кВт", callback_data=station_cb.new(power="120kwt")))
+    keyboard.add(InlineKeyboardButton("160кВт", callback_data=station_cb.new(power="160kwt")))
     return keyboard
 
 # Yakunlash uchun inline tugma
 def get_finish_button():
     keyboard = InlineKeyboardMarkup()
-    keyboard.add(InlineKeyboardButton("✅ Завершить", callback_data="finish_upload"))
+    keyboard.add(InlineKeyboardButton("✅ Завершить", callback_data=finish_upload_cb.new()))
     return keyboard
 
 
@@ -180,14 +87,13 @@ def get_finish_button():
 @dp.message_handler(CommandStart())
 async def bot_start(message: types.Message, state: FSMContext):
     user_id = str(message.from_user.id)
-    users = load_users()
-    if user_id in users:
+    manager_name = managers.get(user_id)
+    if manager_name:
         await RequestForm.contact_name.set()
-        async with state.proxy() as data:
-            data['manager_name'] = users[user_id]['manager_name']
+        await state.update_data(manager_name=manager_name)
         await message.answer(
             f"<b>Здравствуйте, {message.from_user.full_name}!</b> 🎉\n"
-            f"Текущий менеджер: {users[user_id]['manager_name']}\n"
+            f"Текущий менеджер: {manager_name}\n"
             f"Введите контактное лицо:",
             parse_mode="HTML"
         )
@@ -199,7 +105,7 @@ async def bot_start(message: types.Message, state: FSMContext):
             f"<i>В любой момент вы можете отменить процесс, введя команду /cancel.</i>",
             parse_mode="HTML"
         )
-    logging.info(f"Yangi foydalanuvchi: {user_id} - {message.from_user.full_name}")
+    logging.info("Yangi foydalanuvchi: %s - %s", user_id, message.from_user.full_name)
 
 # /change_manager komandasi
 @dp.message_handler(Command('change_manager'), state='*')
@@ -210,16 +116,14 @@ async def change_manager_command(message: types.Message, state: FSMContext):
         "<b>Введите новое имя менеджера:</b>",
         parse_mode="HTML"
     )
-    logging.info(f"Foydalanuvchi {message.from_user.id} menejer ismini o‘zgartirishni boshladi")
+    logging.info("Foydalanuvchi %s menejer ismini o‘zgartirishni boshladi", message.from_user.id)
 
 # Menejer ismini o‘zgartirish
-@dp.message_handler(state=RequestForm.change_manager)
+@router.message(state=RequestForm.change_manager)
 async def process_change_manager(message: types.Message, state: FSMContext):
     user_id = str(message.from_user.id)
     manager_name = message.text
-    users = load_users()
-    users[user_id] = {'manager_name': manager_name}
-    save_users(users)
+    managers.set(user_id, manager_name)
     await message.answer(
         f"<b>Имя менеджера успешно изменено на:</b> {manager_name}\n"
         f"Нажмите на кнопку ниже, чтобы начать запрос:",
@@ -227,19 +131,19 @@ async def process_change_manager(message: types.Message, state: FSMContext):
         reply_markup=get_request_button()
     )
     await state.finish()
-    logging.info(f"Foydalanuvchi {user_id} menejer ismini o‘zgartirdi: {manager_name}")
+    logging.info("Foydalanuvchi %s menejer ismini o‘zgartirdi: %s", user_id, manager_name)
 
 # So‘rov boshlash tugmasi
-@dp.callback_query_handler(lambda c: c.data == "start_request")
+@rate_limit(2, 'start_request')
+@router.callback(start_request_cb)
 async def start_request_callback(callback: types.CallbackQuery, state: FSMContext):
     user_id = str(callback.from_user.id)
-    users = load_users()
-    if user_id in users:
+    manager_name = managers.get(user_id)
+    if manager_name:
         await RequestForm.contact_name.set()
-        async with state.proxy() as data:
-            data['manager_name'] = users[user_id]['manager_name']
+        await state.update_data(manager_name=manager_name)
         await callback.message.answer(
-            f"<b>Текущий менеджер:</b> {users[user_id]['manager_name']}\n"
+            f"<b>Текущий менеджер:</b> {manager_name}\n"
             f"<b>Введите контактное лицо:</b>",
             parse_mode="HTML"
         )
@@ -250,16 +154,14 @@ async def start_request_callback(callback: types.CallbackQuery, state: FSMContex
             parse_mode="HTML"
         )
     await callback.message.delete()
-    logging.info(f"Foydalanuvchi {user_id} so‘rovni boshladi")
+    logging.info("Foydalanuvchi %s so‘rovni boshladi", user_id)
 
 # Menejer ismi
-@dp.message_handler(state=RequestForm.manager_name)
+@router.message(state=RequestForm.manager_name)
 async def process_manager_name(message: types.Message, state: FSMContext):
     user_id = str(message.from_user.id)
     manager_name = message.text
-    users = load_users()
-    users[user_id] = {'manager_name': manager_name}
-    save_users(users)
+    managers.set(user_id, manager_name)
     async with state.proxy() as data:
         data['manager_name'] = manager_name
     await RequestForm.contact_name.set()
@@ -267,20 +169,20 @@ async def process_manager_name(message: types.Message, state: FSMContext):
         "<b>Введите контактное лицо:</b>",
         parse_mode="HTML"
     )
-    logging.info(f"Foydalanuvchi {user_id} menejer ismini kiritdi: {manager_name}")
+    logging.info("Foydalanuvchi %s menejer ismini kiritdi: %s", user_id, manager_name)
 
 # Qayta boshlash
-@dp.callback_query_handler(lambda c: c.data == "restart_request", state="*")
+@rate_limit(2, 'restart_request')
+@router.callback(restart_request_cb, state="*")
 async def restart_request_callback(callback: types.CallbackQuery, state: FSMContext):
     await state.finish()
     user_id = str(callback.from_user.id)
-    users = load_users()
-    if user_id in users:
+    manager_name = managers.get(user_id)
+    if manager_name:
         await RequestForm.contact_name.set()
-        async with state.proxy() as data:
-            data['manager_name'] = users[user_id]['manager_name']
+        await state.update_data(manager_name=manager_name)
         await callback.message.answer(
-            f"<b>Текущий менеджер:</b> {users[user_id]['manager_name']}\n"
+            f"<b>Текущий менеджер:</b> {manager_name}\n"
             f"<b>Введите контактное лицо:</b>",
             parse_mode="HTML"
         )
@@ -291,7 +193,7 @@ async def restart_request_callback(callback: types.CallbackQuery, state: FSMCont
             parse_mode="HTML"
         )
     await callback.message.delete()
-    logging.info(f"Foydalanuvchi {user_id} so‘rovni qayta boshladi")
+    logging.info("Foydalanuvchi %s so‘rovni qayta boshladi", user_id)
 
 # /cancel komandasi
 @dp.message_handler(Command('cancel'), state='*')
@@ -302,10 +204,10 @@ async def cancel_process(message: types.Message, state: FSMContext):
         parse_mode="HTML",
         reply_markup=get_request_button()
     )
-    logging.info(f"Foydalanuvchi {message.from_user.id} jarayonni bekor qildi")
+    logging.info("Foydalanuvchi %s jarayonni bekor qildi", message.from_user.id)
 
 # Kontakt shaxs
-@dp.message_handler(state=RequestForm.contact_name)
+@router.message(state=RequestForm.contact_name)
 async def process_contact_name(message: types.Message, state: FSMContext):
     async with state.proxy() as data:
         data['contact_name'] = message.text
@@ -314,10 +216,10 @@ async def process_contact_name(message: types.Message, state: FSMContext):
         "<b>Введите контактный телефон:</b> (например, +998901234567 или 901234567)",
         parse_mode="HTML"
     )
-    logging.info(f"Foydalanuvchi {message.from_user.id} kontakt shaxsni kiritdi: {message.text}")
+    logging.info("Foydalanuvchi %s kontakt shaxsni kiritdi: %s", message.from_user.id, message.text)
 
 # Telefon
-@dp.message_handler(state=RequestForm.phone)
+@router.message(state=RequestForm.phone)
 async def process_phone(message: types.Message, state: FSMContext):
     phone = message.text
     if not (re.match(r'^\+998[0-9]{9}$', phone) or re.match(r'^[0-9]{9}$', phone)):
@@ -325,19 +227,25 @@ async def process_phone(message: types.Message, state: FSMContext):
             "<b>Пожалуйста, введите телефон в правильном формате:</b> (например, +998901234567 или 901234567)",
             parse_mode="HTML"
         )
-        logging.warning(f"Foydalanuvchi {message.from_user.id} noto‘g‘ri telefon formati: {phone}")
+        logging.warning("Foydalanuvchi %s noto‘g‘ri telefon formati: %s", message.from_user.id, phone)
         return
     async with state.proxy() as data:
         data['phone'] = phone
     await RequestForm.address.set()
-    await message.reply(
-        "<b>Введите адрес:</b> (например, Самарканд)",
-        parse_mode="HTML"
-    )
-    logging.info(f"Foydalanuvchi {message.from_user.id} telefon kiritdi: {phone}")
+    text = "<b>Введите адрес:</b> (например, Самарканд)"
+    # Takroriy so'rovni mahalliy indeks bo'yicha tekshirish (Google API chaqirilmaydi)
+    previous = submissions.find_by_phone(phone, limit=1)
+    if previous:
+        text = (
+            f"⚠️ <b>Этот номер уже есть в заявке</b> от {previous[0]['created_at']} "
+            f"(менеджер: {previous[0]['manager']}).\n\n" + text
+        )
+        logging.info("Foydalanuvchi %s takroriy telefon kiritdi: %s", message.from_user.id, phone)
+    await message.reply(text, parse_mode="HTML")
+    logging.info("Foydalanuvchi %s telefon kiritdi: %s", message.from_user.id, phone)
 
 # Manzil
-@dp.message_handler(state=RequestForm.address)
+@router.message(state=RequestForm.address)
 async def process_address(message: types.Message, state: FSMContext):
     async with state.proxy() as data:
         data['address'] = message.text
@@ -347,13 +255,13 @@ async def process_address(message: types.Message, state: FSMContext):
         parse_mode="HTML",
         reply_markup=get_cadastr_keyboard()
     )
-    logging.info(f"Foydalanuvchi {message.from_user.id} manzil kiritdi: {message.text}")
+    logging.info("Foydalanuvchi %s manzil kiritdi: %s", message.from_user.id, message.text)
 
 # Kadastr tanlash
-@dp.callback_query_handler(lambda c: c.data in ["cadastr_yes", "cadastr_no"], state=RequestForm.cadastr_number)
-async def process_cadastr_choice(callback: types.CallbackQuery, state: FSMContext):
+@router.callback(cadastr_cb, state=RequestForm.cadastr_number)
+async def process_cadastr_choice(callback: types.CallbackQuery, state: FSMContext, callback_data: dict):
     async with state.proxy() as data:
-        data['has_cadastr'] = "Есть" if callback.data == "cadastr_yes" else "Нет"
+        data['has_cadastr'] = "Есть" if callback_data['value'] == "yes" else "Нет"
     await RequestForm.has_transformer.set()
     await callback.message.answer(
         "<b>У вас есть трансформатор?</b>",
@@ -361,13 +269,13 @@ async def process_cadastr_choice(callback: types.CallbackQuery, state: FSMContex
         reply_markup=get_transformer_keyboard()
     )
     await callback.message.delete()
-    logging.info(f"Foydalanuvchi {callback.from_user.id} kadastr tanladi: {data['has_cadastr']}")
+    logging.info("Foydalanuvchi %s kadastr tanladi: %s", callback.from_user.id, data['has_cadastr'])
 
 # Transformator tanlash
-@dp.callback_query_handler(lambda c: c.data in ["transformer_yes", "transformer_no"], state=RequestForm.has_transformer)
-async def process_transformer_choice(callback: types.CallbackQuery, state: FSMContext):
+@router.callback(transformer_cb, state=RequestForm.has_transformer)
+async def process_transformer_choice(callback: types.CallbackQuery, state: FSMContext, callback_data: dict):
     async with state.proxy() as data:
-        if callback.data == "transformer_yes":
+        if callback_data['value'] == "yes":
             data['has_transformer'] = "Есть"
             await RequestForm.transformer_power.set()
             await callback.message.answer(
@@ -386,56 +294,56 @@ async def process_transformer_choice(callback: types.CallbackQuery, state: FSMCo
                 reply_markup=get_location_keyboard()
             )
     await callback.message.delete()
-    logging.info(f"Foydalanuvchi {callback.from_user.id} transformator tanladi: {data['has_transformer']}")
+    logging.info("Foydalanuvchi %s transformator tanladi: %s", callback.from_user.id, data['has_transformer'])
 
 # TP quvvati
-@dp.message_handler(state=RequestForm.transformer_power)
+@router.message(state=RequestForm.transformer_power)
 async def process_transformer_power(message: types.Message, state: FSMContext):
     power = message.text
     if not re.match(r'^\d+$', power):
         await message.reply("<b>Пожалуйста, введите мощность ТП в виде числа (кВт):</b>", parse_mode="HTML")
-        logging.warning(f"Foydalanuvchi {message.from_user.id} noto‘g‘ri TP quvvati formati: {power}")
+        logging.warning("Foydalanuvchi %s noto‘g‘ri TP quvvati formati: %s", message.from_user.id, power)
         return
     async with state.proxy() as data:
         data['transformer_power'] = power
     await RequestForm.free_power.set()
     await message.reply("<b>Введите свободную мощность ТП (кВт):</b>", parse_mode="HTML")
-    logging.info(f"Foydalanuvchi {message.from_user.id} TP quvvatini kiritdi: {power}")
+    logging.info("Foydalanuvchi %s TP quvvatini kiritdi: %s", message.from_user.id, power)
 
 # Bo‘sh quvvat
-@dp.message_handler(state=RequestForm.free_power)
+@router.message(state=RequestForm.free_power)
 async def process_free_power(message: types.Message, state: FSMContext):
     free_power = message.text
     if not re.match(r'^\d+$', free_power):
         await message.reply("<b>Пожалуйста, введите свободную мощность ТП в виде числа (кВт):</b>", parse_mode="HTML")
-        logging.warning(f"Foydalanuvchi {message.from_user.id} noto‘g‘ri bo‘sh quvvat formati: {free_power}")
+        logging.warning("Foydalanuvchi %s noto‘g‘ri bo‘sh quvvat formati: %s", message.from_user.id, free_power)
         return
     async with state.proxy() as data:
         data['free_power'] = free_power
     await RequestForm.station.set()
     await message.reply("<b>Выберите станцию:</b>", parse_mode="HTML", reply_markup=get_station_keyboard())
-    logging.info(f"Foydalanuvchi {message.from_user.id} bo‘sh quvvatni kiritdi: {free_power}")
+    logging.info("Foydalanuvchi %s bo‘sh quvvatni kiritdi: %s", message.from_user.id, free_power)
 
 # Stansiya tanlash
-@dp.callback_query_handler(lambda c: c.data.startswith("station_"), state=RequestForm.station)
-async def process_station(callback: types.CallbackQuery, state: FSMContext):
+@router.callback(station_cb, state=RequestForm.station)
+async def process_station(callback: types.CallbackQuery, state: FSMContext, callback_data: dict):
     station_mapping = {
-        "station_20kwt": "20кВт",
-        "station_60kwt": "60кВт",
-        "station_80kwt": "80кВт",
-        "station_120kwt": "120кВт",
-        "station_160kwt": "160кВт"
+        "20kwt": "20кВт",
+        "60kwt": "60кВт",
+        "80kwt": "80кВт",
+        "120kwt": "120кВт",
+        "160kwt": "160кВт"
     }
-    station = station_mapping[callback.data]
+    station = station_mapping[callback_data['power']]
     async with state.proxy() as data:
         data['station'] = station
     await RequestForm.location.set()
     await callback.message.answer("<b>Отправьте местоположение:</b>", parse_mode="HTML", reply_markup=get_location_keyboard())
     await callback.message.delete()
-    logging.info(f"Foydalanuvchi {callback.from_user.id} stansiya tanladi: {station}")
+    logging.info("Foydalanuvchi %s stansiya tanladi: %s", callback.from_user.id, station)
 
 # Manzil
-@dp.message_handler(content_types=['location'], state=RequestForm.location)
+@router.message(state=RequestForm.location, content_types=['location'])
 async def process_location(message: types.Message, state: FSMContext):
     async with state.proxy() as data:
         latitude = message.location.latitude
@@ -447,80 +355,260 @@ async def process_location(message: types.Message, state: FSMContext):
         parse_mode="HTML",
         reply_markup=types.ReplyKeyboardRemove()
     )
-    logging.info(f"Foydalanuvchi {message.from_user.id} manzil yubordi: {data['location_link']}")
+    logging.info("Foydalanuvchi %s manzil yubordi: %s", message.from_user.id, data['location_link'])
 
-@dp.message_handler(state=RequestForm.location)
+@router.message(state=RequestForm.location)
 async def invalid_location(message: types.Message):
     await message.reply(
         "<b>Пожалуйста, отправьте местоположение через кнопку:</b>",
         parse_mode="HTML",
         reply_markup=get_location_keyboard()
     )
-    logging.warning(f"Foydalanuvchi {message.from_user.id} noto‘g‘ri manzil formati")
+    logging.warning("Foydalanuvchi %s noto‘g‘ri manzil formati", message.from_user.id)
 
 # Qo‘shimcha manzil ma’lumotlari
-@dp.message_handler(state=RequestForm.location_info)
+@router.message(state=RequestForm.location_info)
 async def process_location_info(message: types.Message, state: FSMContext):
-    async with state.proxy() as data:
-        data['location_info'] = message.text
-        drive_service = connect_to_google_drive()
-        folder_name = f"Request_{message.from_user.id}_{datetime.now(tz).strftime('%Y-%m-%d_%H-%M')}"
-        folder_id, folder_link = create_drive_folder(drive_service, folder_name, DRIVE_FOLDER_ID)
-        if folder_id:
-            data['folder_id'] = folder_id
-            data['folder_link'] = folder_link
-        else:
-            data['folder_id'] = DRIVE_FOLDER_ID
-            data['folder_link'] = f"https://drive.google.com/drive/folders/{DRIVE_FOLDER_ID}"
+    # Drive papkasi birinchi media yuborilganda yaratiladi
+    folder_name = f"Request_{message.from_user.id}_{datetime.now(tz).strftime('%Y-%m-%d_%H-%M-%S')}"
+    await state.update_data(location_info=message.text, folder_name=folder_name)
     await RequestForm.media_upload.set()
     await message.reply(
         "<b>Отправьте фото или видео места:</b>",
         parse_mode="HTML"
     )
-    logging.info(f"Foydalanuvchi {message.from_user.id} qo‘shimcha manzil ma’lumotini kiritdi: {message.text}")
+    logging.info("Foydalanuvchi %s qo‘shimcha manzil ma’lumotini kiritdi: %s", message.from_user.id, message.text)
+
+# Telegram faylini Drive ga uzatish; uzilsa Drive tasdiqlagan baytdan davom etadi
+async def upload_telegram_file(key, telegram_file_id, name, mime_type, folder_id):
+    with track('telegram_get_file'):
+        file_info = await bot.get_file(telegram_file_id)
+    session = await bot.get_session()
+
+    @asynccontextmanager
+    async def open_source(offset):
+        # file_path bir soat amal qiladi, har urinishda yangilanadi
+        path = file_info.file_path if not offset else (await bot.get_file(telegram_file_id)).file_path
+        headers = {'Range': f"bytes={offset}-"} if offset else None
+        async with session.get(bot.get_file_url(path), headers=headers, raise_for_status=True) as response:
+            chunks = response.content.iter_chunked(64 * 1024)
+            if offset and response.status != 206:
+                chunks = skip_bytes(chunks, offset)
+            yield chunks
+
+    with track('drive_upload'):
+        return await resumable_upload(session, open_source, name, mime_type, folder_id, file_info.file_size,
+                                      upload_sessions, key)
+
+# Siqiladigan fayl: vaqtinchalik faylga yuklab olinadi, siqiladi va Drive ga yuboriladi
+async def upload_processed_file(telegram_file_id, name, mime_type, folder_id, file_type):
+    with track('telegram_get_file'):
+        file_info = await bot.get_file(telegram_file_id)
+    session = await bot.get_session()
+    with media_policy.workdir() as workdir:
+        source = os.path.join(workdir, 'source')
+        with track('telegram_download'):
+            async with session.get(bot.get_file_url(file_info.file_path), raise_for_status=True) as response:
+                await save_stream(response.content.iter_chunked(1024 * 1024), source)
+        with track(f'{file_type}_compress'):
+            path = await media_policy.process(file_type, source)
+        with track('drive_upload'):
+            return await resumable_upload(session, lambda offset: file_source(path, offset), name, mime_type,
+                                          folder_id, os.path.getsize(path))
+
+# Oldin yuklangan fayl uchun Drive da yorliq yaratish (yuklab olish va yuklashsiz)
+async def link_known_media(unique_id, name, folder_id):
+    target_id = media_index.get(unique_id)
+    if not target_id:
+        return None
+    try:
+        with track('drive_create_shortcut'):
+            shortcut_id = await create_shortcut(await bot.get_session(), target_id, name, folder_id)
+    except DriveUploadError as e:
+        if e.status == 404:
+            # Asl fayl o‘chirilgan
+            media_index.remove(unique_id)
+        logging.warning("Yorliq yaratilmadi %s, fayl qayta yuklanadi: %s", name, e)
+        return None
+    logging.info("Takroriy fayl %s yuklanmadi, yorliq yaratildi: %s -> %s", name, shortcut_id, target_id)
+    return shortcut_id
 
-# Media fayllar (rasm yoki video)
-@dp.message_handler(content_types=['photo', 'video'], state=RequestForm.media_upload)
-async def process_media(message: types.Message, state: FSMContext):
-    async with state.proxy() as data:
-        file_type = 'photo' if message.photo else 'video'
-        file_id = message.photo[-1].file_id if message.photo else message.video.file_id
-        file_info = await bot.get_file(file_id)
-        file_path = file_info.file_path
-        file_ext = '.jpg' if message.photo else '.mp4'
-        mime_type = 'image/jpeg' if message.photo else 'video/mp4'
+# Telegramdan yuklab olish oqimini to‘g‘ridan-to‘g‘ri Drive ga uzatish (navbat ichida bajariladi)
+# folder - media kelgan paytdagi so‘rov papkasi (request_folder)
+async def stream_media(folder, telegram_file_id, name, mime_type, file_type=None, loading_message=None,
+                       unique_id=None, process=False, user_id=None):
+    try:
+        folder_id, _ = await asyncio.shield(folder)
+        if unique_id:
+            shortcut_id = await link_known_media(unique_id, name, folder_id)
+            if shortcut_id:
+                return shortcut_id
+        upload_sessions.start(
+            name, telegram_file_id, name, mime_type, folder_id, file_type,
+            loading_message.chat.id if loading_message else None,
+            loading_message.message_id if loading_message else None, user_id=user_id
+        )
+        if process:
+            # Siqilgan fayl qayta ishga tushishda xom holda qaytadan yuklanadi
+            file_id = await upload_processed_file(telegram_file_id, name, mime_type, folder_id, file_type)
+        else:
+            file_id = await upload_telegram_file(name, telegram_file_id, name, mime_type, folder_id)
+        if unique_id:
+            media_index.put(unique_id, file_id)
+    except Exception as e:
+        logging.error("Google Drive ga yuklashda xato: %s", e)
+        file_id = None
+    upload_sessions.remove(name)
+    return file_id
+
+# Bot to‘xtatilganda tugamagan yuklamani saqlash (resume_uploads keyingi ishga tushishda davom ettiradi)
+async def checkpoint_media(folder, telegram_file_id, name, mime_type, file_type=None, loading_message=None,
+                           unique_id=None, process=False, user_id=None):
+    if upload_sessions.get(name):
+        return
+    folder_id, _ = await asyncio.shield(folder)
+    upload_sessions.start(
+        name, telegram_file_id, name, mime_type, folder_id, file_type,
+        loading_message.chat.id if loading_message else None,
+        loading_message.message_id if loading_message else None, user_id=user_id
+    )
+
+# To‘xtatishdan oldin yig‘ilayotgan albomlarni navbatga topshirish
+async def flush_albums():
+    album_collector.flush()
+    # process_album vazifalari birinchi await gacha (navbatga qo‘yish) bajariladi
+    await asyncio.sleep(0)
+
+# Qayta ishga tushishda uzilib qolgan yuklamani davom ettirish
+async def resume_media(row):
+    try:
+        file_id = await upload_telegram_file(
+            row['key'], row['telegram_file_id'], row['name'], row['mime_type'], row['folder_id']
+        )
+    except Exception as e:
+        logging.error("Uzilgan yuklama davom ettirilmadi %s: %s", row['name'], e)
+        file_id = None
+    upload_sessions.remove(row['key'])
+    return file_id
+
+async def resume_uploads(shards=1, shard_index=0):
+    # Har bir shard faqat o‘z foydalanuvchilarining yuklamalarini davom ettiradi (boshqalari ularda ishlayapti)
+    rows = upload_sessions.pending(shards, shard_index)
+    for index, row in enumerate(rows):
+        try:
+            job = upload_queue.submit(resume_media, row, name=row['name'])
+        except UploadQueueFull:
+            logging.warning("Yuklash navbati to‘ldi, qolgan %s ta yuklama keyingi safar davom ettiriladi",
+                            len(rows) - index)
+            rows = rows[:index]
+            break
+        if row['message_id']:
+            # Eski yozuvlarda user_id yo‘q; shaxsiy chatda u chat_id ga teng
+            upload_queue.spawn(report_upload(job, row['chat_id'], row['message_id'], row['file_type'],
+                                             row['user_id'] or row['chat_id']))
+    if rows:
+        logging.info("Uzilgan %s ta yuklama davom ettirilmoqda", len(rows))
+
+# Yuklash tugagach "Загружается..." xabarini yangilash
+async def report_upload(job, chat_id, message_id, file_type, user_id):
+    try:
+        file_id = await job.wait()
+    except Exception:
+        file_id = None
+    if file_id:
+        await bot.edit_message_text(
+            f"<b>{'Фото' if file_type == 'photo' else 'Видео'} успешно загружено!</b> ✅\n"
+            f"Отправьте ещё фото/видео или завершите:",
+            chat_id, message_id,
+            parse_mode="HTML",
+            reply_markup=get_finish_button()
+        )
+    else:
+        await bot.edit_message_text(
+            "<b>Ошибка при загрузке файла.</b> ❌\n"
+            f"Попробуйте снова или завершите:",
+            chat_id, message_id,
+            parse_mode="HTML",
+            reply_markup=get_finish_button()
+        )
+        logging.warning("%s fayl yuklanmadi, foydalanuvchi: %s", file_type.capitalize(), user_id)
+    logging.info("Foydalanuvchi %s %s yukladi, fayl ID: %s", user_id, file_type, file_id)
+
+# Xabardagi media fayl parametrlari
+def get_media_params(message: types.Message):
+    file_type = 'photo' if message.photo else 'video'
+    media = media_policy.pick_photo(message.photo) if message.photo else message.video
+    file_ext = '.jpg' if message.photo else '.mp4'
+    mime_type = 'image/jpeg' if message.photo else 'video/mp4'
+    file_name = f"{message.from_user.id}_{int(time.time())}_{message.message_id}_{file_type}{file_ext}"
+    process = media_policy.needs_processing(file_type, media)
+    return file_type, media.file_id, media.file_unique_id, file_name, mime_type, process
+
+# Albom fayllarini parallel yuklash, bitta xabar bilan
+async def process_album(messages, folder):
+    user_id = messages[0].from_user.id
+    # Vazifalar xabar yuborilishidan oldin navbatga qo‘yiladi (to‘xtatishda ham yo‘qolmaydi)
+    jobs = []
+    for message in messages:
+        file_type, file_id, unique_id, file_name, mime_type, process = get_media_params(message)
+        try:
+            jobs.append(upload_queue.submit(stream_media, folder, file_id, file_name, mime_type, file_type, None,
+                                            unique_id, process, user_id, name=file_name,
+                                            checkpoint=checkpoint_media))
+        except UploadQueueFull as e:
+            logging.warning("Foydalanuvchi %s albom fayli qabul qilinmadi: %s", user_id, e)
+    loading_message = await messages[0].reply(
+        f"<b>Загружается {len(messages)} файлов...</b>",
+        parse_mode="HTML"
+    )
 
-        temp_file = f"temp_{message.from_user.id}_{int(time.time())}_{file_type}{file_ext}"
+    results = await asyncio.gather(*(job.wait() for job in jobs), return_exceptions=True)
+    uploaded = sum(1 for result in results if result and not isinstance(result, Exception))
+    if uploaded == len(messages):
+        text = f"<b>Все файлы ({uploaded}) успешно загружены!</b> ✅\n"
+    else:
+        text = f"<b>Загружено {uploaded} из {len(messages)} файлов.</b> ❌\n"
+        logging.warning("Albom to‘liq yuklanmadi (%s/%s), foydalanuvchi: %s", uploaded, len(messages), user_id)
+    await loading_message.edit_text(
+        text + "Отправьте ещё фото/видео или завершите:",
+        parse_mode="HTML",
+        reply_markup=get_finish_button()
+    )
+    logging.info("Foydalanuvchi %s albom yukladi: %s/%s", user_id, uploaded, len(messages))
 
-        loading_message = await message.reply("<b>Загружается...</b>", parse_mode="HTML")
+# Media fayllar (rasm yoki video)
+@upload_backpressure
+@router.message(state=RequestForm.media_upload, content_types=['photo', 'video'])
+async def process_media(message: types.Message, state: FSMContext):
+    # Papka shu paytdagi so‘rovga bog‘lanadi: navbat kechiksa ham fayl keyingi so‘rovga tushmaydi
+    folder = request_folder(state, await state.get_data())
+    if message.media_group_id:
+        # Albom xabarlari yig‘ilib, bitta vazifa sifatida yuklanadi
+        album_collector.add(message, lambda messages: upload_queue.spawn(process_album(messages, folder)))
+        return
 
-        await bot.download_file(file_path, temp_file)
+    file_type, file_id, unique_id, file_name, mime_type, process = get_media_params(message)
 
-        folder_id = data.get('folder_id', DRIVE_FOLDER_ID)
-        file_id = upload_to_drive(temp_file, mime_type, folder_id)
-        if file_id:
-            await loading_message.edit_text(
-                f"<b>{'Фото' if file_type == 'photo' else 'Видео'} успешно загружено!</b> ✅\n"
-                f"Отправьте ещё фото/видео или завершите:",
-                parse_mode="HTML",
-                reply_markup=get_finish_button()
-            )
-        else:
-            await loading_message.edit_text(
-                "<b>Ошибка при загрузке файла.</b> ❌\n"
-                f"Попробуйте снова или завершите:",
-                parse_mode="HTML",
-                reply_markup=get_finish_button()
-            )
-            logging.warning(f"{file_type.capitalize()} fayl yuklanmadi, foydalanuvchi: {message.from_user.id}")
+    loading_message = await message.reply("<b>Загружается...</b>", parse_mode="HTML")
 
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
+    try:
+        job = upload_queue.submit(stream_media, folder, file_id, file_name, mime_type, file_type, loading_message,
+                                  unique_id, process, message.from_user.id, name=file_name,
+                                  checkpoint=checkpoint_media)
+    except UploadQueueFull as e:
+        await loading_message.edit_text(
+            "<b>Сервер занят, попробуйте отправить файл чуть позже.</b> ⏳",
+            parse_mode="HTML",
+            reply_markup=get_finish_button()
+        )
+        logging.warning("Foydalanuvchi %s fayli qabul qilinmadi: %s", message.from_user.id, e)
+        return
 
-        logging.info(f"Foydalanuvchi {message.from_user.id} {file_type} yukladi, papka ID: {folder_id}")
+    upload_queue.spawn(report_upload(job, loading_message.chat.id, loading_message.message_id, file_type,
+                                     message.from_user.id))
 
 # Noto‘g‘ri media formati
-@dp.message_handler(state=RequestForm.media_upload, content_types=types.ContentType.ANY)
+@router.message(state=RequestForm.media_upload, content_types=types.ContentType.ANY)
 async def invalid_media(message: types.Message):
     await message.reply(
         "<b>Пожалуйста, отправьте только фото или видео:</b>\n"
@@ -528,67 +616,81 @@ async def invalid_media(message: types.Message):
         parse_mode="HTML",
         reply_markup=get_finish_button()
     )
-    logging.warning(f"Foydalanuvchi {message.from_user.id} noto‘g‘ri media formati yubordi")
+    logging.warning("Foydalanuvchi %s noto‘g‘ri media formati yubordi", message.from_user.id)
 
-# Yakunlash tugmasi
-@dp.callback_query_handler(lambda c: c.data == "finish_upload", state=RequestForm.media_upload)
-async def process_finish_upload(callback: types.CallbackQuery, state: FSMContext):
-    async with state.proxy() as data:
-        current_time = datetime.now(tz).strftime("%Y-%m-%d %H:%M:%S")
+# Yangi so‘rov haqida adminlarga xabar (foydalanuvchi javoblaridan keyin, parallel)
+async def notify_admins_about_request(admin_message, user_id):
+    async def send(admin_id):
         try:
-            sheet = connect_to_google_sheets()
-            folder_link = data.get('folder_link', "Не загружено")
-            manager_name = data.get('manager_name', "Не указано")
-            sheet.append_row([
-                manager_name,
-                current_time,
-                data['contact_name'],
-                data['phone'],
-                data['address'],
-                data['has_cadastr'],
-                data['has_transformer'],
-                data['transformer_power'],
-                data['free_power'],
-                data['station'],
-                folder_link,
-                data['location_link'],
-                data['location_info']
-            ])
-            logging.info(f"Ma’lumotlar Google Sheets ga yozildi: {callback.from_user.id}")
+            await bot.send_message(int(admin_id), admin_message, parse_mode="HTML")
+            logging.info("So‘rov admin ga yuborildi: %s, foydalanuvchi: %s", admin_id, user_id)
         except Exception as e:
-            logging.error(f"Google Sheets ga yozishda xato: {str(e)}")
-            await callback.message.answer(
-                "⚠ <b>Произошла ошибка при сохранении данных.</b> Попробуйте снова.",
-                parse_mode="HTML",
-                reply_markup=get_restart_button()
-            )
-            await state.finish()
-            return
-
-        admin_message = (
-            f"<b>Новый запрос:</b>\n"
-            f"👤 Имя менеджера: {manager_name}\n"
-            f"⏰ Время: {current_time}\n"
-            f"👤 Контактное лицо: {data['contact_name']}\n"
-            f"📞 Телефон: {data['phone']}\n"
-            f"🏠 Адрес: {data['address']}\n"
-            f"📜 Кадастровый: {data['has_cadastr']}\n"
-            f"⚡ Трансформатор: {data['has_transformer']}\n"
-            f"🔌 Мощность ТП: {data['transformer_power'] or 'Не указано'} кВт\n"
-            f"🔋 Свободная мощность ТП: {data['free_power'] or 'Не указано'} кВт\n"
-            f"🏭 Станция: {data['station'] or 'Не указано'}\n"
-            f"📍 Местоположение: {data['location_link'] or 'Не указано'}\n"
-            f"ℹ Доп. информация: {data['location_info'] or 'Не указано'}\n"
-            f"📸/🎥 Медиа: {folder_link}"
+            logging.error("Admin ga yuborishda xato %s: %s", admin_id, e)
+
+    with low_priority():
+        await asyncio.gather(*(send(admin_id) for admin_id in ADMINS))
+
+# Yakunlash tugmasi
+@rate_limit(5, 'finish_upload')
+@router.callback(finish_upload_cb, state=RequestForm.media_upload)
+async def process_finish_upload(callback: types.CallbackQuery, state: FSMContext):
+    await wait_request_folder(state)
+    data = await state.get_data()
+    current_time = datetime.now(tz).strftime("%Y-%m-%d %H:%M:%S")
+    folder_link = data.get('folder_link', "Не загружено")
+    manager_name = data.get('manager_name', "Не указано")
+    try:
+        # Avval mahalliy outboxga yoziladi, Google Sheets ga fon vazifasi yuboradi
+        row = [
+            manager_name,
+            current_time,
+            data['contact_name'],
+            data['phone'],
+            data['address'],
+            data['has_cadastr'],
+            data['has_transformer'],
+            data['transformer_power'],
+            data['free_power'],
+            data['station'],
+            folder_link,
+            data['location_link'],
+            data['location_info']
+        ]
+        # Mahalliy indeks va outbox bitta tranzaksiyada
+        with db.transaction():
+            sheets_outbox.add(row)
+            submissions.add(row, user_id=callback.from_user.id)
+        sheets_writer.notify()
+        logging.info("Ma’lumotlar Google Sheets navbatiga yozildi: %s", callback.from_user.id)
+    except Exception as e:
+        logging.error("Ma’lumotlarni saqlashda xato: %s", e)
+        # Forma ma'lumotlari saqlanib qoladi, foydalanuvchi qayta urinishi mumkin
+        await callback.message.answer(
+            "⚠ <b>Произошла ошибка при сохранении данных.</b> Попробуйте снова.",
+            parse_mode="HTML",
+            reply_markup=get_finish_button()
         )
-        for admin_id in ADMINS:
-            try:
-                await bot.send_message(int(admin_id), admin_message, parse_mode="HTML")
-                logging.info(f"So‘rov admin ga yuborildi: {admin_id}, foydalanuvchi: {callback.from_user.id}")
-            except Exception as e:
-                logging.error(f"Admin ga yuborishda xato {admin_id}: {str(e)}")
-
-        logging.info(f"Foydalanuvchi {callback.from_user.id} so‘rovni yakunladi, papka havolasi: {folder_link}")
+        return
+
+    admin_message = (
+        f"<b>Новый запрос:</b>\n"
+        f"👤 Имя менеджера: {manager_name}\n"
+        f"⏰ Время: {current_time}\n"
+        f"👤 Контактное лицо: {data['contact_name']}\n"
+        f"📞 Телефон: {data['phone']}\n"
+        f"🏠 Адрес: {data['address']}\n"
+        f"📜 Кадастровый: {data['has_cadastr']}\n"
+        f"⚡ Трансформатор: {data['has_transformer']}\n"
+        f"🔌 Мощность ТП: {data['transformer_power'] or 'Не указано'} кВт\n"
+        f"🔋 Свободная мощность ТП: {data['free_power'] or 'Не указано'} кВт\n"
+        f"🏭 Станция: {data['station'] or 'Не указано'}\n"
+        f"📍 Местоположение: {data['location_link'] or 'Не указано'}\n"
+        f"ℹ Доп. информация: {data['location_info'] or 'Не указано'}\n"
+        f"📸/🎥 Медиа: {folder_link}"
+    )
+    upload_queue.spawn(notify_admins_about_request(admin_message, callback.from_user.id))
+
+    logging.info("Foydalanuvchi %s so‘rovni yakunladi, papka havolasi: %s", callback.from_user.id, folder_link)
 
     await callback.message.answer(
         "<b>Данные успешно сохранены!</b> ✅\nНажмите на кнопку ниже, чтобы начать заново:",
@@ -0,0 +1,10 @@
+from aiogram.utils.callback_data import CallbackData
+
+# So'rov formasi tugmalari. Prefikslar eski callback_data bilan mos
+# ("start_request", "cadastr_yes", "station_20kwt"), yuborilgan tugmalar ishlayveradi.
+start_request_cb = CallbackData('start_request')
+restart_request_cb = CallbackData('restart_request')
+finish_upload_cb = CallbackData('finish_upload')
+cadastr_cb = CallbackData('cadastr', 'value')
+transformer_cb = CallbackData('transformer', 'value')
+station_cb = CallbackData('station', 'power')
@@ -1,8 +1,28 @@
-from aiogram import Bot, Dispatcher, types
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram import types
+from aiogram.bot.api import TelegramAPIServer, TELEGRAM_PRODUCTION
 
 from data import config
+from utils.db_api import Database, ManagerStore, MediaIndex, SheetsOutbox, SQLiteStorage, Submissions, UploadSessions
+from utils.google_api import SheetsWriter
+from utils.lanes import LaneDispatcher
+from utils.misc.router import Router
+from utils.outbound import ScheduledBot
+from utils.session_sweeper import SessionSweeper
 
-bot = Bot(token=config.BOT_TOKEN, parse_mode=types.ParseMode.HTML)
-storage = MemoryStorage()
-dp = Dispatcher(bot, storage=storage)
+bot = ScheduledBot(
+    token=config.BOT_TOKEN, parse_mode=types.ParseMode.HTML,
+    server=TelegramAPIServer.from_base(config.BOT_API_SERVER) if config.BOT_API_SERVER else TELEGRAM_PRODUCTION
+)
+db = Database(path_to_db=config.DB_PATH)
+storage = SQLiteStorage(db, cache_size=config.FSM_CACHE_SIZE)
+# Bitta foydalanuvchining updatelari ketma-ket, turli foydalanuvchilarniki parallel
+dp = LaneDispatcher(bot, storage=storage)
+# Forma qadamlari uchun indekslangan router (handlers/users/__init__.py da ulanadi)
+router = Router()
+sheets_outbox = SheetsOutbox(db)
+sheets_writer = SheetsWriter(sheets_outbox)
+managers = ManagerStore(db)
+upload_sessions = UploadSessions(db)
+media_index = MediaIndex(db, max_entries=config.MEDIA_INDEX_SIZE, ttl=config.MEDIA_INDEX_TTL_DAYS * 24 * 3600)
+submissions = Submissions(db)
+session_sweeper = SessionSweeper(storage, submissions, upload_sessions)
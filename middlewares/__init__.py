@@ -1,8 +1,12 @@
 from aiogram import Dispatcher
 
 from loader import dp
+from .log_context import LogContextMiddleware
+from .metrics import MetricsMiddleware
 from .throttling import ThrottlingMiddleware
 
 
 if __name__ == "middlewares":
+    dp.middleware.setup(LogContextMiddleware())
+    dp.middleware.setup(MetricsMiddleware())
     dp.middleware.setup(ThrottlingMiddleware())
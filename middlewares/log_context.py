@@ -0,0 +1,25 @@
+from aiogram import types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from utils.misc.logging import log_update_id, log_user_id
+
+
+class LogContextMiddleware(BaseMiddleware):
+    """
+    Puts update_id and user_id of the update being processed into the log context.
+    """
+
+    @staticmethod
+    def _bind(event):
+        update = types.Update.get_current()
+        log_update_id.set(update.update_id if update else None)
+        log_user_id.set(event.from_user.id if event.from_user else None)
+
+    async def on_pre_process_message(self, message: types.Message, data: dict):
+        self._bind(message)
+
+    async def on_pre_process_edited_message(self, message: types.Message, data: dict):
+        self._bind(message)
+
+    async def on_pre_process_callback_query(self, callback: types.CallbackQuery, data: dict):
+        self._bind(callback)
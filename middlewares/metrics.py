@@ -0,0 +1,47 @@
+import contextvars
+import time
+
+from aiogram import types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from utils.misc.metrics import handler_seconds, handler_errors
+from utils.misc.router import resolved_handler
+
+# Joriy update uchun (handler nomi, boshlanish vaqti); xato handleri ham o'qiydi
+handler_timing = contextvars.ContextVar('handler_timing', default=None)
+
+
+def observe_handler_error(exception):
+    timing = handler_timing.get()
+    handler = timing[0] if timing else 'unknown'
+    handler_errors.inc(handler=handler, exception=type(exception).__name__)
+    if timing:
+        handler_seconds.observe(time.perf_counter() - timing[1], handler=handler)
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Records latency of every message and callback handler.
+    """
+
+    def _start(self, data):
+        handler = resolved_handler(data)
+        handler_timing.set((handler.__name__ if handler else 'unhandled', time.perf_counter()))
+
+    def _finish(self):
+        timing = handler_timing.get()
+        if timing:
+            handler_seconds.observe(time.perf_counter() - timing[1], handler=timing[0])
+            handler_timing.set(None)
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        self._start(data)
+
+    async def on_post_process_message(self, message: types.Message, results: list, data: dict):
+        self._finish()
+
+    async def on_process_callback_query(self, callback: types.CallbackQuery, data: dict):
+        self._start(data)
+
+    async def on_post_process_callback_query(self, callback: types.CallbackQuery, results: list, data: dict):
+        self._finish()
@@ -1,37 +1,79 @@
-import asyncio
+from collections import OrderedDict
 
-from aiogram import types, Dispatcher
+from aiogram import types
 from aiogram.dispatcher import DEFAULT_RATE_LIMIT
-from aiogram.dispatcher.handler import CancelHandler, current_handler
+from aiogram.dispatcher.handler import CancelHandler
 from aiogram.dispatcher.middlewares import BaseMiddleware
-from aiogram.utils.exceptions import Throttled
+
+from utils.misc.router import resolved_handler
+from utils.misc.throttling import TokenBucketLimiter
+from utils.upload_queue import upload_queue
 
 
 class ThrottlingMiddleware(BaseMiddleware):
     """
-    Simple middleware
+    Token-bucket throttling for messages and callback queries.
+
+    Buckets are per user and per handler; the rate, key and burst come from the
+    `rate_limit` decorator. While the upload queue is full, messages for handlers
+    marked with `upload_backpressure` are rejected, with one reply per album.
     """
 
-    def __init__(self, limit=DEFAULT_RATE_LIMIT, key_prefix='antiflood_'):
+    # Rad etilgan albomlar shuncha media_group_id gacha eslab qolinadi
+    MAX_REJECTED_ALBUMS = 1000
+
+    def __init__(self, limit=DEFAULT_RATE_LIMIT, key_prefix='antiflood_', burst=1, limiter=None):
         self.rate_limit = limit
         self.prefix = key_prefix
+        self.burst = burst
+        self.limiter = limiter or TokenBucketLimiter()
+        self._rejected_albums = OrderedDict()
         super(ThrottlingMiddleware, self).__init__()
 
-    async def on_process_message(self, message: types.Message, data: dict):
-        handler = current_handler.get()
-        dispatcher = Dispatcher.get_current()
+    def _check(self, user_id, kind, data):
+        handler = resolved_handler(data)
         if handler:
             limit = getattr(handler, "throttling_rate_limit", self.rate_limit)
             key = getattr(handler, "throttling_key", f"{self.prefix}_{handler.__name__}")
+            burst = getattr(handler, "throttling_burst", self.burst)
         else:
             limit = self.rate_limit
-            key = f"{self.prefix}_message"
-        try:
-            await dispatcher.throttle(key, rate=limit)
-        except Throttled as t:
-            await self.message_throttled(message, t)
+            key = f"{self.prefix}_{kind}"
+            burst = self.burst
+        return self.limiter.hit(f"{key}:{user_id}", limit, burst)
+
+    async def _reject_upload(self, message: types.Message):
+        album = message.media_group_id
+        if album:
+            # Albomning qolgan fayllari ham rad etiladi, javob esa bir marta yuboriladi
+            if album in self._rejected_albums:
+                self._rejected_albums.move_to_end(album)
+                raise CancelHandler()
+            self._rejected_albums[album] = True
+            if len(self._rejected_albums) > self.MAX_REJECTED_ALBUMS:
+                self._rejected_albums.popitem(last=False)
+        await message.reply("<b>Сервер занят, попробуйте отправить файл чуть позже.</b> ⏳")
+        raise CancelHandler()
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        handler = resolved_handler(data)
+        if getattr(handler, 'upload_backpressure', False) and (
+                upload_queue.saturated or message.media_group_id in self._rejected_albums):
+            await self._reject_upload(message)
+        if message.media_group_id:
+            # Albom fayllari bir necha millisekund farq bilan keladi va MediaGroupCollector da bitta vazifaga yig'iladi
+            return
+        allowed, exceeded = self._check(message.from_user.id, 'message', data)
+        if not allowed:
+            await self.message_throttled(message, exceeded)
+            raise CancelHandler()
+
+    async def on_process_callback_query(self, callback: types.CallbackQuery, data: dict):
+        allowed, exceeded = self._check(callback.from_user.id, 'callback', data)
+        if not allowed:
+            await callback.answer("Too many requests!")
             raise CancelHandler()
 
-    async def message_throttled(self, message: types.Message, throttled: Throttled):
-        if throttled.exceeded_count <= 2:
+    async def message_throttled(self, message: types.Message, exceeded: int):
+        if exceeded <= 2:
             await message.reply("Too many requests!")
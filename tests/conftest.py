@@ -0,0 +1,79 @@
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Konfiguratsiya loader import qilinishidan oldin o'rnatiladi
+os.environ.update({
+    'BOT_TOKEN': '123456:TEST',
+    'ADMINS': '1',
+    'IP': '127.0.0.1',
+    'DB_PATH': os.path.join(tempfile.mkdtemp(prefix='tokbot_test_'), 'test.db'),
+    'METRICS_PORT': '0',
+    'LOG_FORMAT': 'text',
+})
+
+
+class FakeBotAPI:
+    """
+    Records Bot API calls instead of sending them; sendMessage/editMessageText return a message.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.message_ids = itertools.count(1000)
+
+    async def request(self, method, data=None, files=None, **kwargs):
+        data = data or {}
+        self.calls.append((method, data))
+        if method in ('sendMessage', 'editMessageText'):
+            return {'message_id': int(data.get('message_id') or next(self.message_ids)), 'date': int(time.time()),
+                    'chat': {'id': int(data['chat_id']), 'type': 'private'}, 'text': data.get('text', '')}
+        return True
+
+    def texts(self, method=None):
+        return [data.get('text', '') for name, data in self.calls if method in (None, name)]
+
+
+@pytest.fixture
+def bot_api(monkeypatch):
+    from aiogram import Bot, Dispatcher
+
+    import middlewares, filters, handlers  # noqa: F401 (handlerlar ro'yxatga olinadi)
+    from loader import bot, dp, storage
+
+    storage.create_table()
+    api = FakeBotAPI()
+    monkeypatch.setattr(bot, 'request', api.request)
+    Bot.set_current(bot)
+    Dispatcher.set_current(dp)
+    return api
+
+
+@pytest.fixture
+def upload_queue(monkeypatch):
+    """
+    Fresh single-worker upload queue for the handlers (the global one is bound to the first event loop).
+    """
+    from handlers.users import start
+    from middlewares import throttling
+    from utils.upload_queue import UploadQueue
+
+    queue = UploadQueue(workers=1)
+    monkeypatch.setattr(start, 'upload_queue', queue)
+    monkeypatch.setattr(throttling, 'upload_queue', queue)
+    return queue
+
+
+@pytest.fixture
+def run():
+    # Runner yopilganda qolgan vazifalar (navbat ishchilari, lanelar) bekor qilinadi
+    with asyncio.Runner() as runner:
+        yield runner.run
@@ -0,0 +1,76 @@
+import asyncio
+import itertools
+import time
+
+from aiogram import types
+
+USER_ID = 42
+
+
+def album_updates(count, media_group_id='album_1'):
+    ids = itertools.count(1)
+    updates = []
+    for _ in range(count):
+        message_id = next(ids)
+        file_id = f"photo_{message_id}"
+        updates.append(types.Update(update_id=message_id, message={
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': USER_ID, 'type': 'private'},
+            'from': {'id': USER_ID, 'is_bot': False, 'first_name': 'Test'},
+            'media_group_id': media_group_id,
+            'photo': [{'file_id': file_id, 'file_unique_id': file_id, 'width': 1280, 'height': 960,
+                       'file_size': 1000}],
+        }))
+    return updates
+
+
+def test_album_is_uploaded_as_one_job(bot_api, upload_queue, run, monkeypatch):
+    from handlers.users import start
+    from loader import dp, storage
+    from states.Tok_Uchun import RequestForm
+
+    uploaded = []
+
+    async def fake_stream_media(*args):
+        uploaded.append(args)
+        return f"drive_{len(uploaded)}"
+
+    monkeypatch.setattr(start, 'stream_media', fake_stream_media)
+    monkeypatch.setattr(start.album_collector, 'latency', 0.05)
+
+    async def scenario():
+        await storage.set_state(chat=USER_ID, user=USER_ID, state=RequestForm.media_upload.state)
+        await storage.set_data(chat=USER_ID, user=USER_ID, data={'folder_id': 'f1', 'folder_link': 'link'})
+        # Telegram albom xabarlarini bir necha millisekund farq bilan yuboradi
+        await dp.process_updates(album_updates(5))
+        for _ in range(100):
+            if any('Все файлы' in text for text in bot_api.texts('editMessageText')):
+                break
+            await asyncio.sleep(0.02)
+
+    run(scenario())
+
+    assert 'Too many requests!' not in bot_api.texts()
+    assert len(uploaded) == 5
+    assert bot_api.texts('sendMessage') == ['<b>Загружается 5 файлов...</b>']
+    assert any('Все файлы (5)' in text for text in bot_api.texts('editMessageText'))
+
+
+def test_full_queue_rejects_album_once(bot_api, upload_queue, run, monkeypatch):
+    from loader import dp, storage
+    from states.Tok_Uchun import RequestForm
+
+    monkeypatch.setattr(upload_queue, 'max_size', 0)
+
+    async def scenario():
+        await storage.set_state(chat=USER_ID, user=USER_ID, state=RequestForm.media_upload.state)
+        await storage.set_data(chat=USER_ID, user=USER_ID, data={'folder_id': 'f1', 'folder_link': 'link'})
+        await dp.process_updates(album_updates(5, media_group_id='album_full'))
+        await asyncio.sleep(0.1)
+
+    run(scenario())
+
+    assert bot_api.texts('sendMessage') == ['<b>Сервер занят, попробуйте отправить файл чуть позже.</b> ⏳']
+    assert upload_queue.pending == 0
+
@@ -0,0 +1,33 @@
+from utils.db_api import Database, SQLiteStorage
+
+
+def test_get_data_returns_default_for_empty_session(tmp_path, run):
+    storage = SQLiteStorage(Database(str(tmp_path / 'test.db')))
+    storage.create_table()
+
+    async def scenario():
+        default = {'step': 1}
+        data = await storage.get_data(chat=1, user=1, default=default)
+        assert data == {'step': 1}
+        data['step'] = 2
+        assert default == {'step': 1}
+        assert await storage.get_data(chat=1, user=1) == {}
+        await storage.set_data(chat=1, user=1, data={'step': 3})
+        return await storage.get_data(chat=1, user=1, default=default)
+
+    assert run(scenario()) == {'step': 3}
+
+
+def test_count_is_scoped_to_the_shard(tmp_path, run):
+    storage = SQLiteStorage(Database(str(tmp_path / 'test.db')))
+    storage.create_table()
+
+    async def scenario():
+        for user in range(5):
+            await storage.set_state(chat=user, user=user, state='RequestForm:phone')
+        storage.flush()
+
+    run(scenario())
+
+    assert storage.count() == 5
+    assert [storage.count(2, index) for index in range(2)] == [3, 2]
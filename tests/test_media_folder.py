@@ -0,0 +1,111 @@
+import asyncio
+import itertools
+import time
+
+from aiogram import types
+
+USER_ID = 43
+
+FORM = {
+    'manager_name': 'Manager', 'contact_name': 'Ivan', 'phone': '901234567', 'address': 'Samarkand',
+    'has_cadastr': 'Есть', 'has_transformer': 'Есть', 'transformer_power': '400', 'free_power': '120',
+    'station': '60kwt', 'location_link': 'https://maps.google.com/?q=39.65,66.96', 'location_info': 'bazaar',
+    'folder_name': 'Request_43_2026-01-01_10-00-00',
+}
+
+
+def user_updates():
+    ids = itertools.count(1)
+    sender = {'id': USER_ID, 'is_bot': False, 'first_name': 'Test'}
+
+    def message(**content):
+        message_id = next(ids)
+        return {'message_id': message_id, 'date': int(time.time()), 'chat': {'id': USER_ID, 'type': 'private'},
+                'from': sender, **content}
+
+    def update(**content):
+        return types.Update(update_id=next(ids), **content)
+
+    from keyboards.inline.callback_datas import finish_upload_cb
+
+    return [
+        update(message=message(video={'file_id': 'video_1', 'file_unique_id': 'video_1', 'width': 1280,
+                                       'height': 720, 'duration': 10, 'file_size': 1000})),
+        update(message=message(photo=[{'file_id': 'photo_1', 'file_unique_id': 'photo_1', 'width': 1280,
+                                       'height': 960, 'file_size': 1000}])),
+        update(callback_query={'id': 'cb_1', 'from': sender, 'chat_instance': '1', 'data': finish_upload_cb.new(),
+                               'message': message(text='button')}),
+    ]
+
+
+def test_queued_upload_keeps_its_request_folder(bot_api, upload_queue, run, monkeypatch):
+    from handlers.users import start
+    from loader import dp, media_index, sheets_outbox, storage, submissions, upload_sessions
+    from states.Tok_Uchun import RequestForm
+    from utils.google_api import drive
+
+    for table in (media_index, sheets_outbox, submissions, upload_sessions):
+        table.create_table()
+    folder_ids = itertools.count(1)
+
+    def fake_create_folder(folder_name):
+        time.sleep(0.05)
+        folder_id = f"f{next(folder_ids)}"
+        return folder_id, f"https://drive.google.com/drive/folders/{folder_id}"
+
+    uploads = []
+
+    async def fake_upload(key, telegram_file_id, name, mime_type, folder_id):
+        await asyncio.sleep(0.5)
+        uploads.append((telegram_file_id, folder_id))
+        return f"drive_{telegram_file_id}"
+
+    monkeypatch.setattr(drive, '_create_request_folder', fake_create_folder)
+    monkeypatch.setattr(start, 'upload_telegram_file', fake_upload)
+
+    async def scenario():
+        await storage.set_state(chat=USER_ID, user=USER_ID, state=RequestForm.media_upload.state)
+        await storage.set_data(chat=USER_ID, user=USER_ID, data=FORM)
+        for update in user_updates():
+            await asyncio.create_task(dp.process_update(update))
+            await asyncio.sleep(0.15)
+        # Yagona ishchi band: rasm so'rov yakunlangandan keyin yuklanadi
+        assert await storage.get_state(chat=USER_ID, user=USER_ID) is None
+        for _ in range(100):
+            if len(uploads) == 2:
+                break
+            await asyncio.sleep(0.02)
+
+    run(scenario())
+
+    assert sorted(uploads) == [('photo_1', 'f1'), ('video_1', 'f1')]
+    assert submissions.find_by_phone('901234567')[0]['folder_link'] == 'https://drive.google.com/drive/folders/f1'
+
+
+def test_failed_folder_creation_is_retried(run, monkeypatch):
+    from aiogram.dispatcher import FSMContext
+    from loader import storage
+    from utils.google_api import drive
+
+    calls = []
+
+    def flaky_create_folder(folder_name):
+        calls.append(folder_name)
+        if len(calls) == 1:
+            raise RuntimeError("Drive unavailable")
+        return 'f_retry', "https://drive.google.com/drive/folders/f_retry"
+
+    monkeypatch.setattr(drive, '_create_request_folder', flaky_create_folder)
+    state = FSMContext(storage, chat=USER_ID + 1, user=USER_ID + 1)
+    data = {'folder_name': 'Request_44_2026-01-01_10-00-00'}
+
+    async def scenario():
+        try:
+            await drive.request_folder(state, data)
+        except RuntimeError:
+            pass
+        await asyncio.sleep(0)
+        return await drive.request_folder(state, data)
+
+    assert run(scenario())[0] == 'f_retry'
+    assert len(calls) == 2
@@ -0,0 +1,52 @@
+import asyncio
+import json
+
+from data import config
+from utils.sharding import ShardForwarder, ShardWorker, socket_path
+
+
+class RecordingDispatcher:
+    def __init__(self):
+        self.update_ids = []
+
+    async def process_update(self, update):
+        self.update_ids.append(update.update_id)
+
+
+def payload(update_id):
+    return json.dumps({'update_id': update_id}).encode()
+
+
+def test_forwarder_delivers_after_worker_restart(run, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'SHARD_SOCKET_DIR', str(tmp_path))
+    dispatcher = RecordingDispatcher()
+    worker = ShardWorker(dispatcher, 0)
+
+    async def scenario():
+        forwarder = ShardForwarder(0)
+        forwarder.start()
+        # Ishchi hali ishga tushmagan: updatelar navbatda kutadi va tasdiqlanmaydi
+        first = [await forwarder.send(payload(update_id)) for update_id in (1, 2)]
+        await asyncio.sleep(0.1)
+        assert not any(future.done() for future in first)
+
+        server = await asyncio.start_unix_server(worker.handle_connection, path=socket_path(0))
+        await asyncio.wait_for(asyncio.gather(*first), timeout=5)
+
+        # Ishchi qayta ishga tushmoqda: ulanish uziladi, keyingi update yangi ulanish orqali yetkaziladi
+        server.close()
+        for writer in list(worker._connections):
+            writer.close()
+        await server.wait_closed()
+        second = await forwarder.send(payload(3))
+        await asyncio.sleep(0.1)
+        assert not second.done()
+        server = await asyncio.start_unix_server(worker.handle_connection, path=socket_path(0))
+        await asyncio.wait_for(second, timeout=5)
+        await worker.wait_processed()
+        await forwarder.stop()
+        server.close()
+
+    run(scenario())
+
+    assert sorted(set(dispatcher.update_ids)) == [1, 2, 3]
@@ -0,0 +1,61 @@
+from utils.db_api import Database, SheetsOutbox
+from utils.google_api import SheetsWriter
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class APIError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.response = Response(status_code)
+
+
+def make_writer(tmp_path, append, max_attempts=3):
+    outbox = SheetsOutbox(Database(str(tmp_path / 'test.db')))
+    outbox.create_table()
+    writer = SheetsWriter(outbox, batch_size=10, min_interval=0, max_attempts=max_attempts)
+    writer._append = append
+    return outbox, writer
+
+
+async def flush(writer, calls):
+    for _ in range(calls):
+        try:
+            await writer.flush_once()
+        except APIError:
+            pass
+
+
+def test_rejected_row_is_parked_and_others_are_written(tmp_path, run):
+    written = []
+
+    def append(rows):
+        if any(row[0] == 'bad' for row in rows):
+            raise APIError(400)
+        written.extend(rows)
+
+    outbox, writer = make_writer(tmp_path, append)
+    for value in ('a', 'bad', 'c'):
+        outbox.add([value])
+
+    run(flush(writer, 6))
+
+    assert written == [['a'], ['c']]
+    assert outbox.count() == 0
+    assert outbox.dead_count() == 1
+
+
+def test_transient_errors_are_not_parked(tmp_path, run):
+    def append(rows):
+        raise APIError(503)
+
+    outbox, writer = make_writer(tmp_path, append)
+    outbox.add(['a'])
+
+    run(flush(writer, 5))
+
+    assert outbox.peek(1)[0][2] == 5
+    assert outbox.dead_count() == 0
@@ -0,0 +1,35 @@
+from utils.db_api import Database, Submissions
+
+HEADER = ['Менеджер', 'Время', 'Контакт', 'Телефон']
+
+
+def sheet_row(time, phone, contact='Ivan'):
+    return ['Manager', time, contact, phone, 'Samarkand', 'Есть', 'Есть', '400', '120', '60kwt', 'link', 'map', '']
+
+
+def user_ids(submissions):
+    rows = submissions.db.execute("SELECT created_at, user_id, sheet_row FROM submissions ORDER BY created_at",
+                                  fetchall=True)
+    return {created_at: (user_id, row) for created_at, user_id, row in rows}
+
+
+def test_sync_keeps_user_ids_when_sheet_rows_shift(tmp_path):
+    submissions = Submissions(Database(str(tmp_path / 'test.db')))
+    submissions.create_table()
+    first, second = sheet_row('2026-01-01 10:00:00', '901111111'), sheet_row('2026-01-01 11:00:00', '902222222')
+    submissions.add(first, user_id=1)
+    submissions.add(second, user_id=2)
+    assert submissions.sync_from_sheet([HEADER, first, second]) == (2, 0)
+
+    # Qo'lda: boshiga qator qo'shildi, birinchi so'rov o'chirildi, ikkinchisi tahrirlandi
+    manual = sheet_row('2025-12-31 09:00:00', '903333333')
+    edited = sheet_row('2026-01-01 11:00:00', '902222222', contact='Petr')
+    assert submissions.sync_from_sheet([HEADER, manual, edited]) == (2, 1)
+
+    assert user_ids(submissions) == {
+        '2025-12-31 09:00:00': (None, 2),
+        '2026-01-01 11:00:00': ('2', 3),
+    }
+    assert submissions.find_by_phone('902222222')[0]['contact'] == 'Petr'
+    # O'zgarmagan jadval qayta yozilmaydi
+    assert submissions.sync_from_sheet([HEADER, manual, edited]) == (0, 0)
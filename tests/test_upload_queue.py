@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from utils.upload_queue import UploadQueue, UploadQueueFull
+
+
+def test_shutdown_waits_for_result_messages(run):
+    queue = UploadQueue(workers=1)
+    reported = []
+
+    async def upload(name):
+        await asyncio.sleep(0.1)
+        return f"drive_{name}"
+
+    async def report(job):
+        file_id = await job.wait()
+        # Telegram ga xabarni yangilash so'rovi
+        await asyncio.sleep(0.1)
+        reported.append(file_id)
+
+    async def scenario():
+        job = queue.submit(upload, 'video')
+        queue.spawn(report(job))
+        return await queue.shutdown(timeout=2)
+
+    assert run(scenario()) == 0
+    assert reported == ['drive_video']
+
+
+def test_shutdown_checkpoints_unfinished_jobs(run):
+    queue = UploadQueue(workers=1)
+    saved = []
+
+    async def upload(name):
+        await asyncio.sleep(10)
+
+    async def checkpoint(name):
+        saved.append(name)
+
+    async def scenario():
+        jobs = [queue.submit(upload, name, checkpoint=checkpoint) for name in ('a', 'b')]
+        await asyncio.sleep(0.05)
+        count = await queue.shutdown(timeout=0.1)
+        with pytest.raises(UploadQueueFull):
+            queue.submit(upload, 'c')
+        return count, [job.future.cancelled() for job in jobs]
+
+    assert run(scenario()) == (2, [True, True])
+    assert saved == ['a', 'b']
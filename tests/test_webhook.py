@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from data import config
+from utils.sharding import ShardIngress
+from utils.webhook import SECRET_HEADER, WebhookIngress
+
+UPDATE = {'update_id': 7, 'message': {'message_id': 1, 'date': 0, 'chat': {'id': 42, 'type': 'private'},
+                                      'from': {'id': 42, 'is_bot': False, 'first_name': 'Test'}, 'text': 'hi'}}
+
+
+class RecordingDispatcher:
+    def __init__(self):
+        self.update_ids = []
+
+    async def process_update(self, update):
+        self.update_ids.append(update.update_id)
+
+
+async def post_update(handler, headers):
+    app = web.Application()
+    app.router.add_post('/webhook', handler)
+    async with TestClient(TestServer(app)) as client:
+        response = await client.post('/webhook', json=UPDATE, headers=headers)
+        await asyncio.sleep(0.05)
+        return response.status
+
+
+@pytest.mark.parametrize('headers, status, dispatched', [
+    ({}, 401, []),
+    ({SECRET_HEADER: 'forged'}, 401, []),
+    ({SECRET_HEADER: 's3cret'}, 200, [7]),
+])
+def test_webhook_rejects_forged_sender(run, headers, status, dispatched):
+    dispatcher = RecordingDispatcher()
+    ingress = WebhookIngress(dispatcher, path='/webhook', secret='s3cret')
+
+    assert run(post_update(ingress.handle, headers)) == status
+    assert dispatcher.update_ids == dispatched
+
+
+@pytest.mark.parametrize('headers, status, routed', [
+    ({}, 401, []),
+    ({SECRET_HEADER: 'forged'}, 401, []),
+    ({SECRET_HEADER: 's3cret'}, 200, [7]),
+])
+def test_sharded_webhook_rejects_forged_sender(run, monkeypatch, headers, status, routed):
+    monkeypatch.setattr(config, 'WEBHOOK_SECRET', 's3cret')
+    ingress = ShardIngress('123456:TEST', shards=2)
+    forwarded = []
+
+    async def route(update, raw=None):
+        forwarded.append(update['update_id'])
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(True)
+        return future
+
+    ingress.route = route
+
+    assert run(post_update(ingress.handle_webhook, headers)) == status
+    assert forwarded == routed
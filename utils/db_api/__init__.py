@@ -0,0 +1,7 @@
+from .sqlite import Database
+from .outbox import SheetsOutbox
+from .managers import ManagerStore
+from .fsm_storage import SQLiteStorage
+from .upload_sessions import UploadSessions
+from .media_index import MediaIndex
+from .submissions import Submissions
@@ -0,0 +1,269 @@
+import asyncio
+import copy
+import itertools
+import json
+import logging
+import time
+import typing
+from collections import OrderedDict
+
+from aiogram.dispatcher.storage import BaseStorage
+
+from .sqlite import Database
+
+_DELETED = object()
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Persistent FSM storage on top of SQLite (WAL).
+
+    State and every data field are stored as separate rows, so a step that changes
+    one field writes one row no matter how large the form is. Reads are served from
+    an in-memory cache; changes are collected and committed in one transaction
+    `flush_interval` seconds after the first change.
+
+    The cache holds at most `cache_size` sessions (least recently used ones are
+    dropped and reloaded on demand); `expire` removes abandoned sessions from the
+    database. Throttling buckets are kept in memory only.
+    """
+
+    def __init__(self, db: Database, flush_interval=0.2, cache_size=10000):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.cache_size = cache_size
+        self._sessions = OrderedDict()
+        self._buckets = {}
+        self._touched = set()
+        self._changes = {}
+        self._flush_handle = None
+
+    def create_table(self):
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS fsm_state (
+                chat TEXT NOT NULL,
+                user TEXT NOT NULL,
+                state TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (chat, user)
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS fsm_state_updated_at ON fsm_state (updated_at)")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS fsm_data (
+                chat TEXT NOT NULL,
+                user TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (chat, user, key)
+            )
+        """)
+
+    def _load(self, chat, user):
+        row = self.db.execute("SELECT state FROM fsm_state WHERE chat = ? AND user = ?", (chat, user), fetchone=True)
+        rows = self.db.execute("SELECT key, value FROM fsm_data WHERE chat = ? AND user = ?", (chat, user),
+                               fetchall=True)
+        return {'state': row[0] if row else None, 'data': {key: json.loads(value) for key, value in rows}}
+
+    def _session(self, chat, user):
+        address = tuple(map(str, self.check_address(chat=chat, user=user)))
+        session = self._sessions.get(address)
+        if session is None:
+            session = self._sessions[address] = self._load(*address)
+            self._trim_cache()
+        else:
+            self._sessions.move_to_end(address)
+        return address, session
+
+    def _trim_cache(self):
+        excess = len(self._sessions) - self.cache_size
+        if excess <= 0:
+            return
+        # Saqlanmagan o'zgarishlari bor sessiyalar keyingi safar chiqariladi
+        for address in [address for address in itertools.islice(self._sessions, excess * 2)
+                        if address not in self._touched][:excess]:
+            del self._sessions[address]
+
+    def _touch(self, address):
+        self._touched.add(address)
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+
+    def _set_field(self, address, session, key, value):
+        session['data'][key] = value
+        self._changes[address + (key,)] = value
+
+    def _del_field(self, address, session, key):
+        del session['data'][key]
+        self._changes[address + (key,)] = _DELETED
+
+    async def get_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None) -> typing.Optional[str]:
+        _, session = self._session(chat, user)
+        if session['state'] is None:
+            return self.resolve_state(default)
+        return session['state']
+
+    async def get_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[dict] = None) -> typing.Dict:
+        _, session = self._session(chat, user)
+        return copy.deepcopy(session['data'] or default or {})
+
+    async def set_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        state: typing.AnyStr = None):
+        address, session = self._session(chat, user)
+        session['state'] = self.resolve_state(state)
+        self._touch(address)
+
+    async def set_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        address, session = self._session(chat, user)
+        data = data or {}
+        for key in [key for key in session['data'] if key not in data]:
+            self._del_field(address, session, key)
+        for key, value in data.items():
+            if key not in session['data'] or session['data'][key] != value:
+                self._set_field(address, session, key, copy.deepcopy(value))
+        self._touch(address)
+
+    async def update_data(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          data: typing.Dict = None, **kwargs):
+        address, session = self._session(chat, user)
+        for key, value in dict(data or {}, **kwargs).items():
+            self._set_field(address, session, key, copy.deepcopy(value))
+        self._touch(address)
+
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         default: typing.Optional[dict] = None) -> typing.Dict:
+        address = tuple(map(str, self.check_address(chat=chat, user=user)))
+        return copy.deepcopy(self._buckets.get(address, {}))
+
+    async def set_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         bucket: typing.Dict = None):
+        address = tuple(map(str, self.check_address(chat=chat, user=user)))
+        self._buckets[address] = copy.deepcopy(bucket or {})
+
+    async def update_bucket(self, *,
+                            chat: typing.Union[str, int, None] = None,
+                            user: typing.Union[str, int, None] = None,
+                            bucket: typing.Dict = None, **kwargs):
+        address = tuple(map(str, self.check_address(chat=chat, user=user)))
+        self._buckets.setdefault(address, {}).update(bucket or {}, **kwargs)
+
+    def flush(self):
+        """
+        To'plangan o'zgarishlarni bitta tranzaksiyada yozish.
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._touched:
+            return
+        touched, changes = self._touched, self._changes
+        self._touched, self._changes = set(), {}
+        now = time.time()
+        try:
+            with self.db.transaction() as connection:
+                connection.executemany(
+                    "DELETE FROM fsm_data WHERE chat = ? AND user = ? AND key = ?",
+                    [key for key, value in changes.items() if value is _DELETED]
+                )
+                connection.executemany(
+                    "INSERT INTO fsm_data (chat, user, key, value) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(chat, user, key) DO UPDATE SET value = excluded.value",
+                    [key + (json.dumps(value, ensure_ascii=False),) for key, value in changes.items()
+                     if value is not _DELETED]
+                )
+                for address in touched:
+                    session = self._sessions.get(address)
+                    if session is None or (session['state'] is None and not session['data']):
+                        connection.execute("DELETE FROM fsm_state WHERE chat = ? AND user = ?", address)
+                    else:
+                        connection.execute(
+                            "INSERT INTO fsm_state (chat, user, state, updated_at) VALUES (?, ?, ?, ?) "
+                            "ON CONFLICT(chat, user) DO UPDATE SET state = excluded.state, "
+                            "updated_at = excluded.updated_at",
+                            address + (session['state'], now)
+                        )
+        except Exception as e:
+            # Keyingi flush da qayta urinib ko'riladi
+            self._touched |= touched
+            for key, value in changes.items():
+                self._changes.setdefault(key, value)
+            logging.error("FSM holatini saqlashda xato: %s", e)
+            self._flush_handle = asyncio.get_event_loop().call_later(self.flush_interval * 10, self.flush)
+            return
+
+        # Bo'sh sessiyalar xotirada saqlanmaydi
+        for address in touched:
+            session = self._sessions.get(address)
+            if session is not None and session['state'] is None and not session['data']:
+                del self._sessions[address]
+        self._trim_cache()
+
+    def expire(self, ttl, max_sessions=None, shards=1, shard_index=0, limit=1000):
+        """
+        `ttl` sekunddan beri o'zgarmagan va `max_sessions` dan ortiq (eng eskilari) sessiyalarni o'chirish.
+        Sharded rejimda faqat shu shard foydalanuvchilari. O'chirilganlarning [(address, data)] ro'yxatini qaytaradi.
+        """
+        shard, parameters = "1", ()
+        if shards > 1:
+            shard, parameters = "CAST(user AS INTEGER) % ? = ?", (shards, shard_index)
+        with self.db.transaction() as connection:
+            expired = connection.execute(
+                f"SELECT chat, user FROM fsm_state WHERE {shard} AND updated_at < ? LIMIT ?",
+                parameters + (time.time() - ttl, limit)
+            ).fetchall()
+            if max_sessions:
+                expired += connection.execute(
+                    f"SELECT chat, user FROM fsm_state WHERE {shard} ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+                    parameters + (limit, max_sessions)
+                ).fetchall()
+            evicted = []
+            for address in dict.fromkeys(expired):
+                if address in self._touched:
+                    continue
+                rows = connection.execute("SELECT key, value FROM fsm_data WHERE chat = ? AND user = ?",
+                                          address).fetchall()
+                connection.execute("DELETE FROM fsm_data WHERE chat = ? AND user = ?", address)
+                connection.execute("DELETE FROM fsm_state WHERE chat = ? AND user = ?", address)
+                evicted.append((address, {key: json.loads(value) for key, value in rows}))
+        for address, _ in evicted:
+            self._sessions.pop(address, None)
+        return evicted
+
+    def count(self, shards=1, shard_index=0) -> int:
+        """
+        Saqlangan sessiyalar soni (sharded rejimda faqat shu shard foydalanuvchilari, `expire` dagi kabi).
+        """
+        if shards > 1:
+            return self.db.execute("SELECT COUNT(*) FROM fsm_state WHERE CAST(user AS INTEGER) % ? = ?",
+                                   parameters=(shards, shard_index), fetchone=True)[0]
+        return self.db.execute("SELECT COUNT(*) FROM fsm_state", fetchone=True)[0]
+
+    @property
+    def cached(self) -> int:
+        return len(self._sessions)
+
+    async def close(self):
+        self.flush()
+
+    async def wait_closed(self):
+        pass
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import logging
+import os
+
+from .sqlite import Database
+
+
+class ManagerStore:
+    """
+    Manager names per Telegram user, served from memory.
+
+    The table is read once at startup; changes update the in-memory dict at once and
+    are written to SQLite in one transaction after `flush_interval` seconds, so a burst
+    of changes costs a single commit.
+    """
+
+    def __init__(self, db: Database, legacy_path='users.json', flush_interval=1.0):
+        self.db = db
+        self.legacy_path = legacy_path
+        self.flush_interval = flush_interval
+        self._managers = {}
+        self._dirty = {}
+        self._flush_handle = None
+
+    def create_table(self):
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS managers (
+                user_id TEXT PRIMARY KEY,
+                manager_name TEXT NOT NULL
+            )
+        """)
+
+    def load(self):
+        self.create_table()
+        rows = self.db.execute("SELECT user_id, manager_name FROM managers", fetchall=True)
+        self._managers = dict(rows)
+        if not self._managers and os.path.exists(self.legacy_path):
+            self._import_legacy()
+        logging.info("Menejerlar yuklandi: %s ta", len(self._managers))
+
+    # Eski users.json faylidagi ma'lumotlarni bazaga ko'chirish
+    def _import_legacy(self):
+        try:
+            with open(self.legacy_path, 'r') as f:
+                users = json.load(f)
+        except Exception as e:
+            logging.error("%s o‘qishda xato: %s", self.legacy_path, e)
+            return
+        self._dirty = {user_id: user['manager_name'] for user_id, user in users.items()}
+        self._managers.update(self._dirty)
+        self.flush()
+        logging.info("%s dan %s ta menejer ko‘chirildi", self.legacy_path, len(users))
+
+    def get(self, user_id):
+        return self._managers.get(str(user_id))
+
+    def set(self, user_id, manager_name):
+        user_id = str(user_id)
+        self._managers[user_id] = manager_name
+        self._dirty[user_id] = manager_name
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+
+    def __len__(self):
+        return len(self._managers)
+
+    def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        try:
+            self.db.executemany(
+                "INSERT INTO managers (user_id, manager_name) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET manager_name = excluded.manager_name",
+                list(dirty.items())
+            )
+        except Exception as e:
+            # Yozilmagan o'zgarishlar keyingi safar qayta yoziladi
+            for user_id, manager_name in dirty.items():
+                self._dirty.setdefault(user_id, manager_name)
+            logging.error("Menejerlarni saqlashda xato: %s", e)
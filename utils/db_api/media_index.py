@@ -0,0 +1,72 @@
+import time
+
+from .sqlite import Database
+
+
+class MediaIndex:
+    """
+    Telegram file_unique_id -> Drive file id of an already uploaded copy.
+
+    Lookups refresh `used_at`; entries unused for `ttl` seconds are dropped and the
+    table is trimmed to the `max_entries` most recently used ones.
+    """
+
+    def __init__(self, db: Database, max_entries=50000, ttl=90 * 24 * 3600):
+        self.db = db
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._puts = 0
+
+    def create_table(self):
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS media_index (
+                file_unique_id TEXT PRIMARY KEY,
+                drive_file_id TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                used_at REAL NOT NULL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS media_index_used_at ON media_index (used_at)")
+        self.evict()
+
+    def get(self, file_unique_id):
+        now = time.time()
+        row = self.db.execute(
+            "SELECT drive_file_id, used_at FROM media_index WHERE file_unique_id = ?", (file_unique_id,),
+            fetchone=True
+        )
+        if row is None:
+            return None
+        if now - row[1] > self.ttl:
+            self.remove(file_unique_id)
+            return None
+        self.db.execute("UPDATE media_index SET used_at = ? WHERE file_unique_id = ?", (now, file_unique_id))
+        return row[0]
+
+    def put(self, file_unique_id, drive_file_id):
+        now = time.time()
+        self.db.execute(
+            "INSERT INTO media_index (file_unique_id, drive_file_id, created_at, used_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(file_unique_id) DO UPDATE SET drive_file_id = excluded.drive_file_id, "
+            "used_at = excluded.used_at",
+            (file_unique_id, drive_file_id, now, now)
+        )
+        self._puts += 1
+        # Tozalash har yozuvda emas, vaqti-vaqti bilan
+        if self._puts % 100 == 0:
+            self.evict()
+
+    def remove(self, file_unique_id):
+        self.db.execute("DELETE FROM media_index WHERE file_unique_id = ?", (file_unique_id,))
+
+    def evict(self):
+        with self.db.transaction() as connection:
+            connection.execute("DELETE FROM media_index WHERE used_at < ?", (time.time() - self.ttl,))
+            connection.execute(
+                "DELETE FROM media_index WHERE file_unique_id IN ("
+                "SELECT file_unique_id FROM media_index ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM media_index", fetchone=True)[0]
@@ -0,0 +1,66 @@
+import json
+import time
+
+from .sqlite import Database
+
+
+class SheetsOutbox:
+    """
+    Append-only queue of rows waiting to be written to Google Sheets.
+
+    A submission is committed here first; rows are removed only after the sheet
+    has accepted them, so nothing is lost if Sheets is down or the bot restarts.
+    A row the sheet keeps rejecting is parked (dead_at is set) instead of blocking
+    the rows behind it; parked rows stay in the table for manual recovery.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def create_table(self):
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS sheets_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                row TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                dead_at REAL
+            )
+        """)
+        # Eski bazalarda dead_at ustuni yo'q
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(sheets_outbox)", fetchall=True)}
+        if 'dead_at' not in columns:
+            self.db.execute("ALTER TABLE sheets_outbox ADD COLUMN dead_at REAL")
+
+    def add(self, row: list) -> int:
+        return self.db.execute(
+            "INSERT INTO sheets_outbox (row, created_at) VALUES (?, ?)",
+            (json.dumps(row, ensure_ascii=False), time.time())
+        )
+
+    def peek(self, limit: int):
+        """
+        Yuborilishi kerak bo'lgan eng eski qatorlar: [(id, row, attempts)].
+        """
+        rows = self.db.execute(
+            "SELECT id, row, attempts FROM sheets_outbox WHERE dead_at IS NULL ORDER BY id LIMIT ?", (limit,),
+            fetchall=True
+        )
+        return [(row_id, json.loads(row), attempts) for row_id, row, attempts in rows]
+
+    def remove(self, ids):
+        self.db.executemany("DELETE FROM sheets_outbox WHERE id = ?", [(row_id,) for row_id in ids])
+
+    def mark_failed(self, ids):
+        self.db.executemany("UPDATE sheets_outbox SET attempts = attempts + 1 WHERE id = ?",
+                            [(row_id,) for row_id in ids])
+
+    def park(self, ids):
+        self.db.executemany("UPDATE sheets_outbox SET dead_at = ? WHERE id = ?",
+                            [(time.time(), row_id) for row_id in ids])
+
+    def count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM sheets_outbox WHERE dead_at IS NULL", fetchone=True)[0]
+
+    def dead_count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM sheets_outbox WHERE dead_at IS NOT NULL", fetchone=True)[0]
@@ -0,0 +1,64 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class Database:
+    """
+    Thin wrapper around a single SQLite connection.
+
+    The database runs in WAL mode so readers never block the writer; the connection
+    is shared between the event loop and executor threads behind a lock.
+    """
+
+    def __init__(self, path_to_db="data/main.db"):
+        self.path_to_db = path_to_db
+        self._connection = None
+        self._lock = threading.RLock()
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            connection = sqlite3.connect(self.path_to_db, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA busy_timeout=5000")
+            self._connection = connection
+        return self._connection
+
+    def execute(self, sql: str, parameters: tuple = None, fetchone=False, fetchall=False):
+        """
+        Run a single statement (autocommit). Returns fetched rows, or lastrowid for writes.
+        """
+        if not parameters:
+            parameters = ()
+        with self._lock:
+            cursor = self.connection.execute(sql, parameters)
+            if fetchall:
+                return cursor.fetchall()
+            if fetchone:
+                return cursor.fetchone()
+            return cursor.lastrowid
+
+    def executemany(self, sql: str, seq_of_parameters):
+        with self._lock:
+            with self.transaction() as connection:
+                connection.executemany(sql, seq_of_parameters)
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            connection = self.connection
+            connection.execute("BEGIN")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
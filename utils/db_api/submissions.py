@@ -0,0 +1,194 @@
+import hashlib
+import json
+import logging
+import re
+import time
+
+from .sqlite import Database
+
+# Google Sheets ustunlari tartibi (process_finish_upload yozadigan qator)
+FIELDS = ('manager', 'created_at', 'contact', 'phone', 'address', 'has_cadastr', 'has_transformer',
+          'transformer_power', 'free_power', 'station', 'folder_link', 'location_link', 'location_info')
+
+
+def normalize_phone(phone):
+    # +998901234567 va 901234567 bir xil raqam hisoblanadi
+    digits = re.sub(r'\D', '', str(phone or ''))
+    return digits[-9:] if len(digits) >= 9 else digits
+
+
+def _row_hash(row):
+    return hashlib.sha1(json.dumps(list(row), ensure_ascii=False).encode()).hexdigest()
+
+
+def _pad(row):
+    row = [str(value) for value in row[:len(FIELDS)]]
+    return row + [''] * (len(FIELDS) - len(row))
+
+
+class Submissions:
+    """
+    Local copy of the submissions sheet, indexed by phone, manager, date and folder.
+
+    Rows are added when a request is finished (before they reach Google Sheets) and
+    reconciled with the sheet on startup: only rows whose content changed are
+    rewritten, rows deleted from the sheet are dropped.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def create_table(self):
+        self.db.execute(f"""
+            CREATE TABLE IF NOT EXISTS submissions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sheet_row INTEGER UNIQUE,
+                user_id TEXT,
+                {', '.join(f'{field} TEXT' for field in FIELDS)},
+                phone_norm TEXT,
+                row_hash TEXT NOT NULL,
+                synced_at REAL
+            )
+        """)
+        for column in ('phone_norm', 'manager', 'created_at', 'folder_link'):
+            self.db.execute(f"CREATE INDEX IF NOT EXISTS submissions_{column} ON submissions ({column})")
+
+    def add(self, row: list, user_id=None) -> int:
+        row = _pad(row)
+        return self.db.execute(
+            f"INSERT INTO submissions (user_id, {', '.join(FIELDS)}, phone_norm, row_hash) "
+            f"VALUES (?, {', '.join('?' * len(FIELDS))}, ?, ?)",
+            (user_id, *row, normalize_phone(row[3]), _row_hash(row))
+        )
+
+    def _select(self, where, parameters, limit=None):
+        sql = f"SELECT {', '.join(FIELDS)} FROM submissions WHERE {where} ORDER BY created_at DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        rows = self.db.execute(sql, parameters, fetchall=True)
+        return [dict(zip(FIELDS, row)) for row in rows]
+
+    def find_by_phone(self, phone, limit=5):
+        phone_norm = normalize_phone(phone)
+        if not phone_norm:
+            return []
+        return self._select("phone_norm = ?", (phone_norm,), limit)
+
+    # created_at "YYYY-MM-DD HH:MM:SS" ko'rinishida; kun oralig'i indeks bo'yicha olinadi
+    def by_manager(self, manager, date=None, limit=None):
+        """
+        Menejer so'rovlari; `date` (YYYY-MM-DD) berilsa faqat o'sha kun.
+        """
+        if date:
+            return self._select("manager = ? AND created_at >= ? AND created_at < ?",
+                                (manager, date, f"{date}~"), limit)
+        return self._select("manager = ?", (manager,), limit)
+
+    def by_date(self, date, limit=None):
+        return self._select("created_at >= ? AND created_at < ?", (date, f"{date}~"), limit)
+
+    def by_folder(self, folder_link):
+        return self._select("folder_link = ?", (folder_link,))
+
+    def iter_range(self, date_from, date_to, batch_size=1000):
+        """
+        [date_from, date_to] oralig'idagi so'rovlar, vaqt bo'yicha, `batch_size` talik sahifalab
+        (xotirada bir vaqtda bitta sahifa turadi).
+        """
+        created_at, last_id = '', 0
+        while True:
+            rows = self.db.execute(
+                f"SELECT id, {', '.join(FIELDS)} FROM submissions "
+                f"WHERE created_at >= ? AND created_at < ? AND (created_at, id) > (?, ?) "
+                f"ORDER BY created_at, id LIMIT ?",
+                (date_from, f"{date_to}~", created_at, last_id, batch_size), fetchall=True
+            )
+            for row in rows:
+                yield row[1:]
+            if len(rows) < batch_size:
+                return
+            last_id, created_at = rows[-1][0], rows[-1][2]
+
+    def stats(self, date_from, date_to=None):
+        """
+        Menejerlar, stansiyalar va kunlar bo'yicha so'rovlar soni.
+        """
+        bounds = (date_from, f"{date_to or '9999-12-31'}~")
+        where = "WHERE created_at >= ? AND created_at < ?"
+        return {
+            'managers': self.db.execute(
+                f"SELECT manager, COUNT(*) AS n FROM submissions {where} GROUP BY manager ORDER BY n DESC",
+                bounds, fetchall=True),
+            'stations': self.db.execute(
+                f"SELECT station, COUNT(*) AS n FROM submissions {where} GROUP BY station ORDER BY n DESC",
+                bounds, fetchall=True),
+            'days': self.db.execute(
+                f"SELECT substr(created_at, 1, 10) AS day, COUNT(*) FROM submissions {where} "
+                f"GROUP BY day ORDER BY day DESC",
+                bounds, fetchall=True),
+        }
+
+    def count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM submissions", fetchone=True)[0]
+
+    def sync_from_sheet(self, values):
+        """
+        Google Sheets qiymatlari (get_all_values) bilan moslashtirish. (yangilangan, o'chirilgan) qaytaradi.
+
+        Qatorlar jadvaldagi o'rni bo'yicha emas, vaqt va telefon bo'yicha bog'lanadi: jadvalga qator
+        qo'shilsa yoki o'chirilsa ham user_id o'z yozuvida qoladi. O'zgarishlar avval hisoblanadi,
+        bazaga esa bitta qisqa tranzaksiyada yoziladi.
+        """
+        # Birinchi qator sarlavha bo'lsa (vaqt ustuni sana emas) o'tkazib yuboriladi
+        start = 1 if values and not re.match(r'^\d{4}-\d{2}-\d{2}', _pad(values[0])[1]) else 0
+        local = {}
+        for row_id, sheet_row, created_at, phone_norm, row_hash in self.db.execute(
+                "SELECT id, sheet_row, created_at, phone_norm, row_hash FROM submissions ORDER BY id", fetchall=True):
+            local.setdefault((created_at, phone_norm), []).append((row_id, sheet_row, row_hash))
+
+        now = time.time()
+        updates, inserts, moved = [], [], []
+        for index in range(start, len(values)):
+            sheet_row = index + 1
+            row = _pad(values[index])
+            if not any(row):
+                continue
+            row_hash = _row_hash(row)
+            fields = (*row, normalize_phone(row[3]), row_hash, now)
+            candidates = local.get((row[1], normalize_phone(row[3])))
+            if not candidates:
+                inserts.append((sheet_row, *fields))
+                continue
+            # Bir xil kalitli yozuvlardan avval shu qatorga bog'langani, keyin eng eskisi
+            match = next((c for c in candidates if c[1] == sheet_row), candidates[0])
+            candidates.remove(match)
+            row_id, old_row, old_hash = match
+            if old_row == sheet_row and old_hash == row_hash:
+                continue
+            if old_row is not None and old_row != sheet_row:
+                moved.append(row_id)
+            updates.append((sheet_row, *fields, row_id))
+        # Jadvaldan qo'lda o'chirilgan qatorlar (hali yozilmagan, sheet_row siz yozuvlar qoladi)
+        deleted = [row_id for candidates in local.values() for row_id, sheet_row, _ in candidates
+                   if sheet_row is not None]
+
+        if updates or inserts or deleted:
+            with self.db.transaction() as connection:
+                connection.executemany("DELETE FROM submissions WHERE id = ?", [(row_id,) for row_id in deleted])
+                # Surilgan qatorlar UNIQUE(sheet_row) ga to'qnashmasligi uchun avval bo'shatiladi
+                connection.executemany("UPDATE submissions SET sheet_row = NULL WHERE id = ?",
+                                       [(row_id,) for row_id in moved])
+                connection.executemany(
+                    f"UPDATE submissions SET sheet_row = ?, {', '.join(f'{field} = ?' for field in FIELDS)}, "
+                    f"phone_norm = ?, row_hash = ?, synced_at = ? WHERE id = ?",
+                    updates
+                )
+                connection.executemany(
+                    f"INSERT INTO submissions (sheet_row, {', '.join(FIELDS)}, phone_norm, row_hash, synced_at) "
+                    f"VALUES (?, {', '.join('?' * len(FIELDS))}, ?, ?, ?)",
+                    inserts
+                )
+        changed = len(updates) + len(inserts)
+        logging.info("So'rovlar Google Sheets bilan moslashtirildi: %s ta yangilandi, %s ta o'chirildi",
+                     changed, len(deleted))
+        return changed, len(deleted)
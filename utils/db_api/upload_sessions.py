@@ -0,0 +1,93 @@
+import time
+
+from .sqlite import Database
+
+# Drive resumable sessiyasi bir hafta amal qiladi
+SESSION_TTL = 6 * 24 * 3600
+
+COLUMNS = ('key', 'telegram_file_id', 'name', 'mime_type', 'folder_id', 'file_type', 'chat_id', 'message_id',
+           'user_id', 'session_uri', 'offset', 'total')
+
+
+class UploadSessions:
+    """
+    Drive resumable uploads in progress.
+
+    A row is written when an upload starts and holds the session URI and the number
+    of bytes Drive has confirmed, so an interrupted upload (including one cut off by
+    a restart) continues from that offset instead of from zero. Finished uploads are
+    removed.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    def create_table(self):
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS upload_sessions (
+                key TEXT PRIMARY KEY,
+                telegram_file_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                mime_type TEXT NOT NULL,
+                folder_id TEXT NOT NULL,
+                file_type TEXT,
+                chat_id INTEGER,
+                message_id INTEGER,
+                user_id INTEGER,
+                session_uri TEXT,
+                offset INTEGER NOT NULL DEFAULT 0,
+                total INTEGER,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        # Eski bazalarda user_id ustuni yo'q
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(upload_sessions)", fetchall=True)}
+        if 'user_id' not in columns:
+            self.db.execute("ALTER TABLE upload_sessions ADD COLUMN user_id INTEGER")
+
+    def start(self, key, telegram_file_id, name, mime_type, folder_id, file_type=None, chat_id=None,
+              message_id=None, total=None, user_id=None):
+        now = time.time()
+        self.db.execute(
+            "INSERT INTO upload_sessions (key, telegram_file_id, name, mime_type, folder_id, file_type, chat_id, "
+            "message_id, user_id, total, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(key) DO NOTHING",
+            (key, telegram_file_id, name, mime_type, folder_id, file_type, chat_id, message_id, user_id, total,
+             now, now)
+        )
+
+    def get(self, key):
+        row = self.db.execute(f"SELECT {', '.join(COLUMNS)} FROM upload_sessions WHERE key = ?", (key,),
+                              fetchone=True)
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def set_session(self, key, session_uri, total=None):
+        self.db.execute(
+            "UPDATE upload_sessions SET session_uri = ?, offset = 0, total = COALESCE(?, total), updated_at = ? "
+            "WHERE key = ?",
+            (session_uri, total, time.time(), key)
+        )
+
+    def set_offset(self, key, offset):
+        self.db.execute("UPDATE upload_sessions SET offset = ?, updated_at = ? WHERE key = ?",
+                        (offset, time.time(), key))
+
+    def remove(self, key):
+        self.db.execute("DELETE FROM upload_sessions WHERE key = ?", (key,))
+
+    def pending(self, shards=1, shard_index=0):
+        """
+        Tugallanmagan yuklamalar (muddati o'tganlari o'chiriladi). `shards` > 1 bo'lsa faqat
+        foydalanuvchisi `shard_index` shardiga tegishlilari (user_id siz eski yozuvlar chat_id bo'yicha).
+        """
+        self.db.execute("DELETE FROM upload_sessions WHERE created_at < ?", (time.time() - SESSION_TTL,))
+        rows = self.db.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM upload_sessions WHERE COALESCE(user_id, chat_id, 0) % ? = ? "
+            f"ORDER BY created_at",
+            (shards, shard_index), fetchall=True
+        )
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM upload_sessions", fetchone=True)[0]
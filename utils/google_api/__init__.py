@@ -0,0 +1,5 @@
+from .clients import get_credentials, connect_to_google_drive, connect_to_google_sheets, warm_up
+from .drive import (check_folder_exists, create_drive_folder, delete_folder_if_empty, ensure_request_folder,
+                    request_folder, wait_request_folder)
+from .resumable import DriveUploadError, create_shortcut, resumable_upload, skip_bytes, stream_to_drive
+from .sheets import SheetsWriter
@@ -0,0 +1,83 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from data.config import GOOGLE_CREDENTIALS_FILE, SPREADSHEET_ID, SHEET_NAME
+
+SCOPES = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
+
+# Token tugashidan shuncha oldin yangilanadi
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+_lock = threading.Lock()
+_local = threading.local()
+_credentials = None
+_worksheet = None
+
+
+def _refresh_if_needed(credentials):
+    from google.auth.transport.requests import Request
+
+    expiry = credentials.expiry
+    if not credentials.token or expiry is None or expiry - datetime.utcnow() < TOKEN_REFRESH_MARGIN:
+        credentials.refresh(Request())
+        logging.info("Google token yangilandi, amal qilish muddati: %s", credentials.expiry)
+
+
+# Google kutubxonalari og'ir, ular birinchi ishlatilganda import qilinadi
+def warm_up():
+    """
+    Google kutubxonalarini oldindan import qilish (ishga tushgandan keyin fonda chaqiriladi).
+    """
+    import gspread  # noqa: F401
+    import googleapiclient.discovery  # noqa: F401
+    import google.oauth2.service_account  # noqa: F401
+    import google.auth.transport.requests  # noqa: F401
+
+
+# Service account ma'lumotlari (jarayon uchun bitta nusxa)
+def get_credentials():
+    global _credentials
+    with _lock:
+        if _credentials is None:
+            from google.oauth2.service_account import Credentials
+
+            _credentials = Credentials.from_service_account_file(GOOGLE_CREDENTIALS_FILE, scopes=SCOPES)
+        _refresh_if_needed(_credentials)
+        return _credentials
+
+
+# Google Drive ga ulanish (har bir potok uchun bitta service)
+def connect_to_google_drive():
+    try:
+        credentials = get_credentials()
+        drive_service = getattr(_local, 'drive_service', None)
+        if drive_service is None:
+            from googleapiclient.discovery import build
+
+            # httplib2 potoklar orasida xavfsiz emas, shuning uchun service potokka bog'lanadi.
+            # Discovery hujjati kutubxona bilan birga keladi, tarmoqqa so'rov yuborilmaydi
+            drive_service = build('drive', 'v3', credentials=credentials, cache_discovery=False,
+                                  static_discovery=True)
+            _local.drive_service = drive_service
+        return drive_service
+    except Exception as e:
+        logging.error("Google Drive ulanishda xato: %s", e)
+        raise
+
+
+# Google Sheets ga ulanish (worksheet bir marta ochiladi)
+def connect_to_google_sheets():
+    global _worksheet
+    try:
+        credentials = get_credentials()
+        with _lock:
+            if _worksheet is None:
+                import gspread
+
+                client = gspread.authorize(credentials)
+                _worksheet = client.open_by_key(SPREADSHEET_ID).worksheet(SHEET_NAME)
+            return _worksheet
+    except Exception as e:
+        logging.error("Google Sheets ulanishda xato: %s", e)
+        raise
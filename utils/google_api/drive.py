@@ -0,0 +1,131 @@
+import asyncio
+import logging
+
+from aiogram.dispatcher import FSMContext
+
+from data.config import DRIVE_FOLDER_ID
+from utils.misc.metrics import track
+from .clients import connect_to_google_drive
+
+# Yaratilayotgan papkalar: (chat, user, folder_name) -> asyncio.Task
+_pending_folders = {}
+# Tugagan vazifa shuncha sekund saqlanadi: undan oldin o'qilgan holat bilan kelgan media ham shu papkani oladi
+FOLDER_TASK_TTL = 300
+
+
+# Papka mavjudligini tekshirish
+def check_folder_exists(drive_service, folder_id):
+    from googleapiclient.errors import HttpError
+
+    try:
+        folder = drive_service.files().get(fileId=folder_id).execute()
+        logging.info("Papka mavjud: %s (ID: %s)", folder['name'], folder_id)
+        return True
+    except HttpError as e:
+        logging.error("Papka ID %s topilmadi: %s", folder_id, e)
+        return False
+
+
+# Yangi papka yaratish
+def create_drive_folder(drive_service, folder_name, parent_folder_id=None):
+    from googleapiclient.errors import HttpError
+
+    try:
+        file_metadata = {
+            'name': folder_name,
+            'mimeType': 'application/vnd.google-apps.folder'
+        }
+        if parent_folder_id:
+            file_metadata['parents'] = [parent_folder_id]
+        folder = drive_service.files().create(body=file_metadata, fields='id, webViewLink').execute()
+        folder_id = folder.get('id')
+        drive_service.permissions().create(
+            fileId=folder_id,
+            body={'type': 'anyone', 'role': 'reader'}
+        ).execute()
+        logging.info("Yangi papka yaratildi: %s (ID: %s)", folder_name, folder_id)
+        return folder_id, folder.get('webViewLink')
+    except HttpError as e:
+        logging.error("Papka yaratishda xato: %s", e)
+        return None, None
+
+
+# Bo'sh papkani o'chirish (tashlab ketilgan so'rovlar uchun)
+def delete_folder_if_empty(folder_id) -> bool:
+    if not folder_id or folder_id == DRIVE_FOLDER_ID:
+        return False
+    drive_service = connect_to_google_drive()
+    files = drive_service.files().list(
+        q=f"'{folder_id}' in parents and trashed = false", pageSize=1, fields='files(id)'
+    ).execute()
+    if files.get('files'):
+        return False
+    drive_service.files().delete(fileId=folder_id).execute()
+    logging.info("Bo'sh papka o'chirildi: %s", folder_id)
+    return True
+
+
+def _create_request_folder(folder_name):
+    folder_id, folder_link = create_drive_folder(connect_to_google_drive(), folder_name, DRIVE_FOLDER_ID)
+    if not folder_id:
+        return DRIVE_FOLDER_ID, f"https://drive.google.com/drive/folders/{DRIVE_FOLDER_ID}"
+    return folder_id, folder_link
+
+
+async def _create_and_store(state: FSMContext, folder_name):
+    loop = asyncio.get_running_loop()
+    with track('drive_create_folder'):
+        folder_id, folder_link = await loop.run_in_executor(None, _create_request_folder, folder_name)
+    data = await state.get_data()
+    # Foydalanuvchi bu orada yangi so'rov boshlagan bo'lsa, papka eski so'rovga tegishli
+    if data.get('folder_name') == folder_name:
+        await state.update_data(folder_id=folder_id, folder_link=folder_link)
+    return folder_id, folder_link
+
+
+def _resolved(folder_id, folder_link):
+    future = asyncio.get_running_loop().create_future()
+    future.set_result((folder_id, folder_link))
+    return future
+
+
+# So'rov papkasini birinchi media kelganda yaratish: `data` dagi so'rovning (folder_id, folder_link) vazifasi
+# (bir vaqtdagi chaqiruvlar bitta vazifani bo'lishadi, shuning uchun asyncio.shield orqali kutiladi)
+def request_folder(state: FSMContext, data: dict):
+    if data.get('folder_id'):
+        return _resolved(data['folder_id'], data['folder_link'])
+    folder_name = data.get('folder_name')
+    if not folder_name:
+        return _resolved(DRIVE_FOLDER_ID, f"https://drive.google.com/drive/folders/{DRIVE_FOLDER_ID}")
+
+    key = (state.chat, state.user, folder_name)
+    task = _pending_folders.get(key)
+    if task is None:
+        task = asyncio.create_task(_create_and_store(state, folder_name))
+        _pending_folders[key] = task
+        task.add_done_callback(lambda done: _forget_folder(key, done))
+    return task
+
+
+# Xato bilan tugagan vazifa darhol o'chiriladi (keyingi media qayta urinadi), muvaffaqiyatlisi FOLDER_TASK_TTL saqlanadi
+def _forget_folder(key, task):
+    if task.cancelled() or task.exception() is not None:
+        _pending_folders.pop(key, None)
+    else:
+        asyncio.get_running_loop().call_later(FOLDER_TASK_TTL, _pending_folders.pop, key, None)
+
+
+# Joriy so'rovning (folder_id, folder_link) qiymati
+async def ensure_request_folder(state: FSMContext):
+    return await asyncio.shield(request_folder(state, await state.get_data()))
+
+
+# Yaratilayotgan papka bo'lsa, tugashini kutish
+async def wait_request_folder(state: FSMContext):
+    data = await state.get_data()
+    task = _pending_folders.get((state.chat, state.user, data.get('folder_name')))
+    if task is not None:
+        try:
+            await asyncio.shield(task)
+        except Exception as e:
+            logging.error("Papka yaratishda xato: %s", e)
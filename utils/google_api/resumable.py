@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import random
+
+import aiohttp
+
+from data.config import UPLOAD_RETRIES
+from utils.db_api import UploadSessions
+from .clients import get_credentials
+
+DRIVE_API_URL = 'https://www.googleapis.com/drive/v3'
+DRIVE_UPLOAD_URL = 'https://www.googleapis.com/upload/drive/v3/files?uploadType=resumable&fields=id'
+
+# Drive bo'laklari 256 KB ga karrali bo'lishi kerak
+CHUNK_SIZE = 4 * 256 * 1024
+# Xotirada saqlanadigan bo'laklar soni (yuklab olish va yuborish orasidagi bufer)
+BUFFER_CHUNKS = 4
+# Qayta urinish mumkin bo'lgan javoblar (308 - Drive bo'lakni to'liq qabul qilmagan)
+TRANSIENT_STATUSES = {308, 408, 429, 500, 502, 503, 504}
+MAX_BACKOFF = 60
+
+
+class DriveUploadError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class UploadSessionExpired(DriveUploadError):
+    pass
+
+
+def _is_transient(error):
+    if isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    return isinstance(error, DriveUploadError) and error.status in TRANSIENT_STATUSES
+
+
+def _committed_offset(range_header):
+    # "bytes=0-1048575" -> 1048576; sarlavha bo'lmasa hali hech narsa saqlanmagan
+    if not range_header:
+        return 0
+    return int(range_header.rsplit('-', 1)[1]) + 1
+
+
+async def get_access_token():
+    loop = asyncio.get_running_loop()
+    credentials = await loop.run_in_executor(None, get_credentials)
+    return credentials.token
+
+
+async def _rechunk(source, queue: asyncio.Queue):
+    """
+    Manbadan kelgan baytlarni CHUNK_SIZE li bo'laklarga bo'lib navbatga qo'yish.
+    Oxirida navbatga None qo'yiladi.
+    """
+    buffer = bytearray()
+    try:
+        async for data in source:
+            buffer.extend(data)
+            while len(buffer) >= CHUNK_SIZE:
+                await queue.put(bytes(buffer[:CHUNK_SIZE]))
+                del buffer[:CHUNK_SIZE]
+        if buffer:
+            await queue.put(bytes(buffer))
+    except Exception:
+        await queue.put(None)
+        raise
+    await queue.put(None)
+
+
+async def skip_bytes(source, count):
+    """
+    Manbaning birinchi `count` baytini tashlab yuborish (Range qo'llab-quvvatlanmasa).
+    """
+    async for data in source:
+        if count >= len(data):
+            count -= len(data)
+            continue
+        yield data[count:]
+        count = 0
+
+
+async def _start_session(session: aiohttp.ClientSession, token, name, mime_type, folder_id, total_size=None):
+    headers = {
+        'Authorization': f'Bearer {token}',
+        'X-Upload-Content-Type': mime_type,
+    }
+    if total_size:
+        headers['X-Upload-Content-Length'] = str(total_size)
+    metadata = {'name': name, 'parents': [folder_id]}
+    async with session.post(DRIVE_UPLOAD_URL, json=metadata, headers=headers) as response:
+        if response.status != 200:
+            raise DriveUploadError(f"Yuklash sessiyasi ochilmadi: {response.status} {await response.text()}",
+                                   response.status)
+        return response.headers['Location']
+
+
+async def _put_chunk(session: aiohttp.ClientSession, token, session_uri, chunk, offset, total):
+    end = offset + len(chunk) - 1
+    headers = {
+        'Authorization': f'Bearer {token}',
+        'Content-Range': f"bytes {offset}-{end}/{total if total is not None else '*'}",
+    }
+    async with session.put(session_uri, data=chunk, headers=headers) as response:
+        if response.status == 308:
+            committed = _committed_offset(response.headers.get('Range'))
+            if committed != end + 1:
+                raise DriveUploadError(f"Drive {committed} baytni qabul qildi, {end + 1} kutilgan", 308)
+            return None
+        if response.status in (200, 201):
+            return (await response.json())['id']
+        if response.status in (404, 410):
+            raise UploadSessionExpired(f"Yuklash sessiyasi tugagan: {response.status}", response.status)
+        raise DriveUploadError(f"Bo'lak yuborilmadi ({offset}-{end}): {response.status} {await response.text()}",
+                               response.status)
+
+
+async def query_offset(session: aiohttp.ClientSession, token, session_uri, total=None):
+    """
+    Drive saqlagan baytlar sonini so'rash. (offset, file_id) qaytaradi; file_id faqat yuklama tugagan bo'lsa.
+    """
+    headers = {
+        'Authorization': f'Bearer {token}',
+        'Content-Range': f"bytes */{total if total is not None else '*'}",
+    }
+    async with session.put(session_uri, headers=headers) as response:
+        if response.status == 308:
+            return _committed_offset(response.headers.get('Range')), None
+        if response.status in (200, 201):
+            return total, (await response.json())['id']
+        if response.status in (404, 410):
+            raise UploadSessionExpired(f"Yuklash sessiyasi tugagan: {response.status}", response.status)
+        raise DriveUploadError(f"Sessiya holati olinmadi: {response.status} {await response.text()}", response.status)
+
+
+async def share_with_anyone(session: aiohttp.ClientSession, file_id, token=None):
+    token = token or await get_access_token()
+    async with session.post(
+            f"{DRIVE_API_URL}/files/{file_id}/permissions",
+            json={'type': 'anyone', 'role': 'reader'},
+            headers={'Authorization': f'Bearer {token}'}
+    ) as response:
+        if response.status != 200:
+            raise DriveUploadError(f"Ruxsat berilmadi: {response.status} {await response.text()}", response.status)
+
+
+async def create_shortcut(session: aiohttp.ClientSession, target_id, name, folder_id):
+    """
+    Papkada mavjud Drive fayliga yorliq (shortcut) yaratish. Yorliq ID sini qaytaradi.
+    """
+    token = await get_access_token()
+    metadata = {
+        'name': name,
+        'mimeType': 'application/vnd.google-apps.shortcut',
+        'shortcutDetails': {'targetId': target_id},
+        'parents': [folder_id],
+    }
+    async with session.post(
+            f"{DRIVE_API_URL}/files?fields=id",
+            json=metadata,
+            headers={'Authorization': f'Bearer {token}'}
+    ) as response:
+        if response.status != 200:
+            raise DriveUploadError(f"Yorliq yaratilmadi: {response.status} {await response.text()}", response.status)
+        return (await response.json())['id']
+
+
+async def stream_to_drive(session: aiohttp.ClientSession, source, name, mime_type, folder_id, total_size=None,
+                          session_uri=None, offset=0, on_progress=None):
+    """
+    Stream an async iterable of bytes into a Drive resumable upload.
+
+    Download and upload overlap: the source is re-chunked into CHUNK_SIZE pieces
+    through a queue of BUFFER_CHUNKS items, so memory stays bounded regardless of
+    file size. Returns the new Drive file id.
+
+    To continue an interrupted upload pass its `session_uri` and the `offset` Drive
+    has confirmed; `source` must then start at that offset. `on_progress(session_uri,
+    offset)` is called when the session is opened and after every confirmed chunk.
+    """
+    token = await get_access_token()
+    if session_uri is None:
+        session_uri = await _start_session(session, token, name, mime_type, folder_id, total_size)
+        offset = 0
+        if on_progress:
+            on_progress(session_uri, offset)
+
+    queue = asyncio.Queue(maxsize=BUFFER_CHUNKS)
+    reader = asyncio.create_task(_rechunk(source, queue))
+    try:
+        file_id = None
+        chunk = await queue.get()
+        while chunk is not None:
+            next_chunk = await queue.get()
+            if next_chunk is None:
+                # Yuklab olishda xato bo'lsa, chala fayl yakunlanmasligi kerak
+                await reader
+                total = offset + len(chunk)
+            else:
+                total = total_size
+            # Uzoq yuklamalarda token muddati tugamasligi uchun har safar tekshiriladi
+            token = await get_access_token()
+            file_id = await _put_chunk(session, token, session_uri, chunk, offset, total)
+            offset += len(chunk)
+            if on_progress and not file_id:
+                on_progress(session_uri, offset)
+            chunk = next_chunk
+        await reader
+    finally:
+        if not reader.done():
+            reader.cancel()
+
+    if not file_id:
+        raise DriveUploadError(f"Yuklash yakunlanmadi: {name} ({offset} bayt)")
+    await share_with_anyone(session, file_id, token)
+    logging.info("Fayl muvaffaqiyatli yuklandi, ID: %s, hajmi: %s bayt", file_id, offset)
+    return file_id
+
+
+async def resumable_upload(session: aiohttp.ClientSession, open_source, name, mime_type, folder_id,
+                           total_size=None, sessions: UploadSessions = None, key=None, retries=UPLOAD_RETRIES):
+    """
+    stream_to_drive with retries that continue from the last confirmed byte.
+
+    `open_source(offset)` is an async context manager that yields the file's bytes
+    starting at `offset`. The session URI and confirmed offset are kept in `sessions`
+    under `key`, so an upload cut off by a restart is continued by the next call with
+    the same key. Transient errors are retried up to `retries` times with jittered
+    exponential backoff; an expired session starts over from zero.
+    """
+    saved = sessions.get(key) if sessions else None
+    session_uri = saved['session_uri'] if saved else None
+
+    def progress(uri, offset):
+        nonlocal session_uri
+        if sessions and uri != session_uri:
+            sessions.set_session(key, uri, total_size)
+        elif sessions:
+            sessions.set_offset(key, offset)
+        session_uri = uri
+
+    for attempt in range(retries + 1):
+        try:
+            offset = 0
+            if session_uri:
+                token = await get_access_token()
+                offset, file_id = await query_offset(session, token, session_uri, total_size)
+                if file_id:
+                    await share_with_anyone(session, file_id, token)
+                    return file_id
+                if offset:
+                    logging.info("Yuklash davom ettiriladi: %s, %s baytdan", name, offset)
+            async with open_source(offset) as source:
+                return await stream_to_drive(session, source, name, mime_type, folder_id, total_size,
+                                             session_uri, offset, progress)
+        except UploadSessionExpired as e:
+            if attempt == retries:
+                raise
+            logging.warning("%s: %s, yuklash boshidan boshlanadi", name, e)
+            session_uri = None
+        except Exception as e:
+            if attempt == retries or not _is_transient(e):
+                raise
+            delay = random.uniform(0, min(MAX_BACKOFF, 2 ** attempt))
+            logging.warning("%s yuklanishi uzildi (%s: %s), %.1f s dan keyin qayta urinish %s/%s",
+                            name, type(e).__name__, e, delay, attempt + 1, retries)
+            await asyncio.sleep(delay)
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import random
+import time
+
+from data.config import SHEETS_BATCH_SIZE, SHEETS_FLUSH_INTERVAL, SHEETS_MIN_INTERVAL, SHEETS_MAX_ATTEMPTS
+from utils.db_api import SheetsOutbox, Submissions
+from utils.misc.metrics import track
+from .clients import connect_to_google_sheets
+
+MAX_BACKOFF = 300
+
+
+def _status_code(error):
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None)
+
+
+def _rejected(error):
+    # Qatorning o'zi rad etilgan (4xx); kvota (429) va tarmoq/server xatolari vaqtinchalik
+    status = _status_code(error)
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+
+class SheetsWriter:
+    """
+    Background flusher for the Sheets outbox.
+
+    Rows are sent with one `append_rows` call per batch. Calls are spaced at least
+    SHEETS_MIN_INTERVAL seconds apart to stay inside the per-minute write quota,
+    failures back off exponentially with jitter (longer on HTTP 429).
+
+    Rows of a failed batch are retried one at a time, so a single row the sheet
+    rejects cannot hold back the others; after `max_attempts` rejections it is
+    parked in the outbox and logged.
+    """
+
+    def __init__(self, outbox: SheetsOutbox, batch_size=SHEETS_BATCH_SIZE,
+                 flush_interval=SHEETS_FLUSH_INTERVAL, min_interval=SHEETS_MIN_INTERVAL,
+                 max_attempts=SHEETS_MAX_ATTEMPTS):
+        self.outbox = outbox
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.flush_interval = flush_interval
+        self.min_interval = min_interval
+        self.failures = 0
+        self._last_call = 0
+        self._wakeup = None
+        self._task = None
+        self._flushing = asyncio.Lock()
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def notify(self):
+        """
+        Outboxga yangi qator qo'shilganini bildirish.
+        """
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _append(self, rows):
+        sheet = connect_to_google_sheets()
+        sheet.append_rows(rows)
+
+    async def flush_once(self) -> int:
+        """
+        Bitta paketni yuborish. Yuborilgan qatorlar sonini qaytaradi.
+        """
+        batch = self.outbox.peek(self.batch_size)
+        if not batch:
+            return 0
+        if batch[0][2]:
+            # Avval xato bergan qator alohida yuboriladi: rad etilgan qator boshqalarini to'xtatib turmaydi
+            batch = batch[:1]
+        wait = self._last_call + self.min_interval - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        ids = [row_id for row_id, _, _ in batch]
+        loop = asyncio.get_running_loop()
+        self._last_call = time.monotonic()
+        try:
+            with track('sheets_append_rows'):
+                await loop.run_in_executor(None, self._append, [row for _, row, _ in batch])
+        except Exception as e:
+            self.outbox.mark_failed(ids)
+            row_id, row, attempts = batch[0]
+            if len(batch) == 1 and _rejected(e) and attempts + 1 >= self.max_attempts:
+                self.outbox.park(ids)
+                logging.error("Google Sheets qatorni %s marta rad etdi, u chetga olindi (outbox id %s): %s; %s",
+                              attempts + 1, row_id, row, e)
+                # Navbatdagi qatorlar kutmasdan yuboriladi
+                self.notify()
+                return 0
+            raise
+        self.outbox.remove(ids)
+        logging.info("Google Sheets ga %s ta qator yozildi", len(ids))
+        return len(ids)
+
+    def _read_all(self):
+        sheet = connect_to_google_sheets()
+        return sheet.get_all_values()
+
+    async def sync_submissions(self, submissions: Submissions):
+        """
+        Mahalliy so'rovlar indeksini jadval bilan moslashtirish (qo'lda tahrirlar uchun).
+        Jadval bitta so'rovda o'qiladi, bazaga faqat o'zgargan qatorlar yoziladi.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            with track('sheets_get_all_values'):
+                values = await loop.run_in_executor(None, self._read_all)
+            await loop.run_in_executor(None, submissions.sync_from_sheet, values)
+        except Exception as e:
+            logging.error("So'rovlar indeksini Google Sheets bilan moslashtirishda xato: %s", e)
+
+    async def drain(self, timeout, margin=3.0) -> int:
+        """
+        To'xtatishdan oldin: fon vazifasini to'xtatib, outboxni `timeout` sekund ichida yuborish.
+        Yangi paket faqat `margin` sekunddan ko'p vaqt qolganda boshlanadi. Qolgan qatorlar sonini qaytaradi.
+        """
+        deadline = time.monotonic() + timeout
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._flushing.acquire(), timeout=max(timeout, 0))
+            except asyncio.TimeoutError:
+                # Paket hali yuborilmoqda; qatorlar outboxda qoladi va keyingi safar yuboriladi
+                return self.outbox.count()
+            self._task.cancel()
+            self._task = None
+            self._flushing.release()
+        while self.outbox.count() and deadline - time.monotonic() > margin + self.min_interval:
+            try:
+                await self.flush_once()
+            except Exception as e:
+                logging.error("To'xtatishda Google Sheets ga yozilmadi: %s", e)
+                break
+        return self.outbox.count()
+
+    def _backoff(self, error):
+        base = 30 if _status_code(error) == 429 else 2
+        delay = min(MAX_BACKOFF, base * 2 ** (self.failures - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _run(self):
+        # Qayta ishga tushganda outboxda qolgan qatorlar darhol yuboriladi
+        self._wakeup.set()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval * 10)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            # Ketma-ket kelgan so'rovlarni bitta paketga yig'ish
+            await asyncio.sleep(self.flush_interval)
+            try:
+                # To'xtatish (drain) yuborilayotgan paketni uzib qo'ymaydi
+                async with self._flushing:
+                    while await self.flush_once():
+                        pass
+                self.failures = 0
+            except Exception as e:
+                self.failures += 1
+                delay = self._backoff(e)
+                logging.error("Google Sheets ga yozishda xato (urinish %s, %.0f s dan keyin qayta): %s",
+                              self.failures, delay, e)
+                await asyncio.sleep(delay)
+                self._wakeup.set()
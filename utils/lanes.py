@@ -0,0 +1,115 @@
+import asyncio
+import contextvars
+import logging
+
+from aiogram import Dispatcher, types
+
+from data.config import LANE_QUEUE_SIZE, LANE_IDLE_TIMEOUT
+from utils.misc.metrics import registry
+from utils.sharding import UPDATE_SOURCES
+
+lane_dropped = registry.counter('bot_lane_dropped_total', 'Updates dropped because a user lane was full')
+
+
+def lane_key(update: types.Update):
+    """
+    Update yuborgan foydalanuvchi ID si (topilmasa None).
+    """
+    for source in UPDATE_SOURCES:
+        event = getattr(update, source, None)
+        if event:
+            user = getattr(event, 'from_user', None) or getattr(event, 'user', None) or getattr(event, 'chat', None)
+            return user.id if user else None
+    return None
+
+
+class Lane:
+    __slots__ = ('queue', 'task')
+
+    def __init__(self, size):
+        self.queue = asyncio.Queue(maxsize=size)
+        self.task = None
+
+
+class LaneDispatcher(Dispatcher):
+    """
+    Dispatcher that runs the updates of one user one at a time, in arrival order.
+
+    Every user gets a lane: a bounded queue drained by its own worker task, so two
+    quick photos or a double-tapped button never run their handlers (and their
+    `state.proxy()` writes) concurrently, while different users run in parallel.
+    Each update still runs in a fresh task with the caller's context. When a lane
+    is full further updates of that user are dropped; a lane idle for
+    `idle_timeout` seconds is removed.
+    """
+
+    def __init__(self, *args, lane_size=LANE_QUEUE_SIZE, idle_timeout=LANE_IDLE_TIMEOUT, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lane_size = lane_size
+        self.idle_timeout = idle_timeout
+        self.lanes = {}
+
+    async def process_update(self, update: types.Update):
+        key = lane_key(update)
+        if key is None:
+            return await super().process_update(update)
+        lane = self.lanes.get(key)
+        if lane is None:
+            lane = self.lanes[key] = Lane(self.lane_size)
+            lane.task = asyncio.create_task(self._drain(key, lane))
+        future = asyncio.get_running_loop().create_future()
+        try:
+            lane.queue.put_nowait((update, future, contextvars.copy_context()))
+        except asyncio.QueueFull:
+            lane_dropped.inc()
+            logging.warning("Foydalanuvchi %s navbati to'la, update %s tashlab yuborildi", key, update.update_id)
+            return []
+        return await future
+
+    async def _drain(self, key, lane: Lane):
+        try:
+            while True:
+                try:
+                    update, future, context = await asyncio.wait_for(lane.queue.get(), timeout=self.idle_timeout)
+                except asyncio.TimeoutError:
+                    # Tekshirish va o'chirish orasida await yo'q, yangi update yo'qolmaydi
+                    if lane.queue.empty():
+                        return
+                    continue
+                try:
+                    await self._run(update, future, context)
+                finally:
+                    lane.queue.task_done()
+        finally:
+            if self.lanes.get(key) is lane:
+                del self.lanes[key]
+            while not lane.queue.empty():
+                lane.queue.get_nowait()[1].cancel()
+                lane.queue.task_done()
+
+    async def _run(self, update, future, context):
+        # Har bir update alohida vazifada: aiogram holat keshi (ctx_state) updatelar orasida o'tmaydi
+        task = asyncio.create_task(super().process_update(update), context=context)
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            future.cancel()
+            if asyncio.current_task().cancelling():
+                raise
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+
+    async def wait_lanes(self, timeout=None):
+        """
+        Navbatlardagi barcha updatelar bajarilishini kutish.
+        """
+        waiters = [asyncio.create_task(lane.queue.join()) for lane in self.lanes.values()]
+        if not waiters:
+            return
+        _, pending = await asyncio.wait(waiters, timeout=timeout)
+        for waiter in pending:
+            waiter.cancel()
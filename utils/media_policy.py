@@ -0,0 +1,214 @@
+import asyncio
+import glob
+import importlib.util
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+
+from data.config import (MAX_PHOTO_SIDE, PHOTO_RECOMPRESS, PHOTO_QUALITY, VIDEO_TRANSCODE, VIDEO_MAX_HEIGHT,
+                         VIDEO_MAX_BITRATE, MEDIA_WORKERS, MEDIA_TMP_DIR)
+
+# Faylni diskka yozish/o'qish bo'lagi
+IO_CHUNK_SIZE = 1024 * 1024
+# ffmpeg uchun vaqt chegarasi (sekund)
+TRANSCODE_TIMEOUT = 600
+# Boshqa (o'ldirilgan) jarayondan qolgan vaqtinchalik fayllar shuncha sekunddan keyin o'chiriladi
+STALE_TMP_AGE = 3600
+WORKDIR_PREFIX = 'tokbot_'
+
+
+def _recompress_photo(source, target, max_side, quality):
+    # Alohida jarayonda bajariladi
+    from PIL import Image
+
+    with Image.open(source) as image:
+        if max_side:
+            image.thumbnail((max_side, max_side))
+        image.convert('RGB').save(target, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return target
+
+
+class MediaPolicy:
+    """
+    Decides which Telegram rendition to upload and whether to shrink it first.
+
+    Photos: the largest PhotoSize whose longer side fits MAX_PHOTO_SIDE is chosen.
+    If PHOTO_RECOMPRESS is on and Pillow is installed, the photo is re-encoded in a
+    process pool. Videos above VIDEO_MAX_HEIGHT or VIDEO_MAX_BITRATE are transcoded
+    with a local ffmpeg if VIDEO_TRANSCODE is on. Anything that fails is uploaded as is.
+    """
+
+    def __init__(self, max_photo_side=MAX_PHOTO_SIDE, recompress_photos=PHOTO_RECOMPRESS, photo_quality=PHOTO_QUALITY,
+                 transcode_videos=VIDEO_TRANSCODE, max_video_height=VIDEO_MAX_HEIGHT,
+                 max_video_bitrate=VIDEO_MAX_BITRATE, workers=MEDIA_WORKERS, tmp_dir=MEDIA_TMP_DIR):
+        self.max_photo_side = max_photo_side
+        self.photo_quality = photo_quality
+        self.max_video_height = max_video_height
+        self.max_video_bitrate = max_video_bitrate
+        self.workers = workers
+        self.tmp_dir = tmp_dir or None
+        self.recompress_photos = recompress_photos and importlib.util.find_spec('PIL') is not None
+        self.ffmpeg = shutil.which('ffmpeg') if transcode_videos else None
+        if recompress_photos and not self.recompress_photos:
+            logging.warning("PHOTO_RECOMPRESS yoqilgan, lekin Pillow o'rnatilmagan")
+        if transcode_videos and not self.ffmpeg:
+            logging.warning("VIDEO_TRANSCODE yoqilgan, lekin ffmpeg topilmadi")
+        self._pool = None
+        self._slots = None
+        self._workdirs = set()
+
+    def pick_photo(self, sizes):
+        """
+        Chegaraga sig'adigan eng katta PhotoSize (hech biri sig'masa eng kichigi).
+        """
+        if not self.max_photo_side:
+            return sizes[-1]
+        fitting = [size for size in sizes if max(size.width, size.height) <= self.max_photo_side]
+        if fitting:
+            return max(fitting, key=lambda size: size.width * size.height)
+        return min(sizes, key=lambda size: size.width * size.height)
+
+    def needs_processing(self, file_type, media) -> bool:
+        if file_type == 'photo':
+            return self.recompress_photos
+        if not self.ffmpeg:
+            return False
+        if self.max_video_height and (media.height or 0) > self.max_video_height:
+            return True
+        if self.max_video_bitrate and media.duration and media.file_size:
+            return media.file_size * 8 / media.duration / 1000 > self.max_video_bitrate
+        return False
+
+    @contextmanager
+    def workdir(self):
+        """
+        Vaqtinchalik papka; blokdan chiqqanda o'chiriladi.
+        """
+        if self.tmp_dir:
+            os.makedirs(self.tmp_dir, exist_ok=True)
+        path = tempfile.mkdtemp(prefix=WORKDIR_PREFIX, dir=self.tmp_dir)
+        self._workdirs.add(path)
+        try:
+            yield path
+        finally:
+            self._workdirs.discard(path)
+            shutil.rmtree(path, ignore_errors=True)
+
+    def remove_stale_files(self, max_age=STALE_TMP_AGE) -> int:
+        """
+        Avvalgi ishga tushishlardan qolgan vaqtinchalik papkalar va ishchi papkadagi eski temp_* fayllarni o'chirish.
+        """
+        cutoff = time.time() - max_age
+        paths = glob.glob(os.path.join(self.tmp_dir or tempfile.gettempdir(), f'{WORKDIR_PREFIX}*'))
+        paths += glob.glob('temp_*')
+        removed = 0
+        for path in paths:
+            try:
+                if path in self._workdirs or os.path.getmtime(path) > cutoff:
+                    continue
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+                removed += 1
+            except OSError:
+                continue
+        if removed:
+            logging.info("%s ta eski vaqtinchalik fayl o'chirildi", removed)
+        return removed
+
+    async def process(self, file_type, source) -> str:
+        """
+        Faylni siqish. Natija yo'lini qaytaradi; siqib bo'lmasa yoki kattalashsa - asl faylni.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        target = f"{source}.out.{'jpg' if file_type == 'photo' else 'mp4'}"
+        try:
+            async with self._slots:
+                if file_type == 'photo':
+                    await self._recompress(source, target)
+                else:
+                    await self._transcode(source, target)
+        except Exception as e:
+            logging.warning("%s siqilmadi, asl fayl yuklanadi: %s", file_type, e)
+            return source
+        before, after = os.path.getsize(source), os.path.getsize(target)
+        if after >= before:
+            return source
+        logging.info("%s siqildi: %s -> %s bayt", file_type, before, after)
+        return target
+
+    async def _recompress(self, source, target):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._pool, _recompress_photo, source, target, self.max_photo_side,
+                                   self.photo_quality)
+
+    async def _transcode(self, source, target):
+        # ffmpeg o'zi alohida jarayon, shuning uchun pool kerak emas
+        scale = f"scale=-2:'min({self.max_video_height},ih)'" if self.max_video_height else 'scale=iw:ih'
+        command = [self.ffmpeg, '-nostdin', '-y', '-loglevel', 'error', '-i', source, '-vf', scale,
+                   '-c:v', 'libx264', '-preset', 'veryfast', '-c:a', 'aac', '-b:a', '96k', '-movflags', '+faststart']
+        if self.max_video_bitrate:
+            bitrate = self.max_video_bitrate
+            command += ['-b:v', f'{bitrate}k', '-maxrate', f'{bitrate}k', '-bufsize', f'{bitrate * 2}k']
+        process = await asyncio.create_subprocess_exec(*command, target, stdout=asyncio.subprocess.DEVNULL,
+                                                       stderr=asyncio.subprocess.PIPE)
+        try:
+            _, stderr = await asyncio.wait_for(process.communicate(), timeout=TRANSCODE_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            process.kill()
+            await process.wait()
+            raise
+        if process.returncode != 0:
+            raise RuntimeError(f"ffmpeg {process.returncode}: {stderr.decode(errors='replace')[-500:]}")
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        # Uzilgan vazifalardan qolgan papkalar
+        for path in list(self._workdirs):
+            shutil.rmtree(path, ignore_errors=True)
+        self._workdirs.clear()
+
+
+async def save_stream(source, path):
+    """
+    Baytlar oqimini faylga yozish (disk operatsiyalari potokda).
+    """
+    loop = asyncio.get_running_loop()
+    with open(path, 'wb') as file:
+        async for data in source:
+            await loop.run_in_executor(None, file.write, data)
+
+
+@asynccontextmanager
+async def file_source(path, offset=0):
+    """
+    Faylni `offset` dan boshlab bo'laklab o'qish (resumable_upload uchun manba).
+    """
+    loop = asyncio.get_running_loop()
+    file = open(path, 'rb')
+
+    async def chunks():
+        file.seek(offset)
+        while True:
+            data = await loop.run_in_executor(None, file.read, IO_CHUNK_SIZE)
+            if not data:
+                return
+            yield data
+
+    try:
+        yield chunks()
+    finally:
+        file.close()
+
+
+media_policy = MediaPolicy()
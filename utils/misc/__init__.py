@@ -1,2 +1,4 @@
-from .throttling import rate_limit
+from .throttling import rate_limit, upload_backpressure
 from . import logging
+from .media_group import MediaGroupCollector
+from .router import Router, resolved_handler
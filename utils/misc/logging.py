@@ -1,5 +1,135 @@
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
+import queue
+import sys
+import time
+from datetime import datetime, timezone
 
-logging.basicConfig(format=u'%(filename)s [LINE:%(lineno)d] #%(levelname)-8s [%(asctime)s]  %(message)s',
-                    level=logging.INFO,
-                    )
+from data.config import LOG_LEVEL, LOG_FORMAT, LOG_ERROR_BURST, LOG_ERROR_WINDOW
+
+# Joriy update uchun korrelyatsiya identifikatorlari (middleware o'rnatadi)
+log_update_id = contextvars.ContextVar('log_update_id', default=None)
+log_user_id = contextvars.ContextVar('log_user_id', default=None)
+
+TEXT_FORMAT = u'%(filename)s [LINE:%(lineno)d] #%(levelname)-8s [%(asctime)s] [%(user_id)s/%(update_id)s]  %(message)s'
+
+
+class ContextFilter(logging.Filter):
+    """
+    Adds update_id and user_id of the current update to every record.
+    Runs in the calling thread, before the record is queued.
+    """
+
+    def filter(self, record):
+        record.update_id = log_update_id.get()
+        record.user_id = log_user_id.get()
+        return True
+
+
+class RepeatFilter(logging.Filter):
+    """
+    Rate limit for repeated warnings and errors.
+
+    Records with the same origin (logger, file, line) pass at most `burst` times per
+    `window` seconds; the rest are dropped and counted, and the next record that
+    passes carries the number of dropped ones in `suppressed`.
+    """
+
+    def __init__(self, burst=LOG_ERROR_BURST, window=LOG_ERROR_WINDOW, level=logging.WARNING):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.level = level
+        self._seen = {}
+
+    def filter(self, record):
+        record.suppressed = 0
+        if record.levelno < self.level or not self.burst:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        started, passed, dropped = self._seen.get(key, (now, 0, 0))
+        if now - started >= self.window:
+            started, passed = now, 0
+        if passed >= self.burst:
+            self._seen[key] = (started, passed, dropped + 1)
+            return False
+        record.suppressed = dropped
+        self._seen[key] = (started, passed + 1, 0)
+        if len(self._seen) > 1000:
+            self._seen = {k: v for k, v in self._seen.items() if now - v[0] < self.window}
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line.
+    """
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'src': f"{record.filename}:{record.lineno}",
+            'msg': record.getMessage(),
+        }
+        for field in ('update_id', 'user_id', 'suppressed'):
+            value = getattr(record, field, None)
+            if value:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            line += f" (+{suppressed} o'xshash xabar o'tkazib yuborildi)"
+        return line
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves message formatting to the listener thread.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """
+    Loglar navbat orqali fon potokka uzatiladi; yozish (stdout) faqat o'sha potokda bajariladi.
+    """
+    if fmt == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = TextFormatter(TEXT_FORMAT)
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    handler = DeferredQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(RepeatFilter())
+
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+listener = setup_logging()
@@ -0,0 +1,39 @@
+import asyncio
+
+
+class MediaGroupCollector:
+    """
+    Collects the messages of a Telegram album (same media_group_id).
+
+    Telegram delivers an album as separate updates. Every new message restarts a
+    short timer; when no message of the group arrives for `latency` seconds the
+    callback is called once with all messages, ordered by message_id. Handlers
+    are never blocked while the album is being collected.
+    """
+
+    def __init__(self, latency=1.0):
+        self.latency = latency
+        self._groups = {}
+
+    def add(self, message, callback):
+        group_id = message.media_group_id
+        group = self._groups.get(group_id)
+        if group is None:
+            group = self._groups[group_id] = {'messages': [], 'handle': None, 'callback': callback}
+        else:
+            group['handle'].cancel()
+        group['messages'].append(message)
+        group['handle'] = asyncio.get_running_loop().call_later(self.latency, self._release, group_id)
+
+    def _release(self, group_id):
+        group = self._groups.pop(group_id, None)
+        if group:
+            group['callback'](sorted(group['messages'], key=lambda m: m.message_id))
+
+    def flush(self):
+        """
+        Yig'ilayotgan barcha albomlarni kutmasdan topshirish (to'xtatishdan oldin).
+        """
+        for group_id in list(self._groups):
+            self._groups[group_id]['handle'].cancel()
+            self._release(group_id)
@@ -0,0 +1,144 @@
+import inspect
+
+from aiogram import Dispatcher, types
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.filters import Filter
+from aiogram.dispatcher.filters.builtin import StateFilter
+from aiogram.dispatcher.filters.state import State
+from aiogram.utils.callback_data import CallbackData
+
+ANY_STATE = '*'
+ANY = types.ContentType.ANY
+
+
+def _state_name(state):
+    if isinstance(state, State):
+        return state.state
+    return state
+
+
+def resolved_handler(data: dict):
+    """
+    Update ni haqiqatda qayta ishlaydigan handler (router orqali bo'lsa - marshrut handleri).
+    """
+    route = data.get('route')
+    return route.handler if route is not None else current_handler.get()
+
+
+class Route:
+    __slots__ = ('handler', 'params', 'callback_data')
+
+    def __init__(self, handler, callback_data: CallbackData = None):
+        self.handler = handler
+        self.params = set(inspect.signature(handler).parameters)
+        self.callback_data = callback_data
+
+    def __call__(self, obj, **kwargs):
+        # Handler faqat o'zi qabul qiladigan argumentlarni oladi (aiogram dagi kabi)
+        return self.handler(obj, **{key: value for key, value in kwargs.items() if key in self.params})
+
+
+class Router:
+    """
+    Dispatch tables for FSM form steps.
+
+    Message handlers are keyed by (state, content type), callback handlers by
+    (state, CallbackData prefix), so finding a handler is one or two dict lookups
+    instead of running every registered filter in order. '*' as a state and
+    ContentType.ANY act as fallbacks. The router is plugged into the dispatcher as
+    one message handler and one callback handler (see `setup`), registered after
+    commands; the matched handler is passed to middlewares as data['route'].
+    """
+
+    def __init__(self):
+        self.messages = {}
+        self.callbacks = {}
+
+    @staticmethod
+    def _add(table, key, route):
+        if key in table:
+            raise ValueError(f"Route {key} is already registered for {table[key].handler.__name__}")
+        table[key] = route
+
+    def message(self, state=None, content_types=(types.ContentType.TEXT,)):
+        if isinstance(content_types, str):
+            content_types = (content_types,)
+
+        def decorator(handler):
+            route = Route(handler)
+            for content_type in content_types:
+                self._add(self.messages, (_state_name(state), content_type), route)
+            return handler
+
+        return decorator
+
+    def callback(self, callback_data: CallbackData, state=None):
+        def decorator(handler):
+            self._add(self.callbacks, (_state_name(state), callback_data.prefix), Route(handler, callback_data))
+            return handler
+
+        return decorator
+
+    def resolve_message(self, state, content_type):
+        messages = self.messages
+        return (messages.get((state, content_type)) or messages.get((state, ANY))
+                or messages.get((ANY_STATE, content_type)) or messages.get((ANY_STATE, ANY)))
+
+    def resolve_callback(self, state, data):
+        prefix, sep, _ = data.partition(':')
+        if not sep and '_' in data:
+            # Eski tugmalar ("cadastr_yes") -> "cadastr:yes"
+            legacy = self.resolve_callback(state, data.replace('_', ':', 1))
+            if legacy:
+                return legacy
+        route = self.callbacks.get((state, prefix)) or self.callbacks.get((ANY_STATE, prefix))
+        return (route, data) if route else None
+
+    def setup(self, dispatcher: Dispatcher):
+        """
+        Routerni dispatcherga ulash (barcha oddiy handlerlardan keyin chaqiriladi).
+        """
+        dispatcher.register_message_handler(self._dispatch_message, RouteFilter(self), state=ANY_STATE,
+                                            content_types=ANY)
+        dispatcher.register_callback_query_handler(self._dispatch_callback, RouteFilter(self), state=ANY_STATE)
+
+    @staticmethod
+    async def _dispatch_message(message: types.Message, state, route: Route):
+        return await route(message, state=state)
+
+    @staticmethod
+    async def _dispatch_callback(callback: types.CallbackQuery, state, route: Route, callback_data: dict):
+        return await route(callback, state=state, callback_data=callback_data)
+
+
+class RouteFilter(Filter):
+    """
+    Finds the route for the update and passes it (and parsed callback data) to the handler.
+    """
+
+    def __init__(self, router: Router):
+        self.router = router
+
+    @staticmethod
+    async def _current_state():
+        # StateFilter bilan bir xil kesh: holat bitta update uchun bir marta o'qiladi
+        try:
+            return StateFilter.ctx_state.get()
+        except LookupError:
+            state = await Dispatcher.get_current().current_state().get_state()
+            StateFilter.ctx_state.set(state)
+            return state
+
+    async def check(self, obj):
+        state = await self._current_state()
+        if isinstance(obj, types.CallbackQuery):
+            resolved = self.router.resolve_callback(state, obj.data or '')
+            if resolved is None:
+                return False
+            route, data = resolved
+            try:
+                return {'route': route, 'callback_data': route.callback_data.parse(data)}
+            except ValueError:
+                return False
+        route = self.router.resolve_message(state, obj.content_type)
+        return {'route': route} if route else False
@@ -0,0 +1,23 @@
+import time
+
+from data.config import SHUTDOWN_TIMEOUT
+
+# To'xtatish signali kelgan paytdan hisoblanadigan yagona muddat (time.monotonic)
+_deadline = None
+
+
+def begin_shutdown(timeout=SHUTDOWN_TIMEOUT):
+    """
+    To'xtatish muddatini boshlash (takroriy chaqiruvlar birinchisini qaytaradi).
+    """
+    global _deadline
+    if _deadline is None:
+        _deadline = time.monotonic() + timeout
+    return _deadline
+
+
+def shutdown_remaining(reserve=0.0) -> float:
+    """
+    Muddat tugashiga qolgan sekundlar (`reserve` keyingi qadamlar uchun ayirib qo'yiladi).
+    """
+    return max(begin_shutdown() - time.monotonic() - reserve, 0)
@@ -1,9 +1,14 @@
-def rate_limit(limit: int, key=None):
+import time
+from collections import OrderedDict
+
+
+def rate_limit(limit: int, key=None, burst=None):
     """
     Decorator for configuring rate limit and key in different functions.
 
-    :param limit:
-    :param key:
+    :param limit: seconds per call (one token is refilled every `limit` seconds)
+    :param key: bucket name, defaults to the handler name
+    :param burst: how many calls may be made back to back
     :return:
     """
 
@@ -11,6 +16,60 @@ def rate_limit(limit: int, key=None):
         setattr(func, 'throttling_rate_limit', limit)
         if key:
             setattr(func, 'throttling_key', key)
+        if burst:
+            setattr(func, 'throttling_burst', burst)
         return func
 
     return decorator
+
+
+def upload_backpressure(func):
+    """
+    Decorator for handlers that put media into the upload queue: while the queue
+    is full, ThrottlingMiddleware rejects their messages before they run.
+    """
+    setattr(func, 'upload_backpressure', True)
+    return func
+
+
+class TokenBucketLimiter:
+    """
+    Token buckets kept in an LRU dict.
+
+    At most `max_size` buckets are stored and buckets idle for longer than `ttl`
+    seconds are dropped, so memory does not grow with the number of users seen.
+    """
+
+    def __init__(self, max_size=10000, ttl=600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._buckets = OrderedDict()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def hit(self, key, limit, burst=1):
+        """
+        Bitta token olishga urinish. (ruxsat, ketma-ket rad etilganlar soni) qaytaradi.
+        """
+        now = time.monotonic()
+        bucket = self._buckets.pop(key, None)
+        if bucket is None:
+            tokens, exceeded = float(burst), 0
+        else:
+            tokens, last, exceeded = bucket
+            tokens = min(float(burst), tokens + (now - last) / limit) if limit else float(burst)
+        if tokens >= 1:
+            tokens, exceeded, allowed = tokens - 1, 0, True
+        else:
+            exceeded, allowed = exceeded + 1, False
+        self._buckets[key] = (tokens, now, exceeded)
+        self._evict(now)
+        return allowed, exceeded
+
+    def _evict(self, now):
+        while self._buckets:
+            key, (_, last, _) = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_size and now - last < self.ttl:
+                break
+            del self._buckets[key]
@@ -1,14 +1,19 @@
+import asyncio
 import logging
 
 from aiogram import Dispatcher
 
 from data.config import ADMINS
+from utils.outbound import low_priority
 
 
 async def on_startup_notify(dp: Dispatcher):
-    for admin in ADMINS:
+    async def send(admin):
         try:
             await dp.bot.send_message(admin, "Bot faollashdi!")
 
         except Exception as err:
             logging.exception(err)
+
+    with low_priority():
+        await asyncio.gather(*(send(admin) for admin in ADMINS))
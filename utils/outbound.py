@@ -0,0 +1,173 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+
+from aiogram import Bot
+from aiogram.utils.exceptions import RetryAfter
+
+from data.config import (OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_RATE, OUTBOUND_CHAT_BURST, OUTBOUND_GROUP_RATE,
+                         BOT_MODE, SHARDS)
+from utils.misc.metrics import registry
+
+# Navbatdagi ustuvorlik: kichik qiymat oldin yuboriladi
+PRIORITY_USER = 0
+PRIORITY_ADMIN = 1
+
+# Telegram cheklovlari hisobga olinadigan metodlar
+SCHEDULED_METHODS = {
+    'sendMessage', 'sendPhoto', 'sendVideo', 'sendDocument', 'sendMediaGroup', 'sendLocation',
+    'forwardMessage', 'copyMessage', 'editMessageText', 'editMessageReplyMarkup', 'editMessageCaption',
+}
+MAX_RETRIES = 5
+
+send_priority = contextvars.ContextVar('send_priority', default=PRIORITY_USER)
+
+
+@contextmanager
+def low_priority():
+    """
+    Shu blok ichidagi xabarlar foydalanuvchi javoblaridan keyin yuboriladi (admin xabarlari uchun).
+    """
+    token = send_priority.set(PRIORITY_ADMIN)
+    try:
+        yield
+    finally:
+        send_priority.reset(token)
+
+
+class OutboundScheduler:
+    """
+    Admission control for outgoing Bot API calls.
+
+    A global token bucket (OUTBOUND_GLOBAL_RATE per second) and one bucket per chat
+    (OUTBOUND_CHAT_RATE per second with a small burst, slower for groups) decide when
+    a call may start. Waiting calls are admitted in priority order; calls to
+    different chats run concurrently. A chat that got RetryAfter is paused for the
+    requested time.
+    """
+
+    def __init__(self, global_rate=OUTBOUND_GLOBAL_RATE, chat_rate=OUTBOUND_CHAT_RATE,
+                 chat_burst=OUTBOUND_CHAT_BURST, group_rate=OUTBOUND_GROUP_RATE):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self._global_tokens = float(global_rate)
+        self._global_ts = time.monotonic()
+        self._chats = {}
+        self._waiters = []
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._task = None
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def _chat_rate(self, chat_id):
+        return self.group_rate if str(chat_id).startswith('-') else self.chat_rate
+
+    def _chat_bucket(self, chat_id, now):
+        tokens, ts = self._chats.get(chat_id, (float(self.chat_burst), now))
+        tokens = min(float(self.chat_burst), tokens + (now - ts) * self._chat_rate(chat_id))
+        return tokens
+
+    def _refill(self, now):
+        self._global_tokens = min(float(self.global_rate),
+                                  self._global_tokens + (now - self._global_ts) * self.global_rate)
+        self._global_ts = now
+
+    async def acquire(self, chat_id, priority=PRIORITY_USER):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._pump())
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), chat_id, future))
+        self._wakeup.set()
+        await future
+
+    def pause(self, chat_id, seconds):
+        """
+        RetryAfter kelgan chatni belgilangan vaqtga to'xtatish.
+        """
+        self._chats[chat_id] = (-seconds * self._chat_rate(chat_id) + 1, time.monotonic())
+
+    def _admit(self, now):
+        """
+        Admit every waiter that may start now. Returns seconds until the next one can.
+        """
+        next_wake = None
+        blocked = []
+        while self._waiters:
+            priority, seq, chat_id, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            if self._global_tokens < 1:
+                heapq.heappush(self._waiters, (priority, seq, chat_id, future))
+                next_wake = (1 - self._global_tokens) / self.global_rate
+                break
+            chat_tokens = self._chat_bucket(chat_id, now)
+            if chat_tokens < 1:
+                blocked.append((priority, seq, chat_id, future))
+                wait = (1 - chat_tokens) / self._chat_rate(chat_id)
+                next_wake = wait if next_wake is None else min(next_wake, wait)
+                continue
+            self._chats[chat_id] = (chat_tokens - 1, now)
+            self._global_tokens -= 1
+            future.set_result(None)
+        for entry in blocked:
+            heapq.heappush(self._waiters, entry)
+        return next_wake
+
+    def _prune(self, now):
+        # To'lgan chat bucketlari standart holatga teng, ularni saqlash shart emas
+        for chat_id in [chat_id for chat_id in self._chats if self._chat_bucket(chat_id, now) >= self.chat_burst]:
+            del self._chats[chat_id]
+
+    async def _pump(self):
+        while True:
+            now = time.monotonic()
+            self._refill(now)
+            next_wake = self._admit(now)
+            if len(self._chats) > 1000:
+                self._prune(now)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=next_wake)
+            except asyncio.TimeoutError:
+                pass
+
+
+# Sharded rejimda umumiy limit ishchi jarayonlar orasida teng bo'linadi
+outbound = OutboundScheduler(
+    global_rate=OUTBOUND_GLOBAL_RATE / SHARDS if BOT_MODE == 'worker' else OUTBOUND_GLOBAL_RATE
+)
+
+registry.gauge('bot_outbound_waiting', 'Telegram calls waiting for a send slot', callback=lambda: outbound.waiting)
+retry_after_total = registry.counter('bot_telegram_retry_after_total', 'RetryAfter responses from Telegram')
+
+
+class ScheduledBot(Bot):
+    """
+    Bot whose sending methods go through the outbound scheduler and are retried
+    after RetryAfter instead of being dropped.
+    """
+
+    async def request(self, method, data=None, files=None, **kwargs):
+        if method not in SCHEDULED_METHODS:
+            return await super().request(method, data, files, **kwargs)
+        chat_id = (data or {}).get('chat_id')
+        for attempt in range(MAX_RETRIES):
+            await outbound.acquire(chat_id, send_priority.get())
+            try:
+                return await super().request(method, data, files, **kwargs)
+            except RetryAfter as e:
+                outbound.pause(chat_id, e.timeout)
+                retry_after_total.inc()
+                logging.warning("RetryAfter %s s: %s, chat %s, urinish %s", e.timeout, method, chat_id, attempt + 1)
+        await outbound.acquire(chat_id, send_priority.get())
+        return await super().request(method, data, files, **kwargs)
@@ -0,0 +1,49 @@
+import csv
+import importlib.util
+import os
+
+# Eksport ustunlari (Google Sheets bilan bir xil tartib)
+HEADERS = ('Менеджер', 'Дата', 'Имя', 'Телефон', 'Адрес', 'Кадастр', 'Трансформатор', 'Мощность ТП',
+           'Свободная мощность', 'Станция', 'Папка', 'Локация', 'Информация о локации')
+
+
+def xlsx_available() -> bool:
+    return importlib.util.find_spec('openpyxl') is not None
+
+
+def write_csv(rows, path) -> int:
+    """
+    Qatorlarni CSV ga oqim bilan yozish (Excel uchun UTF-8 BOM bilan). Yozilgan qatorlar sonini qaytaradi.
+    """
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8-sig') as file:
+        writer = csv.writer(file)
+        writer.writerow(HEADERS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def write_xlsx(rows, path) -> int:
+    # write_only rejimida openpyxl qatorlarni xotirada ushlamaydi
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Заявки')
+    sheet.append(HEADERS)
+    count = 0
+    for row in rows:
+        sheet.append(list(row))
+        count += 1
+    workbook.save(path)
+    return count
+
+
+def export_submissions(submissions, date_from, date_to, directory, fmt='csv'):
+    """
+    So'rovlarni faylga eksport qilish. (fayl yo'li, qatorlar soni) qaytaradi.
+    """
+    path = os.path.join(directory, f"requests_{date_from}_{date_to}.{fmt}")
+    writer = write_xlsx if fmt == 'xlsx' else write_csv
+    return path, writer(submissions.iter_range(date_from, date_to), path)
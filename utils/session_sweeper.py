@@ -0,0 +1,87 @@
+import asyncio
+import logging
+
+from data.config import (FSM_SESSION_TTL_HOURS, FSM_MAX_SESSIONS, FSM_SWEEP_INTERVAL, DELETE_EMPTY_FOLDERS, BOT_MODE,
+                         SHARDS, SHARD_INDEX)
+from utils.db_api import SQLiteStorage, Submissions, UploadSessions
+from utils.google_api import delete_folder_if_empty
+from utils.misc.metrics import registry, track
+
+# Bitta tranzaksiyada o'chiriladigan sessiyalar soni
+SWEEP_BATCH = 1000
+
+sessions_expired = registry.counter('bot_fsm_sessions_expired_total', 'Abandoned form sessions removed')
+folders_deleted = registry.counter('bot_drive_empty_folders_deleted_total', 'Empty Drive folders of expired sessions')
+
+
+class SessionSweeper:
+    """
+    Periodically removes form sessions nobody has touched for FSM_SESSION_TTL_HOURS
+    and keeps at most FSM_MAX_SESSIONS of them. With DELETE_EMPTY_FOLDERS the Drive
+    folder of an expired session is deleted if it is still empty and was not
+    submitted or used by an unfinished upload.
+    """
+
+    def __init__(self, storage: SQLiteStorage, submissions: Submissions, upload_sessions: UploadSessions,
+                 ttl=FSM_SESSION_TTL_HOURS * 3600, max_sessions=FSM_MAX_SESSIONS, interval=FSM_SWEEP_INTERVAL,
+                 delete_folders=DELETE_EMPTY_FOLDERS):
+        self.storage = storage
+        self.submissions = submissions
+        self.upload_sessions = upload_sessions
+        self.ttl = ttl
+        self.interval = interval
+        self.delete_folders = delete_folders
+        # Sharded rejimda har bir ishchi faqat o'z foydalanuvchilarini tozalaydi
+        self.shards = SHARDS if BOT_MODE == 'worker' else 1
+        self.max_sessions = max_sessions // self.shards if max_sessions else None
+        self._task = None
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _abandoned_folders(self, evicted):
+        uploading = {row['folder_id'] for row in self.upload_sessions.pending()}
+        folders = []
+        for _, data in evicted:
+            folder_id = data.get('folder_id')
+            if not folder_id or folder_id in uploading:
+                continue
+            if data.get('folder_link') and self.submissions.by_folder(data['folder_link']):
+                continue
+            folders.append(folder_id)
+        return folders
+
+    async def sweep_once(self) -> int:
+        evicted = self.storage.expire(self.ttl, self.max_sessions, self.shards, SHARD_INDEX, SWEEP_BATCH)
+        if not evicted:
+            return 0
+        sessions_expired.inc(len(evicted))
+        logging.info("%s ta tashlab ketilgan sessiya o'chirildi", len(evicted))
+        if self.delete_folders:
+            loop = asyncio.get_running_loop()
+            for folder_id in self._abandoned_folders(evicted):
+                try:
+                    with track('drive_delete_folder'):
+                        deleted = await loop.run_in_executor(None, delete_folder_if_empty, folder_id)
+                except Exception as e:
+                    logging.warning("Papka %s o'chirilmadi: %s", folder_id, e)
+                    continue
+                if deleted:
+                    folders_deleted.inc()
+        return len(evicted)
+
+    async def _run(self):
+        while True:
+            try:
+                # Bir martada SWEEP_BATCH tadan; ko'p bo'lsa darhol davom etadi
+                while await self.sweep_once() >= SWEEP_BATCH:
+                    pass
+            except Exception as e:
+                logging.error("Sessiyalarni tozalashda xato: %s", e)
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,390 @@
+import asyncio
+import collections
+import json
+import logging
+import os
+import signal
+import struct
+import sys
+
+import aiohttp
+from aiogram import Bot, Dispatcher, types
+from aiohttp import web
+
+from data import config
+from utils.misc.shutdown import begin_shutdown, shutdown_remaining
+
+# Kadr: 4 baytli uzunlik + JSON; ishchi har bir kadrga bitta ACK bayt bilan javob beradi
+HEADER = struct.Struct('>I')
+ACK = b'\x06'
+# Bitta shard uchun ingressda kutadigan updatelar soni
+FORWARD_QUEUE_SIZE = 10000
+RESTART_DELAY = 2
+# To'xtatishda ingress yo'ldagi updatelar tasdig'ini shuncha sekund kutadi
+INGRESS_STOP_TIMEOUT = 5
+
+UPDATE_SOURCES = ('message', 'edited_message', 'callback_query', 'inline_query', 'chosen_inline_result',
+                  'shipping_query', 'pre_checkout_query', 'poll_answer', 'my_chat_member', 'chat_member',
+                  'chat_join_request')
+
+
+def socket_path(index):
+    return os.path.join(config.SHARD_SOCKET_DIR, f"shard_{index}.sock")
+
+
+def user_key(update: dict) -> int:
+    """
+    Update yuborgan foydalanuvchi ID si (topilmasa chat ID yoki 0).
+    """
+    for source in UPDATE_SOURCES:
+        event = update.get(source)
+        if event:
+            user = event.get('from') or event.get('user') or event.get('chat') or {}
+            return int(user.get('id', 0))
+    return 0
+
+
+def shard_for(update: dict, shards: int) -> int:
+    # Bir foydalanuvchining barcha updatelari doim bitta shardga tushadi
+    return user_key(update) % shards
+
+
+async def read_frame(reader: asyncio.StreamReader):
+    header = await reader.readexactly(HEADER.size)
+    (length,) = HEADER.unpack(header)
+    return await reader.readexactly(length)
+
+
+def encode_frame(payload: bytes) -> bytes:
+    return HEADER.pack(len(payload)) + payload
+
+
+class ShardForwarder:
+    """
+    Sends raw updates of one shard to its worker over a Unix socket, reconnecting
+    while the worker is (re)starting. Updates wait in a bounded queue meanwhile.
+
+    The worker answers every frame with one ACK byte. A frame stays in flight
+    until it is acknowledged and is sent again after a reconnect, so an update
+    is lost neither in the queue nor in a dying socket (a worker may see it twice).
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.queue = asyncio.Queue(maxsize=FORWARD_QUEUE_SIZE)
+        self._inflight = collections.deque()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def send(self, payload: bytes) -> asyncio.Future:
+        """
+        Kadrni navbatga qo'yish. Ishchi qabul qilganda bajariladigan future qaytaradi.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((payload, future))
+        return future
+
+    async def _connect(self):
+        while True:
+            try:
+                return await asyncio.open_unix_connection(socket_path(self.index))
+            except (FileNotFoundError, ConnectionError):
+                await asyncio.sleep(0.5)
+
+    async def _read_acks(self, reader: asyncio.StreamReader):
+        # Ishchi kadrlarni kelish tartibida tasdiqlaydi
+        while True:
+            try:
+                data = await reader.read(4096)
+            except (ConnectionError, OSError):
+                return
+            if not data:
+                return
+            for _ in range(min(len(data), len(self._inflight))):
+                _, future = self._inflight.popleft()
+                if not future.done():
+                    future.set_result(True)
+
+    async def _run(self):
+        getter = None
+        try:
+            while True:
+                reader, writer = await self._connect()
+                acks = asyncio.create_task(self._read_acks(reader))
+                try:
+                    # Tasdiqlanmagan kadrlar yangi ulanishda qayta yuboriladi
+                    for payload, _ in self._inflight:
+                        writer.write(encode_frame(payload))
+                    await writer.drain()
+                    while not acks.done():
+                        if getter is None:
+                            getter = asyncio.create_task(self.queue.get())
+                        await asyncio.wait([getter, acks], return_when=asyncio.FIRST_COMPLETED)
+                        if not getter.done():
+                            break
+                        self._inflight.append(getter.result())
+                        getter = None
+                        writer.write(encode_frame(self._inflight[-1][0]))
+                        await writer.drain()
+                    logging.warning("Shard %s bilan aloqa uzildi", self.index)
+                except (ConnectionError, OSError) as e:
+                    logging.warning("Shard %s bilan aloqa uzildi: %s", self.index, e)
+                finally:
+                    acks.cancel()
+                    writer.close()
+        finally:
+            if getter is not None:
+                getter.cancel()
+
+
+class ShardIngress:
+    """
+    Receives updates (long polling, or a webhook when WEBHOOK_HOST is set) and routes
+    each one to `shards` worker processes by user id. Updates are only parsed enough
+    to find the user; handlers, FSM and Google calls run in the workers.
+
+    An update is confirmed to Telegram (getUpdates offset, or the webhook response)
+    only after its worker has acknowledged it.
+    """
+
+    def __init__(self, token, shards):
+        self.token = token
+        self.shards = shards
+        self.forwarders = [ShardForwarder(index) for index in range(shards)]
+        self.offset = None
+        self._receiver = None
+        self._fetch = None
+        self._stopping = False
+
+    @property
+    def api_url(self):
+        return f"{config.BOT_API_SERVER or 'https://api.telegram.org'}/bot{self.token}"
+
+    async def route(self, update: dict, raw: bytes = None) -> asyncio.Future:
+        forwarder = self.forwarders[shard_for(update, self.shards)]
+        return await forwarder.send(raw or json.dumps(update, ensure_ascii=False).encode())
+
+    async def _get_updates(self, session, timeout):
+        async with session.post(f"{self.api_url}/getUpdates", json={'offset': self.offset, 'timeout': timeout}) \
+                as response:
+            return await response.json()
+
+    async def poll(self):
+        timeout = aiohttp.ClientTimeout(total=60)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            await session.post(f"{self.api_url}/deleteWebhook")
+            while not self._stopping:
+                self._fetch = asyncio.create_task(self._get_updates(session, 25))
+                try:
+                    result = await self._fetch
+                except asyncio.CancelledError:
+                    # stop() faqat kutilayotgan getUpdates ni uzadi
+                    if self._stopping and not asyncio.current_task().cancelling():
+                        break
+                    raise
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logging.warning("getUpdates xatosi: %s", e)
+                    await asyncio.sleep(1)
+                    continue
+                finally:
+                    self._fetch = None
+                if not result.get('ok'):
+                    logging.error("getUpdates: %s", result)
+                    await asyncio.sleep(result.get('parameters', {}).get('retry_after', 1))
+                    continue
+                updates = result['result']
+                if not updates:
+                    continue
+                # Offset ishchilar qabul qilgandan keyingina suriladi
+                await asyncio.gather(*[await self.route(update) for update in updates])
+                self.offset = updates[-1]['update_id'] + 1
+            if self.offset is not None:
+                # Qabul qilingan oxirgi updatelarni Telegram ga tasdiqlash
+                try:
+                    await self._get_updates(session, 0)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logging.warning("Oxirgi updatelar tasdiqlanmadi: %s", e)
+
+    async def handle_webhook(self, request: web.Request):
+        if config.WEBHOOK_SECRET and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != config.WEBHOOK_SECRET:
+            return web.Response(status=401)
+        raw = await request.read()
+        try:
+            update = json.loads(raw)
+        except ValueError:
+            return web.Response(status=400)
+        # Ishchi qabul qilmaguncha javob berilmaydi: Telegram updateni qayta yuboradi
+        await (await self.route(update, raw))
+        return web.Response(text='ok')
+
+    async def run_webhook(self):
+        async with aiohttp.ClientSession() as session:
+            await session.post(f"{self.api_url}/setWebhook", json={
+                'url': config.WEBHOOK_HOST.rstrip('/') + config.WEBHOOK_PATH,
+                'secret_token': config.WEBHOOK_SECRET or None,
+                'max_connections': min(config.WEBHOOK_MAX_CONCURRENCY, 100),
+            })
+        app = web.Application()
+        app.router.add_post(config.WEBHOOK_PATH, self.handle_webhook)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, config.IP, config.WEBAPP_PORT).start()
+        logging.info("Webhook ingress: %s%s", config.WEBHOOK_HOST, config.WEBHOOK_PATH)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            # Yangi so'rovlar qabul qilinmaydi, boshlanganlari ishchi tasdig'ini kutadi
+            await runner.cleanup()
+
+    def start(self):
+        for forwarder in self.forwarders:
+            forwarder.start()
+        self._receiver = asyncio.create_task(self.run_webhook() if config.WEBHOOK_HOST else self.poll())
+
+    async def stop(self, timeout):
+        """
+        Yangi updatelarni olishni to'xtatish va yo'ldagilarni `timeout` sekund ichida ishchilarga yetkazish.
+        """
+        self._stopping = True
+        if config.WEBHOOK_HOST:
+            self._receiver.cancel()
+        elif self._fetch is not None:
+            self._fetch.cancel()
+        done, _ = await asyncio.wait([self._receiver], timeout=timeout)
+        if not done:
+            # Tasdiqlanmagan updatelar keyingi ishga tushishda Telegram dan qayta olinadi
+            logging.warning("Ingress muddatida to'xtamadi, yo'ldagi updatelar qayta olinadi")
+            self._receiver.cancel()
+        await asyncio.gather(self._receiver, return_exceptions=True)
+        for forwarder in self.forwarders:
+            await forwarder.stop()
+
+
+class ShardWorker:
+    """
+    One worker process: reads updates of its shard from a Unix socket and feeds
+    them to the dispatcher (LaneDispatcher keeps each user's updates in order).
+    """
+
+    def __init__(self, dispatcher: Dispatcher, index):
+        self.dispatcher = dispatcher
+        self.index = index
+        self._tasks = set()
+        self._connections = set()
+
+    async def _process(self, update: types.Update):
+        try:
+            await self.dispatcher.process_update(update)
+        except Exception as e:
+            logging.exception("Update %s qayta ishlanmadi: %s", update.update_id, e)
+
+    def submit(self, payload: bytes):
+        # Vazifalar yaratilish tartibida boshlanadi, shuning uchun navbatga kelish tartibi saqlanadi
+        task = asyncio.create_task(self._process(types.Update(**json.loads(payload))))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections.add(writer)
+        try:
+            while True:
+                self.submit(await read_frame(reader))
+                # Update qabul qilindi: to'xtatishda ham bajarib bo'linadi
+                writer.write(ACK)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def wait_processed(self, timeout=None):
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+
+    async def serve(self, on_startup=None, on_shutdown=None):
+        Bot.set_current(self.dispatcher.bot)
+        Dispatcher.set_current(self.dispatcher)
+        if on_startup:
+            await on_startup(self.dispatcher)
+        path = socket_path(self.index)
+        if os.path.exists(path):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(self.handle_connection, path=path)
+        logging.info("Shard %s ishga tushdi: %s", self.index, path)
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        await stop.wait()
+        # Bitta muddat: updatelarni kutish va on_shutdown shu SHUTDOWN_TIMEOUT ichida
+        begin_shutdown()
+
+        server.close()
+        for writer in list(self._connections):
+            writer.close()
+        await server.wait_closed()
+        await self.wait_processed(timeout=shutdown_remaining(reserve=config.SHUTDOWN_TIMEOUT / 2))
+        if on_shutdown:
+            await on_shutdown(self.dispatcher)
+        await self.dispatcher.storage.close()
+        await self.dispatcher.storage.wait_closed()
+        session = await self.dispatcher.bot.get_session()
+        await session.close()
+
+
+def start_worker(dispatcher: Dispatcher, on_startup=None, on_shutdown=None):
+    worker = ShardWorker(dispatcher, config.SHARD_INDEX)
+    asyncio.run(worker.serve(on_startup, on_shutdown))
+
+
+async def _supervise(index, shards, stop: asyncio.Event):
+    env = dict(os.environ, BOT_MODE='worker', SHARD_INDEX=str(index), SHARDS=str(shards))
+    while not stop.is_set():
+        process = await asyncio.create_subprocess_exec(sys.executable, os.path.abspath(sys.argv[0]), env=env)
+        waiter = asyncio.create_task(process.wait())
+        stopper = asyncio.create_task(stop.wait())
+        await asyncio.wait([waiter, stopper], return_when=asyncio.FIRST_COMPLETED)
+        if stop.is_set():
+            if process.returncode is None:
+                process.terminate()
+            await waiter
+            return
+        stopper.cancel()
+        logging.error("Shard %s to'xtadi (kod %s), qayta ishga tushiriladi", index, process.returncode)
+        await asyncio.sleep(RESTART_DELAY)
+
+
+async def _run_sharded(token, shards):
+    os.makedirs(config.SHARD_SOCKET_DIR, exist_ok=True)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    # Ishchilar ingress yo'ldagi updatelarni topshirgandan keyin to'xtatiladi
+    stop_workers = asyncio.Event()
+    workers = [asyncio.create_task(_supervise(index, shards, stop_workers)) for index in range(shards)]
+    ingress = ShardIngress(token, shards)
+    ingress.start()
+    await stop.wait()
+    # Ishchilar o'z SHUTDOWN_TIMEOUT ini ingressdan keyin boshlaydi, shuning uchun ingress qisqa kutadi
+    await ingress.stop(INGRESS_STOP_TIMEOUT)
+    stop_workers.set()
+    await asyncio.gather(*workers)
+
+
+def start_sharded(token=config.BOT_TOKEN, shards=config.SHARDS):
+    """
+    Ingress + `shards` ta ishchi jarayon (BOT_MODE=sharded).
+    """
+    logging.info("Ingress ishga tushdi, shardlar: %s", shards)
+    asyncio.run(_run_sharded(token, shards))
@@ -0,0 +1,190 @@
+import asyncio
+import contextvars
+import itertools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from data.config import UPLOAD_WORKERS, UPLOAD_QUEUE_SIZE
+from utils.misc.metrics import registry
+
+
+class UploadQueueFull(Exception):
+    pass
+
+
+class UploadJob:
+    """
+    Single upload job and its status.
+
+    status: queued -> running -> done | failed
+    """
+
+    def __init__(self, job_id, func, args, name=None, checkpoint=None):
+        self.id = job_id
+        self.name = name or f"job_{job_id}"
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.func = func
+        self.args = args
+        # To'xtatishda tugamagan vazifani keyinroq davom ettirish uchun saqlaydi (func bilan bir xil argumentlar)
+        self.checkpoint = checkpoint
+        # Navbatga qo'ygan update konteksti (loglardagi update_id/user_id uchun)
+        self.context = contextvars.copy_context()
+        self.future = asyncio.get_event_loop().create_future()
+
+    async def wait(self):
+        return await asyncio.shield(self.future)
+
+    def __repr__(self):
+        return f"<UploadJob {self.id} {self.name} {self.status}>"
+
+
+class UploadQueue:
+    """
+    Bounded upload pool.
+
+    Jobs are queued and executed by a fixed number of worker coroutines, so at most
+    `workers` uploads run at the same time. Blocking functions run in a thread pool
+    of the same size, coroutine functions are awaited directly on the loop.
+    On shutdown the queue stops accepting jobs, lets running ones finish until a
+    deadline and checkpoints the rest; background tasks that report results get
+    the remaining time before they are cancelled.
+    """
+
+    def __init__(self, workers=UPLOAD_WORKERS, max_size=UPLOAD_QUEUE_SIZE):
+        self.workers = workers
+        self.max_size = max_size
+        self.jobs = {}
+        self.running = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='upload')
+        self._queue = None
+        self._worker_tasks = []
+        self._background = set()
+        self._ids = itertools.count(1)
+        self.closed = False
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+            for i in range(self.workers):
+                self._worker_tasks.append(asyncio.create_task(self._worker(i)))
+
+    @property
+    def pending(self):
+        return self._queue.qsize() if self._queue else 0
+
+    @property
+    def saturated(self):
+        return self.pending >= self.max_size
+
+    def submit(self, func, *args, name=None, checkpoint=None) -> UploadJob:
+        """
+        Navbatga yangi vazifa qo'shish. Navbat to'lgan (yoki yopilgan) bo'lsa UploadQueueFull.
+        """
+        if self.closed:
+            raise UploadQueueFull("Yuklash navbati yopilgan (bot to'xtatilmoqda)")
+        self._ensure_started()
+        job = UploadJob(next(self._ids), func, args, name, checkpoint)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise UploadQueueFull(f"Yuklash navbati to'ldi ({self.max_size})") from None
+        self.jobs[job.id] = job
+        return job
+
+    async def run_blocking(self, func, *args):
+        """
+        Bloklovchi funksiyani yuklash potoklarida bajarish.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def spawn(self, coro):
+        """
+        Fon vazifasini ishga tushirish va unga havolani saqlab turish.
+        """
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def shutdown(self, timeout, checkpoint_timeout=5):
+        """
+        Yangi vazifalarni qabul qilmaslik, ishlayotganlarini `timeout` sekund kutish,
+        qolganlarini checkpoint qilib to'xtatish. Fon vazifalari (natija xabarlari, admin xabarlari)
+        qolgan muddat ichida, kamida `checkpoint_timeout` sekund kutiladi.
+        Checkpoint qilingan vazifalar sonini qaytaradi.
+        """
+        self.closed = True
+        deadline = time.monotonic() + max(timeout, 0)
+        saved = 0
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+            unfinished = list(self.jobs.values())
+            for task in self._worker_tasks:
+                task.cancel()
+            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+            for job in unfinished:
+                if job.checkpoint is not None:
+                    try:
+                        await asyncio.wait_for(asyncio.create_task(job.checkpoint(*job.args), context=job.context),
+                                               timeout=checkpoint_timeout)
+                        saved += 1
+                    except Exception as e:
+                        logging.error("Vazifa %s saqlanmadi: %s", job, e)
+                if not job.future.done():
+                    job.future.cancel()
+            if unfinished:
+                logging.warning("%s ta yuklama tugamadi, %s tasi keyingi ishga tushishda davom ettiriladi",
+                                len(unfinished), saved)
+        # Tugagan yuklamalar haqidagi xabarlar yo'qolmasligi uchun fon vazifalari kutiladi
+        if self._background:
+            _, pending = await asyncio.wait(list(self._background),
+                                            timeout=max(deadline - time.monotonic(), checkpoint_timeout))
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            if pending:
+                logging.warning("%s ta fon vazifasi muddat tugagani uchun to'xtatildi", len(pending))
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        return saved
+
+    async def _worker(self, index):
+        while True:
+            job = await self._queue.get()
+            job.status = 'running'
+            self.running += 1
+            try:
+                if asyncio.iscoroutinefunction(job.func):
+                    job.result = await asyncio.create_task(job.func(*job.args), context=job.context)
+                else:
+                    job.result = await self.run_blocking(job.context.run, job.func, *job.args)
+                job.status = 'done'
+                if not job.future.done():
+                    job.future.set_result(job.result)
+            except asyncio.CancelledError:
+                job.status = 'failed'
+                if not job.future.done():
+                    job.future.cancel()
+                raise
+            except Exception as e:
+                job.status = 'failed'
+                job.error = e
+                logging.exception("Yuklash vazifasida xato %s: %s", job, e)
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self.running -= 1
+                self.jobs.pop(job.id, None)
+                self._queue.task_done()
+
+
+upload_queue = UploadQueue()
+
+registry.gauge('bot_upload_queue_pending', 'Uploads waiting in the queue', callback=lambda: upload_queue.pending)
+registry.gauge('bot_uploads_in_flight', 'Uploads running now', callback=lambda: upload_queue.running)
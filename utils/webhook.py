@@ -0,0 +1,107 @@
+import asyncio
+import logging
+
+from aiogram import Bot, Dispatcher, types
+from aiohttp import web
+
+from data import config
+from utils.misc.shutdown import begin_shutdown, shutdown_remaining
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookIngress:
+    """
+    aiohttp endpoint for Telegram webhooks.
+
+    Each update is acknowledged as soon as it is parsed and processed in a background
+    task; at most `max_concurrency` updates are in flight, further requests wait for a
+    free slot before they are acknowledged, which makes Telegram slow down.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, path=config.WEBHOOK_PATH, secret=config.WEBHOOK_SECRET,
+                 max_concurrency=config.WEBHOOK_MAX_CONCURRENCY):
+        self.dispatcher = dispatcher
+        self.path = path
+        self.secret = secret
+        self.max_concurrency = max_concurrency
+        self._slots = None
+        self._tasks = set()
+
+    @property
+    def in_flight(self):
+        return len(self._tasks)
+
+    async def handle(self, request: web.Request):
+        if self.secret and request.headers.get(SECRET_HEADER) != self.secret:
+            return web.Response(status=401)
+        try:
+            update = types.Update(**await request.json())
+        except Exception as e:
+            logging.warning("Webhook: noto‘g‘ri update: %s", e)
+            return web.Response(status=400)
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        await self._slots.acquire()
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response(text='ok')
+
+    async def _process(self, update: types.Update):
+        try:
+            await self.dispatcher.process_update(update)
+        except Exception as e:
+            logging.exception("Webhook update %s qayta ishlanmadi: %s", update.update_id, e)
+        finally:
+            self._slots.release()
+
+    async def wait_processed(self, timeout=None):
+        """
+        Hozir bajarilayotgan updatelarni kutish.
+        """
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+
+    def make_app(self, on_startup=None, on_shutdown=None) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+
+        async def _startup(_):
+            Bot.set_current(self.dispatcher.bot)
+            Dispatcher.set_current(self.dispatcher)
+            if on_startup:
+                await on_startup(self.dispatcher)
+
+        async def _shutdown(_):
+            # Bitta muddat: updatelarni kutish va on_shutdown shu SHUTDOWN_TIMEOUT ichida
+            begin_shutdown()
+            await self.wait_processed(timeout=shutdown_remaining(reserve=config.SHUTDOWN_TIMEOUT / 2))
+            if on_shutdown:
+                await on_shutdown(self.dispatcher)
+            await self.dispatcher.storage.close()
+            await self.dispatcher.storage.wait_closed()
+            session = await self.dispatcher.bot.get_session()
+            await session.close()
+
+        app.on_startup.append(_startup)
+        app.on_shutdown.append(_shutdown)
+        return app
+
+
+def start_webhook(dispatcher: Dispatcher, on_startup=None, on_shutdown=None):
+    ingress = WebhookIngress(dispatcher)
+
+    async def _startup(dp: Dispatcher):
+        await dp.bot.set_webhook(
+            config.WEBHOOK_HOST.rstrip('/') + ingress.path,
+            max_connections=min(ingress.max_concurrency, 100),
+            secret_token=ingress.secret or None
+        )
+        logging.info("Webhook o‘rnatildi: %s%s", config.WEBHOOK_HOST, ingress.path)
+        if on_startup:
+            await on_startup(dp)
+
+    app = ingress.make_app(on_startup=_startup, on_shutdown=on_shutdown)
+    web.run_app(app, host=config.IP, port=config.WEBAPP_PORT)